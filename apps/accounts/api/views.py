@@ -1,3 +1,5 @@
+import logging
+
 from rest_framework import generics
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
@@ -12,37 +14,29 @@ from apps.accounts.api.serializers import (
 )
 from apps.accounts.models import CustomUser
 
+logger = logging.getLogger(__name__)
+
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
     def post(self, request, *args, **kwargs):
         # 1. Standard Login Process
         response = super().post(request, *args, **kwargs)
-        
-        # 2. Debugging Logic
+
+        # 2. Welcome email
         if response.status_code == 200:
-            print("DEBUG: Login successful. Attempting to send email...") # <--- Debug 1
-            
             user_email = request.data.get('email')
-            print(f"DEBUG: User Email from request: {user_email}") # <--- Debug 2
-            
             if user_email:
-                from apps.accounts.models import CustomUser
                 try:
                     user = CustomUser.objects.get(email=user_email)
-                    print(f"DEBUG: User found: {user.name}. Triggering Celery task...") # <--- Debug 3
-                    
-                    # Call the task
                     send_welcome_email.delay(user.email, user.name)
-                    
-                    print("DEBUG: Task sent to Redis!") # <--- Debug 4
-                    
+                    logger.debug("Welcome email queued for %s", user.email)
                 except CustomUser.DoesNotExist:
-                    print("ERROR: User object not found in DB!")
+                    logger.error("Login succeeded but user %s was not found", user_email)
                 except Exception as e:
-                    print(f"ERROR: Celery failed to trigger: {str(e)}")
+                    logger.warning("Celery failed to trigger: %s", e)
             else:
-                print("ERROR: Email field missing in request body!")
+                logger.error("Email field missing in login request body")
 
         return response
 
@@ -0,0 +1,403 @@
+"""
+Rating aggregate engine for Movie.
+
+Each review write is turned into a delta (rating sum, review count and one
+histogram bucket) which is applied with a single UPDATE built from F()
+expressions. The database does the arithmetic, so concurrent reviews never
+overwrite each other and the cost of a write does not depend on how many
+reviews the movie already has.
+
+`rebuild_movie_aggregates` recomputes everything from the Review table and is
+used to detect (and repair) drift.
+
+Genres carry the same totals over their movies (movie_count, and the mean
+rating of all their reviews): review deltas are applied to the movie's
+genres too, and genres whose movies change are recomputed from the movies'
+aggregates (`refresh_genre_stats`). So do people over the movies they are
+credited in, with their credit count and career span
+(`rebuild_person_stats`).
+
+In "deferred" mode (settings.MOVIE_STATS_MODE) review writes only mark the
+movie dirty in the cache; `apps.movies.tasks.flush_dirty_movie_stats`
+recomputes all dirty movies periodically in grouped batches.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Now, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from apps.movies.backends import redis_connection
+from apps.movies.models import Genre, Movie, MovieCrew, Person, Review
+
+RATING_VALUES = range(1, 11)
+
+
+def histogram_field(rating):
+    """ Name of the Movie column counting reviews with this rating """
+    return f"rating_{rating}_count"
+
+
+HISTOGRAM_FIELDS = [histogram_field(rating) for rating in RATING_VALUES]
+AGGREGATE_FIELDS = ["rating_sum", "total_review_count", "average_rating", *HISTOGRAM_FIELDS]
+GENRE_STATS_FIELDS = ["movie_count", "rating_sum", "review_count", "avg_rating"]
+PERSON_STATS_FIELDS = ["credit_count", "rating_sum", "review_count", "avg_rating", "first_year", "last_year"]
+
+
+def average_rating_expression(rating_sum, review_count):
+    """
+    SQL expression for round(sum / count, 1), or 0 when there are no reviews.
+    """
+    return Case(
+        When(
+            GreaterThan(review_count, 0),
+            then=Round(Cast(rating_sum, FloatField()) / review_count, 1),
+        ),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def average_rating(rating_sum, review_count):
+    """
+    Python counterpart of `average_rating_expression`. SQL rounds halves
+    away from zero (6.25 -> 6.3) where round() rounds them to even.
+    """
+    if not review_count:
+        return 0.0
+    average = Decimal(repr(rating_sum / review_count))
+    return float(average.quantize(Decimal("0.1"), rounding=ROUND_HALF_UP))
+
+
+def apply_rating_delta(movie_id, added=None, removed=None):
+    """
+    Atomically apply a review change to the movie's aggregates.
+
+    - create: added=<new rating>
+    - delete: removed=<old rating>
+    - rating change: added=<new rating>, removed=<old rating>
+
+    The movie's genres and the people credited in it get the same delta.
+    Returns the ids of those people.
+    """
+    if added == removed:
+        # Nothing rating-related changed (e.g. only the comment was edited)
+        return []
+
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+
+    # Greatest(..., 0) keeps the positive-integer columns valid even if the
+    # stored aggregates have drifted; rebuild_rating_aggregates reports that.
+    new_sum = Greatest(F("rating_sum") + sum_delta, 0)
+    new_count = Greatest(F("total_review_count") + count_delta, 0)
+
+    updates = {
+        "rating_sum": new_sum,
+        "total_review_count": new_count,
+        # All SET expressions are evaluated against the old row values,
+        # so the average is computed from the new sum and count in one statement.
+        "average_rating": average_rating_expression(new_sum, new_count),
+        "updated_at": Now(),
+    }
+    if added is not None:
+        updates[histogram_field(added)] = F(histogram_field(added)) + 1
+    if removed is not None:
+        field = histogram_field(removed)
+        updates[field] = Greatest(F(field) - 1, 0)
+
+    Movie.objects.filter(pk=movie_id).update(**updates)
+
+    # Genres and people share the column names, hence the expressions
+    sum_expr = Greatest(F("rating_sum") + sum_delta, 0)
+    count_expr = Greatest(F("review_count") + count_delta, 0)
+    Genre.objects.filter(pk__in=genre_links(movie_ids=[movie_id]).values("genre_id")).update(
+        rating_sum=sum_expr,
+        review_count=count_expr,
+        avg_rating=average_rating_expression(sum_expr, count_expr),
+    )
+
+    # Ids are read first: the caller invalidates these people's cached pages
+    person_ids = credited_people([movie_id])
+    if person_ids:
+        Person.objects.filter(pk__in=person_ids).update(
+            rating_sum=sum_expr,
+            review_count=count_expr,
+            avg_rating=average_rating_expression(sum_expr, count_expr),
+        )
+    return person_ids
+
+
+def compute_movie_aggregates(movie_ids):
+    """
+    Recompute aggregates for the given movies with ONE grouped query.
+    Returns {movie_id: {field: value}}; movies without reviews get zeros.
+    """
+    stats = (
+        Review.objects.filter(movie_id__in=movie_ids)
+        .order_by()
+        .values("movie_id")
+        .annotate(
+            rating_sum=Sum("rating"),
+            total_review_count=Count("id"),
+            **{histogram_field(r): Count("id", filter=Q(rating=r)) for r in RATING_VALUES},
+        )
+    )
+
+    empty = {field: 0 for field in ["rating_sum", "total_review_count", *HISTOGRAM_FIELDS]}
+    result = {movie_id: dict(empty, average_rating=0.0) for movie_id in movie_ids}
+    for row in stats:
+        movie_id = row.pop("movie_id")
+        row["average_rating"] = average_rating(row["rating_sum"], row["total_review_count"])
+        result[movie_id] = row
+    return result
+
+
+def rebuild_movie_aggregates(movie_ids=None, batch_size=500, dry_run=False):
+    """
+    Rebuild aggregates from scratch, walking movies in primary-key batches.
+    Only movies whose stored values differ are written (with bulk_update).
+
+    Returns the list of movie ids that had drifted.
+    """
+    movies = Movie.objects.only("id", *AGGREGATE_FIELDS).order_by("pk")
+    if movie_ids is not None:
+        movies = movies.filter(pk__in=movie_ids)
+
+    drifted = []
+    last_pk = 0
+    now = timezone.now()
+    while True:
+        batch = list(movies.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        expected = compute_movie_aggregates([movie.pk for movie in batch])
+        changed = []
+        for movie in batch:
+            values = expected[movie.pk]
+            if any(getattr(movie, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(movie, field, value)
+                movie.updated_at = now
+                changed.append(movie)
+
+        drifted.extend(movie.pk for movie in changed)
+        if changed and not dry_run:
+            Movie.objects.bulk_update(changed, [*AGGREGATE_FIELDS, "updated_at"])
+
+    return drifted
+
+
+def refresh_movie_aggregates(movie_ids):
+    """
+    Recompute the aggregates of `movie_ids` in ONE UPDATE with correlated
+    subqueries, without reading the movies back or checking for drift
+    (used after bulk review imports, where bulk_update would dominate).
+    """
+    reviews = Review.objects.filter(movie=OuterRef("pk")).order_by().values("movie")
+
+    def per_movie(aggregate):
+        return Coalesce(Subquery(reviews.annotate(value=aggregate).values("value")), 0)
+
+    rating_sum, review_count = per_movie(Sum("rating")), per_movie(Count("id"))
+    Movie.objects.filter(pk__in=movie_ids).update(
+        rating_sum=rating_sum,
+        total_review_count=review_count,
+        average_rating=average_rating_expression(rating_sum, review_count),
+        updated_at=Now(),
+        **{histogram_field(r): per_movie(Count("id", filter=Q(rating=r))) for r in RATING_VALUES},
+    )
+
+
+# GENRES
+
+
+def genre_links(movie_ids=None):
+    links = Movie.genres.through.objects.order_by()
+    return links if movie_ids is None else links.filter(movie_id__in=movie_ids)
+
+
+def refresh_genre_stats(genre_ids=None):
+    """
+    Recompute movie_count and the rating totals of `genre_ids` (every genre
+    by default) from their movies' aggregates, in ONE UPDATE with correlated
+    subqueries. Used when movies join or leave genres, after deferred
+    flushes and bulk imports.
+    """
+    links = Movie.genres.through.objects.filter(genre=OuterRef("pk")).order_by().values("genre")
+
+    def per_genre(aggregate):
+        return Coalesce(Subquery(links.annotate(value=aggregate).values("value")), 0)
+
+    rating_sum, review_count = per_genre(Sum("movie__rating_sum")), per_genre(Sum("movie__total_review_count"))
+    genres = Genre.objects.all() if genre_ids is None else Genre.objects.filter(pk__in=genre_ids)
+    genres.update(
+        movie_count=per_genre(Count("movie_id")),
+        rating_sum=rating_sum,
+        review_count=review_count,
+        avg_rating=average_rating_expression(rating_sum, review_count),
+    )
+
+
+def rebuild_genre_stats(dry_run=False):
+    """
+    Recompute every genre's stats with one grouped query and write back the
+    drifted ones. Run after `rebuild_movie_aggregates`, since genre totals
+    are sums of the movies' stored aggregates.
+
+    Returns the list of genre ids that had drifted.
+    """
+    stats = {
+        row.pop("genre_id"): row
+        for row in genre_links()
+        .values("genre_id")
+        .annotate(
+            movie_count=Count("movie_id"),
+            rating_sum=Sum("movie__rating_sum"),
+            review_count=Sum("movie__total_review_count"),
+        )
+    }
+    empty = {"movie_count": 0, "rating_sum": 0, "review_count": 0}
+
+    changed = []
+    for genre in Genre.objects.order_by("pk"):
+        values = dict(stats.get(genre.pk, empty))
+        values["avg_rating"] = average_rating(values["rating_sum"], values["review_count"])
+        if any(getattr(genre, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(genre, field, value)
+            changed.append(genre)
+
+    if changed and not dry_run:
+        Genre.objects.bulk_update(changed, GENRE_STATS_FIELDS)
+    return [genre.pk for genre in changed]
+
+
+# PEOPLE
+
+
+def credited_people(movie_ids):
+    """ Ids of the people credited in the movies """
+    return list(
+        MovieCrew.objects.filter(movie_id__in=movie_ids).order_by().values_list("person_id", flat=True).distinct()
+    )
+
+
+def compute_person_stats(person_ids):
+    """
+    Career aggregates of the given people from their credits, with ONE query.
+    A movie counts once towards the ratings, whatever the number of roles.
+    Returns {person_id: {field: value}}.
+    """
+    result = {
+        person_id: {"credit_count": 0, "rating_sum": 0, "review_count": 0, "first_year": None, "last_year": None}
+        for person_id in person_ids
+    }
+    credits = (
+        MovieCrew.objects.filter(person_id__in=person_ids)
+        .values_list("person_id", "movie_id", "movie__release_date", "movie__rating_sum", "movie__total_review_count")
+        .order_by("person_id", "movie_id")
+    )
+    previous = None
+    for person_id, movie_id, release_date, rating_sum, review_count in credits:
+        stats = result[person_id]
+        stats["credit_count"] += 1
+        year = release_date.year
+        stats["first_year"] = min(year, stats["first_year"] or year)
+        stats["last_year"] = max(year, stats["last_year"] or year)
+        if (person_id, movie_id) != previous:
+            stats["rating_sum"] += rating_sum
+            stats["review_count"] += review_count
+        previous = (person_id, movie_id)
+
+    for stats in result.values():
+        stats["avg_rating"] = average_rating(stats["rating_sum"], stats["review_count"])
+    return result
+
+
+def rebuild_person_stats(person_ids=None, batch_size=500, dry_run=False):
+    """
+    Recompute the career aggregates of `person_ids` (everyone by default)
+    in primary-key batches. Only people whose stored values differ are
+    written (with bulk_update). Used when credits or movies change, after
+    deferred flushes and imports, and to repair drift: run it after
+    `rebuild_movie_aggregates`, since ratings come from the movies.
+
+    Returns the list of person ids that had drifted.
+    """
+    people = Person.objects.only("id", *PERSON_STATS_FIELDS).order_by("pk")
+
+    def batches():
+        if person_ids is not None:
+            ids = sorted(set(person_ids))
+            for start in range(0, len(ids), batch_size):
+                yield list(people.filter(pk__in=ids[start : start + batch_size]))
+            return
+        last_pk = 0
+        while True:
+            batch = list(people.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield batch
+
+    drifted = []
+    for batch in batches():
+        expected = compute_person_stats([person.pk for person in batch])
+        changed = []
+        for person in batch:
+            values = expected[person.pk]
+            if any(getattr(person, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(person, field, value)
+                changed.append(person)
+
+        drifted.extend(person.pk for person in changed)
+        if changed and not dry_run:
+            Person.objects.bulk_update(changed, PERSON_STATS_FIELDS)
+
+    return drifted
+
+
+# WRITE-BEHIND (DEFERRED MODE)
+
+DIRTY_MOVIES_KEY = "movies:stats:dirty"
+
+
+def stats_deferred():
+    """
+    True when review writes should only mark movies dirty.
+    A dummy cache cannot hold the dirty set, so we stay synchronous there.
+    """
+    return settings.MOVIE_STATS_MODE == "deferred" and not isinstance(caches["default"], DummyCache)
+
+
+def mark_movies_dirty(*movie_ids, key=DIRTY_MOVIES_KEY):
+    """ Add movies to the set recomputed by the next flush (or another dirty set) """
+    redis = redis_connection()
+    if redis is not None:
+        redis.sadd(cache.make_key(key), *movie_ids)
+        return
+
+    # Generic cache backends have no set type: read-modify-write (best effort)
+    dirty = cache.get(key) or set()
+    dirty.update(movie_ids)
+    cache.set(key, dirty, timeout=None)
+
+
+def pop_dirty_movies(limit=10000, key=DIRTY_MOVIES_KEY):
+    """ Atomically take up to `limit` dirty movie ids out of the set """
+    redis = redis_connection()
+    if redis is not None:
+        return [int(movie_id) for movie_id in redis.spop(cache.make_key(key), limit)]
+
+    dirty = cache.get(key) or set()
+    taken = sorted(dirty)[:limit]
+    cache.set(key, dirty.difference(taken), timeout=None)
+    return taken
@@ -0,0 +1,270 @@
+"""
+Async read path of the movies API, for ASGI workers (uvicorn).
+
+GET /api/v1/async/movies/, /api/v1/async/movies/<id>/ and
+/api/v1/async/persons/<id>/ answer like their DRF counterparts (same
+serializers, sparse fieldsets, filters, keyset cursors, tagged cache and
+validators; authentication, permissions and throttling run through the
+DRF viewset) but as async views:
+
+- a movie and its selected relations (genres, crew, latest reviews) are
+  queried with the async ORM and awaited together (asyncio.gather); a list
+  page loads each relation once for the whole page, all relations at once;
+- the cached response and the conditional-GET validators are looked up
+  concurrently, in threads (cache clients are thread-safe), and so are the
+  periodic flushes of the hit/miss counters.
+
+Django runs the async ORM queries of one request on a single thread, so
+they still execute one after another; what an async worker gains is that
+it serves other requests while one waits on the database or the cache.
+Misses are recomputed without the single-flight lock and stale-while-
+revalidate of `cache_response`.
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
+from django.views import View
+
+from apps.movies.cache import (
+    buffer_cache_event,
+    cached_response,
+    encoded_value,
+    fill_reads,
+    flush_cache_events,
+    get_tag_versions,
+    lookup_tagged,
+    not_modified_response,
+    register_variant,
+    set_local,
+    set_tagged,
+    touch_variant,
+    validators_for,
+)
+from apps.movies.local_cache import get_local_cache, local_cache_enabled
+from apps.movies.models import Movie, MovieCrew, Person, Review
+from .renderers import ORJSONRenderer
+from .serializers import LATEST_REVIEWS_COUNT, AsyncMovieListSerializer, AsyncMovieSerializer
+from .views import MovieViewSet, PersonViewSet, selected_columns
+
+
+def in_thread(func, *args):
+    """ Run blocking cache I/O off the event loop, in parallel with other calls """
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def record_cache_event(entity, action, event):
+    """ Counted on the loop; the flush to the shared counters, when due, in a thread """
+    if buffer_cache_event(entity, action, event):
+        await in_thread(flush_cache_events)
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def by_movie(rows, attr):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.movie_id].append(getattr(row, attr) if attr else row)
+    return grouped
+
+
+# RELATIONS
+# Each loader returns {movie id: [objects]} for a set of movies
+
+
+async def load_genres(movie_ids):
+    rows = Movie.genres.through.objects.filter(movie_id__in=movie_ids).select_related("genre")
+    return by_movie(await alist(rows), "genre")
+
+
+async def load_crew(movie_ids):
+    return by_movie(await alist(MovieCrew.objects.filter(movie_id__in=movie_ids).select_related("person")), None)
+
+
+async def load_latest_reviews(movie_ids):
+    newest_first = Window(
+        RowNumber(), partition_by=F("movie_id"), order_by=(F("created_at").desc(), F("id").desc())
+    )
+    reviews = (
+        Review.objects.filter(movie_id__in=movie_ids)
+        .select_related("user")
+        .annotate(newest=newest_first)
+        .filter(newest__lte=LATEST_REVIEWS_COUNT)
+        .order_by("movie_id", "newest")
+    )
+    return by_movie(await alist(reviews), None)
+
+
+# serializer field -> (attribute read by the Async*Serializer, loader)
+RELATIONS = {
+    "genres": ("loaded_genres", load_genres),
+    "crew": ("loaded_crew", load_crew),
+    "latest_reviews": ("prefetched_latest_reviews", load_latest_reviews),
+}
+
+
+async def load_relations(movie_ids, fields):
+    """ {field: {movie id: [objects]}} for the selected relations, queried concurrently """
+    selected = [name for name in RELATIONS if name in fields]
+    loaded = await asyncio.gather(*(RELATIONS[name][1](movie_ids) for name in selected))
+    return dict(zip(selected, loaded))
+
+
+def attach_relations(movies, relations):
+    for name, objects in relations.items():
+        attr = RELATIONS[name][0]
+        for movie in movies:
+            setattr(movie, attr, objects.get(movie.pk, []))
+
+
+# VIEWS
+
+
+class AsyncReadView(View):
+    """
+    One read action of a DRF viewset, served asynchronously. Subclasses
+    implement `load(view, request, **kwargs)`, returning the response data.
+    """
+
+    viewset_class = None
+    action = None
+    timeout = None  # defaults to CACHE_TTL
+    local = False  # per-worker L1 tier
+    http_method_names = ["get"]
+
+    async def get(self, request, **kwargs):
+        view = self.viewset_class()
+        view.action_map = {"get": self.action}
+        view.args, view.kwargs = (), kwargs
+        view.renderer_classes = [ORJSONRenderer]
+        drf_request = view.initialize_request(request, **kwargs)
+        view.request = drf_request
+        view.headers = view.default_response_headers
+        try:
+            # Authentication may query the user: run DRF's checks in the request's thread
+            await sync_to_async(view.initial)(drf_request, **kwargs)
+            response = await self.cached_response(view, drf_request, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(drf_request, response, **kwargs)
+
+    async def cached_response(self, view, request, **kwargs):
+        action, entity = self.action, view.cache_entity
+        key = view.get_response_cache_key(request, action)
+        condition_tags = view.get_condition_tags(action)
+        use_local = self.local and local_cache_enabled()
+
+        since = get_local_cache().generation if use_local else None
+        entry = get_local_cache().get(key) if use_local else None
+        if entry is not None and entry["expires"] > time.time():
+            # No shared cache round trip: the entry's own validators are current
+            await record_cache_event(entity, action, "l1_hit")
+            return cached_response(request, entry["value"])
+
+        versions, (value, needs_refresh) = await asyncio.gather(
+            in_thread(get_tag_versions, condition_tags),
+            in_thread(lookup_tagged, key),
+        )
+        event = "miss" if value is None or needs_refresh else "hit"
+
+        not_modified = not_modified_response(request, *validators_for(versions, request.accepted_media_type))
+        if not_modified is not None:
+            return not_modified
+
+        await record_cache_event(entity, action, event)
+        if event == "hit" and action == "list":
+            await in_thread(touch_variant, entity, key)
+        if event == "miss":
+            started = time.monotonic()
+            # `versions` were read before the load (see set_tagged)
+            with await in_thread(fill_reads, condition_tags, versions):
+                data = await self.load(view, request, **kwargs)
+            body = request.accepted_renderer.render(data, request.accepted_media_type, view.get_renderer_context())
+            value = encoded_value(body, versions, request.accepted_media_type)
+            entry = await in_thread(
+                set_tagged, key, value, view.get_cache_tags(data), self.timeout,
+                settings.CACHE_STALE_TTL, time.monotonic() - started, versions,
+            )
+            if action == "list":
+                await in_thread(register_variant, entity, key)
+            if use_local:
+                set_local(key, entry, since)
+
+        # With the validators of the versions the body was built from
+        return cached_response(request, value)
+
+    async def load(self, view, request, **kwargs):
+        raise NotImplementedError
+
+
+class MovieReadViewSet(MovieViewSet):
+    def get_serializer_class(self):
+        return AsyncMovieListSerializer if self.action == "list" else AsyncMovieSerializer
+
+    def get_queryset(self):
+        # Relations are loaded by the async view, not prefetched
+        return super().get_queryset().prefetch_related(None)
+
+
+class AsyncMovieListView(AsyncReadView):
+    """
+    URL: /api/v1/async/movies/ (same parameters as /api/v1/movies/)
+    """
+
+    viewset_class = MovieReadViewSet
+    action = "list"
+
+    async def load(self, view, request, **kwargs):
+        fields = view.get_serializer_class().selected_field_names(request)
+        # Filtering may touch the database (search backend detection)
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+        paginator = view.paginator
+        movies = await paginator.apaginate_queryset(queryset, request, view)
+        attach_relations(movies, await load_relations([movie.pk for movie in movies], fields))
+        return paginator.get_paginated_response(view.get_serializer(movies, many=True).data).data
+
+
+class AsyncMovieDetailView(AsyncReadView):
+    """
+    URL: /api/v1/async/movies/<id>/
+    """
+
+    viewset_class = MovieReadViewSet
+    action = "retrieve"
+    local = True
+
+    async def load(self, view, request, pk):
+        fields = view.get_serializer_class().selected_field_names(request)
+        queryset = Movie.objects.only(*selected_columns(Movie, fields)).filter(pk=pk)
+        # The movie and its relations at once: the id comes from the URL
+        movies, relations = await asyncio.gather(alist(queryset), load_relations([pk], fields))
+        if not movies:
+            raise Http404(f"No {Movie._meta.object_name} matches the given query.")
+        view.check_object_permissions(request, movies[0])
+        attach_relations(movies, relations)
+        return view.get_serializer(movies[0]).data
+
+
+class AsyncPersonDetailView(AsyncReadView):
+    """
+    URL: /api/v1/async/persons/<id>/
+    """
+
+    viewset_class = PersonViewSet
+    action = "retrieve"
+    timeout = 60 * 15
+
+    async def load(self, view, request, pk):
+        fields = view.get_serializer_class().selected_field_names(request)
+        person = await Person.objects.only(*selected_columns(Person, fields)).filter(pk=pk).afirst()
+        if person is None:
+            raise Http404(f"No {Person._meta.object_name} matches the given query.")
+        view.check_object_permissions(request, person)
+        return view.get_serializer(person).data
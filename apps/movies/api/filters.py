@@ -0,0 +1,74 @@
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from apps.movies.genre_index import MATCH_ALL, MATCH_ANY, get_genre_index, get_genre_names, normalize
+from apps.movies.search import search
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter backed by the full-text engine
+    (apps/movies/search.py). Uses the same `?search=` parameter; results
+    are ranked best match first and every term is prefix-matched.
+
+    Views declare `search_index`; without one this behaves like SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        index = getattr(view, "search_index", None)
+        if index is None:
+            return super().filter_queryset(request, queryset, view)
+        return search(queryset, index, " ".join(self.get_search_terms(request)))
+
+
+class GenreFilter(filters.BaseFilterBackend):
+    """
+    Genre filters resolved through the worker's genre index
+    (apps/movies/genre_index.py), matching names case-insensitively:
+
+    - `?genres__name=Drama`: movies of one genre;
+    - `?genres=Drama,Comedy`: movies in all of the genres, or in any of them
+      with `&genres_match=any`.
+
+    Both can be combined.
+    """
+
+    name_param = "genres__name"
+    genres_param = "genres"
+    match_param = "genres_match"
+
+    def get_genres(self, request):
+        """ (names, match) of the request; names are deduplicated, case folded and sorted """
+        params = request.query_params
+        names = sorted({normalize(name) for name in params.get(self.genres_param, "").split(",") if name.strip()})
+        match = params.get(self.match_param, "").strip().lower() or MATCH_ALL
+        if match not in (MATCH_ALL, MATCH_ANY):
+            raise ValidationError({self.match_param: f'Expected "{MATCH_ALL}" or "{MATCH_ANY}".'})
+        # One genre matches the same movies either way
+        return names, (match if len(names) > 1 else MATCH_ALL)
+
+    def get_cache_params(self, request):
+        """ Canonical values of the parameters, for response cache keys """
+        canonical = {}
+        name = normalize(request.query_params.get(self.name_param, ""))
+        if name:
+            canonical[self.name_param] = name
+        names, match = self.get_genres(request)
+        if names:
+            canonical[self.genres_param] = ",".join(names)
+            if match != MATCH_ALL:
+                canonical[self.match_param] = match
+        return canonical
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.name_param, "").strip()
+        names, match = self.get_genres(request)
+        if not name and not names:
+            return queryset
+        # A single genre only needs the names, not the bitmaps
+        if name:
+            queryset = get_genre_names().filter_one(queryset, name)
+        if len(names) == 1:
+            queryset = get_genre_names().filter_one(queryset, names[0])
+        elif names:
+            queryset = get_genre_index().filter(queryset, names, match)
+        return queryset
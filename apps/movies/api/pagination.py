@@ -0,0 +1,224 @@
+import base64
+import datetime
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Datetimes with their microseconds, tagged so they are parsed back
+    (DjangoJSONEncoder cuts them to milliseconds, and rows within the same
+    millisecond would be skipped).
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return {"dt": o.isoformat()}
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (a.k.a. seek / cursor) pagination.
+
+    Pages are selected with `WHERE (field, id) < (last_field, last_id)` instead
+    of OFFSET, so page 1000 costs the same as page 1 when a matching
+    (field, id) index exists. The ordering comes from the view's OrderingFilter
+    (`?ordering=-average_rating`), falling back to the queryset / model ordering,
+    and `id` is always appended as a tiebreaker so the order is total.
+
+    Cursor tokens are opaque (base64 JSON) and bound to the ordering they were
+    issued for. Ordering fields must be non-nullable. Positions keep their
+    full precision: datetimes travel as ISO 8601 strings with microseconds.
+    """
+
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page, position, reverse = self.get_page_queryset(queryset, request, view)
+        return self.finish_page(list(page), position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """ paginate_queryset for async views (the page is read with the async ORM) """
+        page, position, reverse = self.get_page_queryset(queryset, request, view)
+        return self.finish_page([obj async for obj in page], position, reverse)
+
+    def get_page_queryset(self, queryset, request, view):
+        """ (unevaluated page queryset, cursor position, reverse) """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        position, reverse = self.decode_cursor(request)
+        current = queryset.order_by(*self.ordering)
+        if position is not None:
+            current = current.filter(self.keyset_filter(position, reverse))
+        if reverse:
+            current = current.reverse()
+
+        # Fetch one extra row to know whether there is another page
+        return current[: self.page_size + 1], position, reverse
+
+    def paginate_rows(self, rows, request, ordering, page_size):
+        """
+        First page from rows already read in `ordering`, at most `page_size`
+        + 1 of them (e.g. one partition of a window query); links as usual.
+        """
+        self.request, self.ordering, self.page_size = request, list(ordering), page_size
+        return self.finish_page(list(rows), None, False)
+
+    def finish_page(self, results, position, reverse):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_position = self.get_position(results[0]) if results else None
+        self.last_position = self.get_position(results[-1]) if results else None
+        if not results and reverse:
+            # Walked back past the start: the next page is the first page
+            self.has_next = False
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque pagination cursor taken from `next` / `previous`.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of results per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    # ORDERING
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Ordering terms (e.g. ["-average_rating", "-pk"]) used for this page.
+        """
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering or ["-pk"])
+        if not any(term.lstrip("-") in ("pk", "id") for term in ordering):
+            # Tiebreaker in the same direction as the primary sort key
+            ordering.append("-pk" if ordering[0].startswith("-") else "pk")
+        return ordering
+
+    def keyset_filter(self, position, reverse):
+        """
+        Rows strictly after `position` in the current ordering:
+        (a > x) OR (a = x AND b > y) OR ... with the comparison flipped for
+        descending fields (and for backwards pages).
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for term, value in zip(self.ordering, position):
+            field = term.lstrip("-")
+            descending = term.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= equal_so_far & Q(**{f"{field}__{lookup}": value})
+            equal_so_far &= Q(**{field: value})
+        return condition
+
+    def get_position(self, obj):
+        return [attrgetter(term.lstrip("-").replace("__", "."))(obj) for term in self.ordering]
+
+    # CURSORS
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+            position, reverse, ordering = data["p"], bool(data["r"]), data["o"]
+            position = [self.parse_value(value) for value in position]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering != self.ordering or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def parse_value(self, value):
+        """ A position value as encoded by CursorEncoder """
+        if isinstance(value, dict):
+            parsed = parse_datetime(value["dt"])
+            if parsed is None:
+                raise ValueError(value)
+            return parsed
+        return value
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({"p": position, "r": int(reverse), "o": self.ordering}, cls=CursorEncoder)
+        token = base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_position is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.first_position, reverse=True)
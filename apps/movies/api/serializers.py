@@ -1,4 +1,5 @@
 import os
+from django.db.models import Prefetch
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from apps.movies.models import Movie, Genre, Person, MovieCrew, Review
@@ -28,6 +29,61 @@ def validate_image_extension(file_field):
         )
 
 
+# Sparse Fieldsets
+
+
+def parse_field_list(value):
+    """ "id, title,,crew" -> ["id", "title", "crew"] """
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    `?fields=id,title` keeps only the listed fields and `?expand=crew` adds
+    fields that are left out by default (`Meta.expandable_fields`).
+    Only the top-level serializer of a request is affected, and write-only
+    fields are always kept. Views use `selected_field_names()` to prune
+    their queryset before it is evaluated.
+    """
+
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+        selected = set(self.selected_field_names(request))
+        for name in list(self.fields):
+            if not self.fields[name].write_only and name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_field_names(cls):
+        names = cls.__dict__.get("_readable_field_names")
+        if names is None:
+            names = [name for name, field in cls().fields.items() if not field.write_only]
+            cls._readable_field_names = names
+        return names
+
+    @classmethod
+    def selected_field_names(cls, request):
+        """ Readable fields selected by the request, in declaration order """
+        readable = cls.readable_field_names()
+        expandable = set(getattr(cls.Meta, "expandable_fields", ()))
+        requested = set(parse_field_list(request.query_params.get(cls.fields_query_param)))
+        expand = set(parse_field_list(request.query_params.get(cls.expand_query_param)))
+
+        unknown = (requested | expand).difference(readable)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}"})
+
+        if requested:
+            return [name for name in readable if name in requested or name in expand]
+        return [name for name in readable if name not in expandable or name in expand]
+
+
 # Helper Serializers
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
@@ -35,12 +91,43 @@ class GenreSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
-class PersonSerializer(serializers.ModelSerializer):
+class GenreStatsSerializer(GenreSerializer):
+    """ Genre endpoints: with the maintained stats (movie payloads embed GenreSerializer) """
+
+    class Meta(GenreSerializer.Meta):
+        fields = [*GenreSerializer.Meta.fields, "movie_count", "avg_rating"]
+        read_only_fields = ["movie_count", "avg_rating"]
+
+
+class PersonSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Person
         fields = ["id", "name", "photo", "bio"]
 
 
+class PersonStatsSerializer(serializers.ModelSerializer):
+    """ Filmography header: the person with their maintained career aggregates """
+
+    class Meta:
+        model = Person
+        fields = [*PersonSerializer.Meta.fields, "credit_count", "avg_rating", "first_year", "last_year"]
+        read_only_fields = fields
+
+
+class FilmographyCreditSerializer(serializers.ModelSerializer):
+    """ One credit of a filmography: the movie, flattened, and the character played """
+
+    id = serializers.ReadOnlyField(source="movie.id")
+    title = serializers.ReadOnlyField(source="movie.title")
+    release_date = serializers.DateField(source="movie.release_date", read_only=True)
+    poster = serializers.ImageField(source="movie.poster", read_only=True)
+    average_rating = serializers.ReadOnlyField(source="movie.average_rating")
+
+    class Meta:
+        model = MovieCrew
+        fields = ["id", "title", "release_date", "poster", "average_rating", "character_name"]
+
+
 # Nested Serializers
 class MovieCrewSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source="person.id")
@@ -53,7 +140,7 @@ class MovieCrewSerializer(serializers.ModelSerializer):
 
 
 # Review Serializer
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source="user.name")
 
     class Meta:
@@ -61,8 +148,24 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "rating", "comment", "created_at"]
 
 
+# Number of reviews embedded in a movie payload
+LATEST_REVIEWS_COUNT = 3
+
+
+def latest_reviews_prefetch():
+    """
+    Prefetch only the newest LATEST_REVIEWS_COUNT reviews of each movie
+    (Django turns the slice into a ROW_NUMBER() window per movie) together
+    with their users, instead of every review of every movie.
+    """
+    reviews = Review.objects.select_related("user").order_by("-created_at", "-id")
+    return Prefetch(
+        "reviews", queryset=reviews[:LATEST_REVIEWS_COUNT], to_attr="prefetched_latest_reviews"
+    )
+
+
 # Movie Serializer
-class MovieSerializer(serializers.ModelSerializer):
+class MovieSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     genres = GenreSerializer(many=True, read_only=True)
     crew = MovieCrewSerializer(many=True, read_only=True)
     latest_reviews = serializers.SerializerMethodField()
@@ -89,7 +192,12 @@ class MovieSerializer(serializers.ModelSerializer):
         ]
 
     def get_latest_reviews(self, obj):
-        reviews = obj.reviews.all()[:3]
+        reviews = getattr(obj, "prefetched_latest_reviews", None)
+        if reviews is None:
+            # Not prefetched (e.g. the response of a create/update)
+            reviews = obj.reviews.select_related("user").order_by("-created_at", "-id")[
+                :LATEST_REVIEWS_COUNT
+            ]
         return ReviewSerializer(reviews, many=True).data
 
     # CUSTOM VALIDATIONS 
@@ -124,6 +232,28 @@ class MovieSerializer(serializers.ModelSerializer):
         return value
 
 
+class MovieListSerializer(MovieSerializer):
+    """
+    Compact movie list item: what a listing shows (title, poster, rating).
+    Heavy fields are opt-in, e.g. `?expand=genres,crew`.
+    """
+
+    class Meta(MovieSerializer.Meta):
+        expandable_fields = ["description", "video_file", "genres", "crew", "latest_reviews"]
+
+
+# Async read path (apps/movies/api/async_views.py): relations are queried
+# concurrently beforehand and attached to each movie as plain lists
+class AsyncMovieSerializer(MovieSerializer):
+    genres = GenreSerializer(many=True, read_only=True, source="loaded_genres")
+    crew = MovieCrewSerializer(many=True, read_only=True, source="loaded_crew")
+
+
+class AsyncMovieListSerializer(AsyncMovieSerializer):
+    class Meta(MovieListSerializer.Meta):
+        pass
+
+
 # Crew Write Serializer
 class MovieCrewWriteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,18 @@
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.throttling import AnonRateThrottle
+
+
+#  Custom Throttles
+class LocalAnonRateThrottle(AnonRateThrottle):
+    """
+    Anonymous rate counted in this worker's memory rather than the shared
+    cache, for endpoints cheaper than a cache round trip. Each worker
+    counts on its own, so an address spread over N workers gets up to N
+    times the rate.
+    """
+
+    cache = LocMemCache("throttle", {})
+
+
+class AutocompleteRateThrottle(LocalAnonRateThrottle):
+    scope = "autocomplete"
@@ -1,11 +1,16 @@
 from django.urls import path, include
 from rest_framework_nested import routers
+from .async_views import AsyncMovieDetailView, AsyncMovieListView, AsyncPersonDetailView
 from .views import (
     MovieViewSet,
     GenreViewSet,
     PersonViewSet,
     ReviewViewSet,
     MovieCrewViewSet,
+    AutocompleteView,
+    ChartListView,
+    ChartView,
+    ExportView,
 )
 
 # Main Router (Top Level)
@@ -22,6 +27,17 @@ movies_router.register(r"reviews", ReviewViewSet, basename="movie-reviews")
 movies_router.register(r"crew", MovieCrewViewSet, basename="movie-crew")
 
 urlpatterns = [
+    # URL: /api/v1/autocomplete/?q=
+    path("autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
+    # URL: /api/v1/charts/top-rated/?genre=&page=
+    path("charts/", ChartListView.as_view(), name="chart-list"),
+    path("charts/<slug:chart>/", ChartView.as_view(), name="chart-detail"),
+    # URL: /api/v1/export/movies.ndjson?since= (staff only)
+    path("export/<slug:entity>.<slug:output>", ExportView.as_view(), name="export"),
+    # URL: /api/v1/async/movies/<id>/ (async read path for ASGI workers)
+    path("async/movies/", AsyncMovieListView.as_view(), name="async-movie-list"),
+    path("async/movies/<int:pk>/", AsyncMovieDetailView.as_view(), name="async-movie-detail"),
+    path("async/persons/<int:pk>/", AsyncPersonDetailView.as_view(), name="async-person-detail"),
     path("", include(router.urls)),
     path("", include(movies_router.urls)),
 ]
@@ -1,123 +1,270 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from urllib.parse import urlencode
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import viewsets, filters, permissions, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.core.cache import cache
-from django.conf import settings
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from apps.movies import charts, export
+from apps.movies.autocomplete import get_autocomplete_index
+from apps.movies.cache import TaggedCacheMixin, cache_response, conditional_response
+from apps.movies.search import MOVIE_INDEX, PERSON_INDEX
+from .filters import GenreFilter, RankedSearchFilter
+from .pagination import KeysetPagination
 from .permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
+from .throttling import AutocompleteRateThrottle
 from apps.movies.models import Movie, Genre, Person, Review, MovieCrew
 from .serializers import (
     MovieSerializer,
-    GenreSerializer,
+    MovieListSerializer,
+    GenreStatsSerializer,
     PersonSerializer,
+    PersonStatsSerializer,
+    FilmographyCreditSerializer,
     ReviewSerializer,
     MovieCrewWriteSerializer,
+    latest_reviews_prefetch,
 )
 
 
-class GenreViewSet(viewsets.ModelViewSet):
+def selected_columns(model, fields, *always):
+    """ Concrete model fields among the selected serializer fields, for only() """
+    concrete = {field.name for field in model._meta.concrete_fields}
+    return {"id", *always, *(name for name in fields if name in concrete)}
+
+
+class GenreViewSet(TaggedCacheMixin, viewsets.ModelViewSet):
     queryset = Genre.objects.all()
-    serializer_class = GenreSerializer
+    serializer_class = GenreStatsSerializer
     permission_classes = [IsAdminOrReadOnly]
-    
-    @method_decorator(cache_page(60 * 60))  # Cache for 1 hour
+    cache_entity = "genre"
+
+    # movie_count and avg_rating change with every review: those writes bump
+    # "genre:stats" alone, so movies (tagged with their genres) stay cached
+    def get_cache_tags(self, data):
+        return super().get_cache_tags(data) | {"genre:stats"}
+
+    def get_condition_tags(self, action):
+        return super().get_condition_tags(action) | {"genre:stats"}
+
+    @cache_response(timeout=60 * 60)  # Cache for 1 hour
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-    @method_decorator(cache_page(60 * 60))
+    @cache_response(timeout=60 * 60)
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
 
-class PersonViewSet(viewsets.ModelViewSet):
+class PersonViewSet(TaggedCacheMixin, viewsets.ModelViewSet):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
     search_fields = ["name"]
-    filter_backends = [filters.SearchFilter]
+    search_index = PERSON_INDEX
+    filter_backends = [RankedSearchFilter]
+    cache_entity = "person"
+
+    # Credits of a filmography page, newest first
+    filmography_ordering = ["-movie__release_date", "-pk"]
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            # ?fields= : load only the selected columns
+            fields = self.get_serializer_class().selected_field_names(self.request)
+            queryset = queryset.only(*selected_columns(Person, fields))
+        return queryset
+
+    @cache_response(timeout=60 * 15)  # Cache for 15 minutes
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-    @method_decorator(cache_page(60 * 15))
+    @cache_response(timeout=60 * 15)
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
-
-class MovieViewSet(viewsets.ModelViewSet):
+    # FILMOGRAPHY
+    # Credit, review, person and movie writes bump "person:<id>" of the people involved
+    def get_cache_query(self, request, action="list"):
+        query = super().get_cache_query(request, action)
+        if action != "filmography":
+            return query
+        paginator = self.paginator
+        params = {
+            name: request.query_params[name]
+            for name in ("role", paginator.cursor_query_param)
+            if request.query_params.get(name)
+        }
+        page_size = paginator.get_page_size(request)
+        if page_size != paginator.page_size:
+            params[paginator.page_size_query_param] = page_size
+        return "&".join(part for part in (query, urlencode(sorted(params.items()))) if part)
+
+    def get_cache_tags(self, data):
+        if self.action == "filmography":
+            return {"person:all", f"person:{self.kwargs['pk']}"}
+        return super().get_cache_tags(data)
+
+    def get_condition_tags(self, action):
+        if action == "filmography":
+            return {"person:all", f"person:{self.kwargs['pk']}"}
+        return super().get_condition_tags(action)
+
+    def get_filmography_credits(self, person):
+        return (
+            MovieCrew.objects.filter(person=person)
+            .select_related("movie")
+            .only(
+                "id", "role", "character_name", "person_id",
+                "movie__id", "movie__title", "movie__release_date", "movie__poster", "movie__average_rating",
+            )
+            .order_by(*self.filmography_ordering)
+        )
+
+    @action(detail=True)
+    @cache_response(timeout=60 * 15)
+    def filmography(self, request, pk=None):
+        """
+        URL: /api/v1/persons/{id}/filmography/
+        The person with their career aggregates and the first page of their
+        credits in each role, newest first (one query for all roles).
+        `?role=actor&cursor=` pages through one role, following `next`.
+        """
+        person = self.get_object()
+        credits = self.get_filmography_credits(person)
+        roles = [role for role, _ in MovieCrew.ROLE_CHOICES]
+        role = request.query_params.get("role")
+        context = self.get_serializer_context()
+
+        if role:
+            if role not in roles:
+                raise ValidationError({"role": f"Expected one of: {', '.join(roles)}."})
+            paginator = self.paginator
+            page = paginator.paginate_queryset(credits.filter(role=role), request, view=self)
+            data = FilmographyCreditSerializer(page, many=True, context=context).data
+            return Response({"role": role, **paginator.get_paginated_response(data).data})
+
+        page_size = self.paginator.get_page_size(request)
+        newest_first = (F("movie__release_date").desc(), F("pk").desc())
+        ranked = credits.annotate(
+            position=Window(RowNumber(), partition_by=F("role"), order_by=newest_first),
+            role_count=Window(Count("pk"), partition_by=F("role")),
+        ).filter(position__lte=page_size + 1)
+        by_role = defaultdict(list)
+        for credit in ranked.order_by("role", "position"):
+            by_role[credit.role].append(credit)
+
+        sections = []
+        for name in roles:
+            if not by_role[name]:
+                continue
+            paginator = self.pagination_class()
+            page = paginator.paginate_rows(by_role[name], request, self.filmography_ordering, page_size)
+            next_link = paginator.get_next_link()
+            sections.append({
+                "role": name,
+                "count": page[0].role_count,
+                "next": next_link and replace_query_param(next_link, "role", name),
+                "results": FilmographyCreditSerializer(page, many=True, context=context).data,
+            })
+        return Response({"person": PersonStatsSerializer(person, context=context).data, "roles": sections})
+
+
+class MovieViewSet(TaggedCacheMixin, viewsets.ModelViewSet):
     """
     Main Movie Endpoint.
-    Supports: Filtering, Searching, Ordering, and Caching.
+    Supports: Filtering, Searching, Ordering, Keyset Pagination and Caching.
     """
 
-    queryset = Movie.objects.prefetch_related("genres", "crew__person", "reviews")
+    queryset = Movie.objects.prefetch_related(
+        "genres", "crew__person", latest_reviews_prefetch()
+    )
     serializer_class = MovieSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
 
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        GenreFilter,
+        RankedSearchFilter,
         filters.OrderingFilter,
     ]
-    filterset_fields = ["genres__name", "release_date"]
+    filterset_fields = ["release_date"]
+    # Full-text search over title, description and crew names (ranked)
     search_fields = ["title", "description", "crew__person__name"]
+    search_index = MOVIE_INDEX
     ordering_fields = ["average_rating", "release_date", "total_review_count"]
 
-    # LIST (CACHE) 
-    def list(self, request, *args, **kwargs):
-        # If query params exist → skip cache
-        if request.query_params:
-            return super().list(request, *args, **kwargs)
-
-        cache_key = "movies:list"
-        cached_data = cache.get(cache_key)
+    cache_entity = "movie"
 
-        if cached_data:
-            return Response(cached_data)
+    # SPARSE FIELDSETS: compact list items, ?fields= / ?expand= prune the queryset
+    related_lookups = {
+        "genres": "genres",
+        "crew": "crew__person",
+        "latest_reviews": latest_reviews_prefetch,
+    }
 
-        response = super().list(request, *args, **kwargs)
+    def get_serializer_class(self):
+        if self.action == "list":
+            return MovieListSerializer
+        return super().get_serializer_class()
 
-        cache.set(cache_key, response.data, timeout=settings.CACHE_TTL)
-        return response
+    def get_queryset(self):
+        if self.action not in ("list", "retrieve"):
+            return super().get_queryset()
+        fields = self.get_serializer_class().selected_field_names(self.request)
+        prefetches = [
+            lookup() if callable(lookup) else lookup
+            for name, lookup in self.related_lookups.items()
+            if name in fields
+        ]
+        # Ordering columns are read by the keyset paginator
+        columns = selected_columns(Movie, fields, "release_date", *self.ordering_fields)
+        return Movie.objects.prefetch_related(*prefetches).only(*columns)
+
+    # CACHE (invalidated by entity tags, see apps/movies/cache.py)
+    def get_cache_tags(self, data):
+        tags = super().get_cache_tags(data)
+        for movie in self.get_cached_items(data):
+            tags.update(f"genre:{genre['id']}" for genre in movie.get("genres", ()))
+            tags.update(f"person:{member['id']}" for member in movie.get("crew", ()))
+        return tags
+
+    def get_condition_tags(self, action):
+        # Person writes bump "movie:<id>" of their movies; genre renames are
+        # rare enough to share one collection tag
+        tags = super().get_condition_tags(action)
+        if action == "retrieve":
+            tags.add("genre:all")
+        return tags
+
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-    #  RETRIEVE (CACHE)
+    # Hot titles take most of the traffic: keep their payloads in the worker too
+    @cache_response(local=True)
     def retrieve(self, request, *args, **kwargs):
-        movie_id = kwargs["pk"]
-        cache_key = f"movies:detail:{movie_id}"
-
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-
-        response = super().retrieve(request, *args, **kwargs)
-
-        cache.set(cache_key, response.data, timeout=settings.CACHE_TTL)
-        return response
-
-    # CACHE INVALIDATION
-    def perform_create(self, serializer):
-        serializer.save()
-        cache.delete("movies:list")
-
-    def perform_update(self, serializer):
-        movie = serializer.save()
-        cache.delete("movies:list")
-        cache.delete(f"movies:detail:{movie.id}")
-
-    def perform_destroy(self, instance):
-        movie_id = instance.id
-        instance.delete()
-        cache.delete("movies:list")
-        cache.delete(f"movies:detail:{movie_id}")
+        return super().retrieve(request, *args, **kwargs)
 
 
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = KeysetPagination
     throttle_classes = [ScopedRateThrottle]
     throttle_scope = 'review'
 
@@ -126,7 +273,29 @@ class ReviewViewSet(viewsets.ModelViewSet):
         Only return reviews for the specific movie in the URL.
         URL: /api/v1/movies/{movie_pk}/reviews/
         """
-        return Review.objects.filter(movie_id=self.kwargs["movie_pk"])
+        queryset = Review.objects.filter(movie_id=self.kwargs["movie_pk"])
+        if self.action not in ("list", "retrieve"):
+            return queryset.select_related("user")
+
+        # ?fields= : join the user only when its name is selected
+        fields = self.get_serializer_class().selected_field_names(self.request)
+        columns = selected_columns(Review, fields, "created_at")
+        if "user" in fields:
+            queryset = queryset.select_related("user")
+            columns |= {"user", "user__name"}
+        return queryset.only(*columns)
+
+    # CONDITIONAL GET: every review write bumps its movie's cache tag
+    def get_condition_tags(self, action):
+        return {f"movie:{self.kwargs['movie_pk']}"}
+
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         """
@@ -157,3 +326,166 @@ class MovieCrewViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         movie_id = self.kwargs["movie_pk"]
         serializer.save(movie_id=movie_id)
+
+
+class AutocompleteView(APIView):
+    """
+    Lightweight search-as-you-type for titles and person names.
+    Served from an in-process index, no serializers and (normally) no queries.
+    URL: /api/v1/autocomplete/?q=incep&kind=movie&limit=10
+    """
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    # Generous, per worker: a shared cache round trip would cost more than the lookup
+    throttle_classes = [AutocompleteRateThrottle]
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get("q", "")[:100]
+        kind = request.query_params.get("kind")
+        if kind not in ("movie", "person"):
+            kind = None
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), self.max_limit)
+        except ValueError:
+            limit = 10
+
+        results = get_autocomplete_index().search(query, kind, limit)
+        return Response({"results": results})
+
+
+class ChartListView(APIView):
+    """
+    The available leaderboards.
+    URL: /api/v1/charts/
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(
+            {
+                "computed_at": charts.chart_refreshed_at(),
+                "results": [
+                    {"chart": chart, "url": request.build_absolute_uri(f"{chart}/")}
+                    for chart in charts.CHARTS
+                ],
+            }
+        )
+
+
+class ChartView(APIView):
+    """
+    One page of a precomputed leaderboard, ranked best first.
+    Reading a page costs the same at any rank (see apps/movies/charts.py).
+    URL: /api/v1/charts/top-rated/?genre=Drama&page=2&page_size=50
+    """
+
+    permission_classes = [permissions.AllowAny]
+    page_size = settings.API_PAGE_SIZE
+    max_page_size = 100
+
+    def get(self, request, chart):
+        if chart not in charts.CHARTS:
+            raise NotFound("Unknown chart")
+        genre_name = request.query_params.get("genre")
+        key = chart
+        if genre_name:
+            if chart != charts.TOP_RATED:
+                raise ValidationError({"genre": "Only the top-rated chart is available per genre."})
+            genre = Genre.objects.filter(name__iexact=genre_name).only("id").first()
+            if genre is None:
+                raise NotFound("Unknown genre")
+            key = charts.genre_chart(genre.pk)
+
+        page, page_size = self.get_page(request)
+        offset = (page - 1) * page_size
+        entries, count = charts.read_chart(key, offset, page_size)
+
+        fields = MovieListSerializer.selected_field_names(request)
+        movies = Movie.objects.only(*selected_columns(Movie, fields)).in_bulk([movie_id for movie_id, _ in entries])
+        # Movies deleted since the last refresh are skipped
+        ranked = [(rank, score, movies[movie_id]) for rank, (movie_id, score) in enumerate(entries, offset + 1) if movie_id in movies]
+        serialized = MovieListSerializer(
+            [movie for _, _, movie in ranked], many=True, context={"request": request}
+        ).data
+
+        url = request.build_absolute_uri()
+        return Response(
+            {
+                "chart": chart,
+                "genre": genre_name,
+                "computed_at": charts.chart_refreshed_at(),
+                "count": count,
+                "next": replace_query_param(url, "page", page + 1) if offset + page_size < count else None,
+                "previous": (
+                    None if page == 1
+                    else remove_query_param(url, "page") if page == 2
+                    else replace_query_param(url, "page", page - 1)
+                ),
+                "results": [
+                    {"rank": rank, "score": score, "movie": movie}
+                    for (rank, score, _), movie in zip(ranked, serialized)
+                ],
+            }
+        )
+
+    def get_page(self, request):
+        try:
+            page = max(int(request.query_params.get("page", 1)), 1)
+            page_size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            raise ValidationError({"page": "Expected integers for page and page_size."})
+        return page, min(max(page_size, 1), self.max_page_size)
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """ Exports pick their format from the URL; errors are always JSON """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """
+    Staff-only streaming export of the catalogue, one row per line.
+    URL: /api/v1/export/movies.ndjson?since=2026-01-01T00:00:00Z
+         (movies, persons or reviews; .ndjson or .csv)
+    The X-Export-Started-At header is the `since` for the next incremental run.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    content_negotiation_class = ExportContentNegotiation
+
+    def get(self, request, entity, output):
+        if entity not in export.EXPORTS or output not in export.FORMATS:
+            raise NotFound("Unknown export")
+        since = self.get_since(request)
+        started_at = timezone.now()
+
+        response = StreamingHttpResponse(
+            export.stream_export(entity, output, since), content_type=export.FORMATS[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{entity}.{output}"'
+        response["X-Export-Started-At"] = started_at.isoformat()
+        return response
+
+    def get_since(self, request):
+        value = request.query_params.get("since")
+        if not value:
+            return None
+        try:
+            since = parse_datetime(value)
+            if since is None and parse_date(value) is not None:
+                since = parse_datetime(f"{value}T00:00:00")
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({"since": "Expected an ISO 8601 date or datetime."})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+        return since
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class MoviesConfig(AppConfig):
     name = 'apps.movies'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from apps.movies.metrics import connect_celery_signals
+        from apps.movies.profiling import install_query_hook, instrument_serializers
+        instrument_serializers()
+        connection_created.connect(install_query_hook, dispatch_uid="profiling.install_query_hook")
+        connect_celery_signals()
@@ -0,0 +1,258 @@
+"""
+In-process typeahead index over Movie.title and Person.name.
+
+Each worker keeps a compact, precomputed index:
+
+- a sorted list of (word, entry) pairs, so "every query word is a prefix of
+  some word in the label" is answered with bisect instead of a LIKE scan;
+- the most popular entries for every 1-2 character prefix, which would
+  otherwise match a large share of the catalogue;
+- trigram postings over the word vocabulary, used to correct misspelled
+  words ("intersteller" -> "interstellar") when prefixes find nothing;
+- an LRU of hot queries on top, so repeated prefixes are dictionary lookups.
+
+The index is rebuilt when the shared version key in the cache changes
+(bumped by Movie/Person signals). Workers look at that key at most every
+AUTOCOMPLETE_REFRESH_SECONDS, so a request normally touches neither the
+database nor the cache. Rebuilds run in a background thread that swaps the
+new index in when it is complete; requests keep using the previous one
+meanwhile, so only a worker's very first build is waited for.
+"""
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+
+from apps.movies.models import Movie, Person
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "autocomplete:version"
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+MIN_TRIGRAM_SIMILARITY = 0.3
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_TOP = 100
+
+
+def normalize(text):
+    """ Lowercase, strip accents and punctuation: "Amélie!" -> "amelie" """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    def __init__(self, entries):
+        """
+        `entries` are (result dict, normalized label, popularity) tuples;
+        result dicts are returned as-is, so a hit allocates nothing.
+        """
+        self.results = [entry[0] for entry in entries]
+        self.labels = [entry[1] for entry in entries]
+        self.popularity = array("q", (entry[2] for entry in entries))
+
+        pairs = sorted(
+            (word, position) for position, label in enumerate(self.labels) for word in set(label.split())
+        )
+        self.words = [word for word, _ in pairs]
+        self.word_entries = array("L", (position for _, position in pairs))
+
+        self.short_prefixes = self._top_short_prefixes()
+
+        self.vocabulary = sorted(set(self.words))
+        postings = {}
+        for position, word in enumerate(self.vocabulary):
+            for gram in trigrams(word):
+                postings.setdefault(gram, array("L")).append(position)
+        self.trigram_postings = postings
+
+        self.search = lru_cache(maxsize=settings.AUTOCOMPLETE_LRU_SIZE)(self._search)
+
+    def _top_short_prefixes(self):
+        """ {prefix: most popular entry positions} for prefixes of 1-2 characters """
+        candidates = {}
+        for word, position in zip(self.words, self.word_entries):
+            for length in range(1, SHORT_PREFIX_LENGTH + 1):
+                if len(word) >= length:
+                    candidates.setdefault(word[:length], set()).add(position)
+        return {
+            prefix: heapq.nsmallest(SHORT_PREFIX_TOP, positions, key=self._popularity_rank)
+            for prefix, positions in candidates.items()
+        }
+
+    def _popularity_rank(self, position):
+        return (-self.popularity[position], len(self.labels[position]))
+
+    @classmethod
+    def build(cls):
+        entries = []
+        movies = Movie.objects.order_by().values_list("id", "title", "release_date", "total_review_count")
+        for movie_id, title, release_date, reviews in movies.iterator(chunk_size=5000):
+            result = {"id": movie_id, "title": title, "year": release_date.year, "kind": "movie"}
+            entries.append((result, normalize(title), reviews))
+
+        people = Person.objects.order_by().annotate(credits=Count("movie_credits")).values_list("id", "name", "credits")
+        for person_id, name, credits in people.iterator(chunk_size=5000):
+            result = {"id": person_id, "title": name, "year": None, "kind": "person"}
+            entries.append((result, normalize(name), credits))
+        return cls(entries)
+
+    def _prefix_matches(self, words):
+        """ Entries where every query word prefixes some word of the label """
+        if len(words) == 1 and len(words[0]) <= SHORT_PREFIX_LENGTH:
+            return set(self.short_prefixes.get(words[0], ()))
+
+        # Walk the narrowest range (longest word) and verify the other words
+        anchor = max(words, key=len)
+        rest = list(words)
+        rest.remove(anchor)
+        start = bisect.bisect_left(self.words, anchor)
+        end = bisect.bisect_left(self.words, anchor + "\U0010ffff")
+
+        matches = set()
+        for position in self.word_entries[start:end]:
+            if position in matches:
+                continue
+            label_words = self.labels[position].split()
+            if all(any(word.startswith(term) for word in label_words) for term in rest):
+                matches.add(position)
+        return matches
+
+    def _has_prefix(self, term):
+        position = bisect.bisect_left(self.vocabulary, term)
+        return position < len(self.vocabulary) and self.vocabulary[position].startswith(term)
+
+    def _correct(self, term):
+        """ Most similar vocabulary word by trigram similarity, or None """
+        grams = trigrams(term)
+        # similarity >= threshold needs at least `required` shared trigrams, so
+        # every match appears in one of the (len - required + 1) rarest postings
+        required = max(1, math.ceil(MIN_TRIGRAM_SIMILARITY * len(grams)))
+        rarest = sorted(grams, key=lambda gram: len(self.trigram_postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[: len(grams) - required + 1]:
+            candidates.update(self.trigram_postings.get(gram, ()))
+
+        best, best_similarity = None, MIN_TRIGRAM_SIMILARITY
+        for position in candidates:
+            word_grams = trigrams(self.vocabulary[position])
+            similarity = len(grams & word_grams) / len(grams | word_grams)
+            if similarity >= best_similarity:
+                best, best_similarity = self.vocabulary[position], similarity
+        return best
+
+    def _fuzzy_matches(self, words):
+        """ Prefix matches after correcting the words that match nothing """
+        corrected = []
+        for word in words:
+            if not self._has_prefix(word):
+                word = self._correct(word) if len(word) >= 3 else None
+                if word is None:
+                    return set()
+            corrected.append(word)
+        return self._prefix_matches(corrected) if corrected != words else set()
+
+    def _search(self, query, kind=None, limit=10):
+        query = normalize(query)
+        if not query:
+            return ()
+
+        def rank(position):
+            # Label starting with the whole query first, then popularity, then shorter labels
+            label = self.labels[position]
+            return (not label.startswith(query), -self.popularity[position], len(label))
+
+        def wanted(position):
+            return kind is None or self.results[position]["kind"] == kind
+
+        words = query.split()
+        found = heapq.nsmallest(limit, filter(wanted, self._prefix_matches(words)), key=rank)
+        if not found:
+            found = heapq.nsmallest(limit, filter(wanted, self._fuzzy_matches(words)), key=rank)
+        return tuple(self.results[position] for position in found)
+
+
+class _IndexState:
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.stale = False
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+
+
+_state = _IndexState()
+
+
+def get_autocomplete_index():
+    """
+    The worker's index. A stale one keeps being served while its replacement
+    is built (by one thread at a time); only the first build blocks.
+    """
+    state = _state
+    now = time.monotonic()
+    if state.index is not None and not state.stale and now < state.next_check:
+        return state.index
+
+    version = cache.get(VERSION_KEY)
+    state.next_check = now + settings.AUTOCOMPLETE_REFRESH_SECONDS
+    if state.index is not None and not state.stale and version == state.version:
+        return state.index
+
+    if state.index is None:
+        with state.lock:
+            if state.index is None:
+                _rebuild(state, version)
+    elif state.lock.acquire(blocking=False):
+        if settings.AUTOCOMPLETE_BACKGROUND_REBUILD:
+            threading.Thread(
+                target=_rebuild_in_background, args=(state, version), name="autocomplete-rebuild", daemon=True
+            ).start()
+        else:
+            try:
+                _rebuild(state, version)
+            finally:
+                state.lock.release()
+    return state.index
+
+
+def _rebuild(state, version):
+    # Cleared first: a write during the build marks the new index stale again
+    state.stale = False
+    index = AutocompleteIndex.build()
+    state.index, state.version = index, version
+
+
+def _rebuild_in_background(state, version):
+    """ Thread target, entered holding `state.lock` """
+    try:
+        _rebuild(state, version)
+    except Exception:
+        state.stale = True  # retried by a later request
+        logger.exception("Autocomplete index rebuild failed")
+    finally:
+        connections.close_all()
+        state.lock.release()
+
+
+def invalidate_autocomplete():
+    """ Rebuild here on the next request and tell other workers via the cache """
+    _state.stale = True
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
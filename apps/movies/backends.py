@@ -0,0 +1,25 @@
+"""
+What the configured cache backend offers beyond the Django cache API.
+
+Several subsystems use Redis directly when it backs the default cache (the
+deferred stats dirty set, the chart sorted sets, the L1 invalidation bus)
+and fall back to the generic cache API otherwise.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def cache_is_shared():
+    """ Whether other processes see what this one writes to the default cache """
+    return not isinstance(caches["default"], (DummyCache, LocMemCache))
+
+
+def redis_connection():
+    """ Raw Redis client when the default cache is django-redis, else None """
+    if not settings.CACHES["default"]["BACKEND"].startswith("django_redis"):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
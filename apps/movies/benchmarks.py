@@ -0,0 +1,367 @@
+"""
+Load benchmark of the main API endpoints.
+
+Each scenario replays requests through the Django test client against the
+current database (see `generate_dataset` for a synthetic one) and records
+per request the wall time and the number of SQL queries, plus the peak
+Python memory of one traced pass. Requests are spread over many client
+addresses and users, like real traffic, so throttling does not kick in.
+
+Movie ids are drawn with a Zipf law over the most reviewed movies, so that
+hot titles dominate as they do in production, and whether responses come
+from the cache is up to the caller (`clear_cache`).
+
+`run_server_benchmark` instead measures throughput over real HTTP: it
+starts gunicorn (WSGI, the render.yaml setup) and uvicorn (ASGI, serving
+the async read path of apps/movies/api/async_views.py) with the same
+number of workers and drives each with a fixed number of concurrent
+keep-alive connections for a while.
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.movies.cache import clear_response_cache
+from apps.movies.models import Genre, Movie
+from apps.movies.synthetic import zipf_cum_weights
+
+HOT_MOVIES = 1000
+
+
+class BenchmarkContext:
+    """ What the scenarios draw their requests from """
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.movie_ids = list(
+            Movie.objects.order_by("-total_review_count", "-pk").values_list("pk", flat=True)[:HOT_MOVIES]
+        )
+        self.movie_weights = zipf_cum_weights(len(self.movie_ids), 1.1)
+        self.genres = list(Genre.objects.values_list("name", flat=True))
+        titles = Movie.objects.order_by("pk").values_list("title", flat=True)[:200]
+        self.search_terms = sorted({word.lower() for title in titles for word in title.split() if len(word) > 3})
+        self.users = list(get_user_model().objects.filter(is_active=True).order_by("pk")[:500])
+        self.request_number = 0
+
+    def movie_id(self):
+        return self.rng.choices(self.movie_ids, cum_weights=self.movie_weights)[0]
+
+    def client_address(self):
+        self.request_number += 1
+        number = self.request_number
+        return f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+
+    def auth_header(self):
+        """ Bearer token of a user taking turns, so no user hits a rate limit """
+        user = self.users[self.request_number % len(self.users)]
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+# SCENARIOS
+# Each returns (method, path, data, extra request headers)
+
+
+def movie_list(ctx):
+    return "get", "/api/v1/movies/", {}, {}
+
+
+def movie_list_filtered(ctx):
+    ordering = ctx.rng.choice(["-average_rating", "-total_review_count", "release_date"])
+    return "get", "/api/v1/movies/", {"genres__name": ctx.rng.choice(ctx.genres), "ordering": ordering}, {}
+
+
+def movie_detail(ctx):
+    return "get", f"/api/v1/movies/{ctx.movie_id()}/", {}, {}
+
+
+def movie_reviews(ctx):
+    return "get", f"/api/v1/movies/{ctx.movie_id()}/reviews/", {}, {}
+
+
+def search(ctx):
+    return "get", "/api/v1/movies/", {"search": ctx.rng.choice(ctx.search_terms)}, {}
+
+
+def autocomplete(ctx):
+    term = ctx.rng.choice(ctx.search_terms)
+    return "get", "/api/v1/autocomplete/", {"q": term[: ctx.rng.randint(2, len(term))]}, {}
+
+
+def review_create(ctx):
+    # Long-tail movies: few of the rotating users have reviewed them yet
+    movie_id = ctx.rng.choice(ctx.movie_ids[len(ctx.movie_ids) // 2:] or ctx.movie_ids)
+    data = json.dumps({"rating": ctx.rng.randint(1, 10), "comment": "Benchmark review"})
+    return "post", f"/api/v1/movies/{movie_id}/reviews/", data, ctx.auth_header()
+
+
+SCENARIOS = {
+    "movie_list": movie_list,
+    "movie_list_filtered": movie_list_filtered,
+    "movie_detail": movie_detail,
+    "movie_reviews": movie_reviews,
+    "search": search,
+    "autocomplete": autocomplete,
+    "review_create": review_create,
+}
+WRITE_SCENARIOS = {"review_create"}
+
+
+# RUNNER
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of a non-empty list """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def _send(client, method, path, data, extra):
+    if method == "get":
+        return client.get(path, data, **extra)
+    return client.generic(method.upper(), path, data, content_type="application/json", **extra)
+
+
+def _build(ctx, build):
+    method, path, data, extra = build(ctx)
+    return method, path, data, {"REMOTE_ADDR": ctx.client_address(), **extra}
+
+
+def run_scenario(name, ctx, iterations=100, warmup=10, clear_cache=False):
+    build = SCENARIOS[name]
+    client = Client()
+    latencies, queries, sizes = [], [], []
+    errors = 0
+
+    for i in range(warmup + iterations):
+        if clear_cache:
+            clear_response_cache()
+        request = _build(ctx, build)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = _send(client, *request)
+            elapsed = (time.perf_counter() - started) * 1000
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        queries.append(len(captured))
+        sizes.append(len(response.content))
+        errors += response.status_code >= 400
+
+    # Separate pass: tracing slows requests down too much to time them
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, 10)):
+            request = _build(ctx, build)
+            _send(client, *request)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p90_ms": round(percentile(latencies, 0.9), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries_mean": round(statistics.fmean(queries), 2),
+        "queries_max": max(queries),
+        "bytes_mean": round(statistics.fmean(sizes)),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(scenarios=None, iterations=100, warmup=10, clear_cache=False, seed=0, writes=True, progress=None):
+    """ Run scenarios (all by default) and return a JSON-serializable report """
+    names = [name for name in (scenarios or SCENARIOS) if writes or name not in WRITE_SCENARIOS]
+    ctx = BenchmarkContext(seed)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1],
+            "movies": Movie.objects.count(),
+            "iterations": iterations,
+            "warmup": warmup,
+            "clear_cache": clear_cache,
+            "seed": seed,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        report["scenarios"][name] = result = run_scenario(name, ctx, iterations, warmup, clear_cache)
+        if progress:
+            progress(name, result)
+    return report
+
+
+def compare_reports(baseline, current):
+    """ {scenario: {metric: (baseline, current, change ratio)}} for the shared scenarios """
+    metrics = ["p50_ms", "p99_ms", "queries_mean", "peak_memory_kib"]
+    comparison = {}
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        comparison[name] = {
+            metric: (before[metric], result[metric], result[metric] / before[metric] if before[metric] else None)
+            for metric in metrics
+        }
+    return comparison
+
+
+# SERVERS
+
+# name -> (command, API prefix); {port} and {workers} are filled in
+SERVERS = {
+    "wsgi": (
+        "gunicorn core.wsgi:application --bind 127.0.0.1:{port} --workers {workers} --log-level warning",
+        "/api/v1/",
+    ),
+    "asgi": (
+        "{python} -m uvicorn core.asgi:application --host 127.0.0.1 --port {port} --workers {workers} "
+        "--log-level warning --no-access-log",
+        "/api/v1/async/",
+    ),
+}
+# Read scenarios that both servers answer
+SERVER_SCENARIOS = {"movie_list", "movie_list_filtered", "movie_detail"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(name, workers=1, env=None, startup_timeout=30):
+    """ Run one of SERVERS in a subprocess; yields (port, API prefix) """
+    command, prefix = SERVERS[name]
+    port = free_port()
+    args = command.format(python=sys.executable, port=port, workers=workers).split()
+    process = subprocess.Popen(args, env={**os.environ, **(env or {})})
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} server exited with status {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{name} server did not start in {startup_timeout}s")
+                time.sleep(0.2)
+        yield port, prefix
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _http_get(connection, port, path, address):
+    """ One keep-alive GET; returns (status, connection still usable) """
+    reader, writer = connection
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nX-Forwarded-For: {address}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+        return status, headers.get("connection", "").lower() != "close"
+    await reader.read()  # no length: the body ends with the connection
+    return status, False
+
+
+async def _drive(ctx, port, prefix, scenario, duration, concurrency):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        connection = None
+        while time.perf_counter() < deadline:
+            method, path, data, _ = SCENARIOS[scenario](ctx)
+            path = prefix + path[len("/api/v1/"):]
+            if data:
+                path += "?" + urlencode(data)
+            if connection is None:
+                connection = await asyncio.open_connection("127.0.0.1", port)
+            started = time.perf_counter()
+            try:
+                status, reusable = await _http_get(connection, port, path, ctx.client_address())
+            except (OSError, asyncio.IncompleteReadError):
+                status, reusable = 599, False
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+            if not reusable:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def run_server_benchmark(
+    servers=("wsgi", "asgi"), scenarios=None, duration=10.0, concurrency=32, workers=1, seed=0, env=None,
+    progress=None,
+):
+    """ Requests per second per worker of each server and scenario, as a JSON-serializable report """
+    names = [name for name in (scenarios or sorted(SERVER_SCENARIOS)) if name in SERVER_SCENARIOS]
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1],
+            "movies": Movie.objects.count(),
+            "duration": duration,
+            "concurrency": concurrency,
+            "workers": workers,
+            "seed": seed,
+        },
+        "servers": {},
+    }
+    for server in servers:
+        report["servers"][server] = results = {}
+        with serve(server, workers, env) as (port, prefix):
+            for name in names:
+                ctx = BenchmarkContext(seed)
+                latencies, errors = asyncio.run(_drive(ctx, port, prefix, name, duration, concurrency))
+                results[name] = result = {
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "rps_per_worker": round(len(latencies) / duration / workers, 1),
+                    "p50_ms": round(statistics.median(latencies) * 1000, 3) if latencies else None,
+                    "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+                }
+                if progress:
+                    progress(server, name, result)
+    return report
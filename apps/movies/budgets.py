@@ -0,0 +1,314 @@
+"""
+Performance budgets for every API endpoint.
+
+`ENDPOINTS` declares, for each route of apps/movies/api/urls.py and
+apps/accounts/api/urls.py, one or more requests and the budget they must
+stay within: SQL queries, wall time and response size. A budget may differ
+per dataset size (see `DATASETS`); query budgets normally do not, since a
+count that grows with the data is exactly the N+1 they are meant to catch.
+
+Requests are measured with a cold response cache, so cached endpoints are
+held to what a miss costs. `tests_budgets.py` runs every endpoint against
+the "small" dataset and requires every route to be declared here; it
+checks queries and size only, since wall time depends on the machine.
+`manage.py check_budgets` checks all three on a generated database of any
+size. A violation reports the SQL of the request, with the queries past
+the budget marked "+" and repeated statements grouped.
+"""
+import re
+import time
+from collections import Counter
+from itertools import count
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.movies.cache import clear_response_cache
+from apps.movies.genre_index import get_genre_index, get_genre_names
+from apps.movies.models import Genre, Movie, MovieCrew, Person, Review
+
+# urlconf -> where core/urls.py mounts it
+URLCONFS = {
+    "apps.movies.api.urls": "/api/v1",
+    "apps.accounts.api.urls": "/api/auth",
+}
+
+# Arguments of apps.movies.synthetic.generate_dataset
+DATASETS = {
+    "small": {"movies": 40, "people": 80, "users": 30, "reviews": 400, "seed": 1},
+    "medium": {"movies": 5000, "people": 3000, "users": 1000, "reviews": 50000, "seed": 1},
+}
+
+
+class Budget:
+    def __init__(self, queries, ms, kib):
+        self.queries = queries
+        self.ms = ms
+        self.kib = kib
+
+
+class Endpoint:
+    """
+    One request against a named route. `kwargs` and `data` may be callables
+    taking the BudgetContext, evaluated before every measured request.
+    """
+
+    def __init__(self, urlconf, name, budget, method="get", kwargs=None, data=None, user=None, label=None):
+        self.urlconf = urlconf
+        self.name = name
+        self.budget = budget  # a Budget, or {dataset size: Budget}
+        self.method = method
+        self.kwargs = kwargs
+        self.data = data
+        self.user = user  # None, "user" or "admin"
+        self.label = label or f"{name} {method.upper()}"
+
+    def budget_for(self, size):
+        if isinstance(self.budget, dict):
+            return self.budget.get(size) or self.budget["small"]
+        return self.budget
+
+    def path(self, ctx):
+        kwargs = self.kwargs(ctx) if callable(self.kwargs) else self.kwargs
+        return URLCONFS[self.urlconf] + reverse(self.name, urlconf=self.urlconf, kwargs=kwargs)
+
+
+MOVIES, ACCOUNTS = "apps.movies.api.urls", "apps.accounts.api.urls"
+
+ENDPOINTS = [
+    # Movies
+    Endpoint(MOVIES, "api-root", Budget(0, 50, 1), user="user"),
+    Endpoint(MOVIES, "movie-list", Budget(1, 150, 8)),
+    Endpoint(
+        MOVIES, "movie-list", Budget(5, 300, 64), label="movie-list GET expanded",
+        data={"expand": "description,genres,crew,latest_reviews"},
+    ),
+    Endpoint(
+        MOVIES, "movie-list", Budget(1, 150, 8), label="movie-list GET filtered",
+        data=lambda ctx: {"genres__name": ctx.genre.name, "ordering": "-average_rating"},
+    ),
+    # Multi-genre filters are answered by the worker's genre index
+    Endpoint(
+        MOVIES, "movie-list", Budget(1, 150, 8), label="movie-list GET genres all",
+        data=lambda ctx: {"genres": ",".join(ctx.genres), "ordering": "-average_rating"},
+    ),
+    Endpoint(
+        MOVIES, "movie-list", Budget(1, 150, 8), label="movie-list GET genres any",
+        data=lambda ctx: {"genres": ",".join(ctx.genres), "genres_match": "any"},
+    ),
+    Endpoint(MOVIES, "movie-list", Budget(1, 200, 8), label="movie-list GET search", data={"search": "the"}),
+    Endpoint(MOVIES, "movie-detail", Budget(5, 150, 8), kwargs=lambda ctx: {"pk": ctx.movie.pk}),
+    Endpoint(MOVIES, "genre-list", Budget(1, 50, 2)),
+    Endpoint(MOVIES, "genre-detail", Budget(1, 50, 1), kwargs=lambda ctx: {"pk": ctx.genre.pk}),
+    Endpoint(MOVIES, "person-list", Budget(1, 100, 4)),
+    Endpoint(MOVIES, "person-detail", Budget(1, 50, 2), kwargs=lambda ctx: {"pk": ctx.person.pk}),
+    # The person, then the first page of every role in one window query
+    Endpoint(MOVIES, "person-filmography", Budget(2, 100, 16), kwargs=lambda ctx: {"pk": ctx.credited.pk}),
+    Endpoint(
+        MOVIES, "person-filmography", Budget(2, 100, 8), label="person-filmography GET role",
+        kwargs=lambda ctx: {"pk": ctx.credited.pk}, data={"role": "actor"},
+    ),
+    Endpoint(MOVIES, "movie-reviews-list", Budget(1, 100, 8), kwargs=lambda ctx: {"movie_pk": ctx.movie.pk}),
+    # Rating deltas: one UPDATE of the movie, one of its genres, one of its
+    # people (whose ids are read first, to invalidate their filmographies)
+    Endpoint(
+        MOVIES, "movie-reviews-list", Budget(7, 200, 1), method="post", user="user",
+        kwargs=lambda ctx: {"movie_pk": ctx.movie.pk},
+        data={"rating": 7, "comment": "Budget check"},
+    ),
+    Endpoint(
+        MOVIES, "movie-reviews-detail", Budget(1, 50, 1),
+        kwargs=lambda ctx: {"movie_pk": ctx.movie.pk, "pk": ctx.review.pk},
+    ),
+    Endpoint(MOVIES, "movie-crew-list", Budget(1, 50, 4), kwargs=lambda ctx: {"movie_pk": ctx.movie.pk}),
+    Endpoint(
+        MOVIES, "movie-crew-detail", Budget(1, 50, 1),
+        kwargs=lambda ctx: {"movie_pk": ctx.movie.pk, "pk": ctx.credit.pk},
+    ),
+    # Async read path: one query per selected relation, run concurrently
+    Endpoint(MOVIES, "async-movie-list", Budget(1, 150, 8)),
+    Endpoint(
+        MOVIES, "async-movie-list", Budget(4, 300, 64), label="async-movie-list GET expanded",
+        data={"expand": "description,genres,crew,latest_reviews"},
+    ),
+    Endpoint(MOVIES, "async-movie-detail", Budget(4, 150, 8), kwargs=lambda ctx: {"pk": ctx.movie.pk}),
+    Endpoint(MOVIES, "async-person-detail", Budget(1, 50, 2), kwargs=lambda ctx: {"pk": ctx.person.pk}),
+    # Queries only when the worker (re)builds its index
+    Endpoint(MOVIES, "autocomplete", Budget(2, 150, 2), data={"q": "th"}),
+    Endpoint(MOVIES, "chart-list", Budget(0, 50, 1)),
+    Endpoint(MOVIES, "chart-detail", Budget(3, 100, 8), kwargs={"chart": "top-rated"}),
+    # One query plus two prefetches per EXPORT_CHUNK_SIZE movies
+    Endpoint(
+        MOVIES, "export", {"small": Budget(3, 300, 96), "medium": Budget(7, 5000, 8192)}, user="admin",
+        kwargs={"entity": "movies", "output": "ndjson"},
+    ),
+    # Accounts (password hashing dominates register and login)
+    Endpoint(ACCOUNTS, "api-root", Budget(0, 50, 1), user="user"),
+    Endpoint(
+        ACCOUNTS, "register", Budget(2, 2000, 1), method="post",
+        data=lambda ctx: {
+            "email": ctx.unique_email("budget-signup"), "name": "Budget",
+            "password": BudgetContext.password, "password2": BudgetContext.password,
+        },
+    ),
+    Endpoint(
+        ACCOUNTS, "login", Budget(2, 3000, 1), method="post",
+        data=lambda ctx: {"email": ctx.user.email, "password": BudgetContext.password},
+    ),
+    Endpoint(ACCOUNTS, "token_refresh", Budget(1, 50, 1), method="post", data=lambda ctx: {"refresh": ctx.refresh}),
+    Endpoint(ACCOUNTS, "profile-list", Budget(1, 50, 1), user="user"),
+    Endpoint(ACCOUNTS, "profile-detail", Budget(0, 50, 1), user="user", kwargs=lambda ctx: {"pk": ctx.user.pk}),
+]
+
+
+# HARNESS
+
+
+class BudgetContext:
+    """ Objects the endpoint requests point at, picked from the seeded data """
+
+    password = "budget-password-123"
+
+    def __init__(self):
+        User = get_user_model()
+        self.admin = User.objects.filter(email="budget-admin@example.com").first() or User.objects.create_superuser(
+            email="budget-admin@example.com", name="Budget Admin", password=self.password
+        )
+        self.user = User.objects.filter(email="budget-user@example.com").first() or User.objects.create_user(
+            email="budget-user@example.com", name="Budget User", password=self.password
+        )
+        self.refresh = str(RefreshToken.for_user(self.user))
+        # The busiest movie: most reviews and (usually) a full crew
+        self.movie = Movie.objects.order_by("-total_review_count", "pk").first()
+        self.review = Review.objects.filter(movie=self.movie).order_by("pk").first()
+        self.credit = MovieCrew.objects.filter(movie=self.movie).order_by("pk").first()
+        self.person = Person.objects.order_by("pk").first()
+        self.credited = Person.objects.order_by("-credit_count", "pk").first()
+        self.genre = Genre.objects.order_by("pk").first()
+        self.genres = list(Genre.objects.order_by("-movie_count", "pk").values_list("name", flat=True)[:2])
+        # Keeps emails unique when a persistent database is checked repeatedly
+        self.run = uuid4().hex[:8]
+        self.sequence = count()
+
+    def unique_email(self, prefix):
+        return f"{prefix}-{self.run}-{next(self.sequence)}@example.com"
+
+    def fresh_reviewer(self):
+        """ A user who has not reviewed anything yet (and is not throttled) """
+        return get_user_model().objects.create_user(email=self.unique_email("budget-reviewer"), name="Budget Reviewer")
+
+
+class Measurement:
+    def __init__(self, endpoint, budget, status, queries, ms, size, timed=True):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.status = status
+        self.queries = queries  # SQL of the median run
+        self.ms = ms
+        self.size = size
+        self.timed = timed  # whether the wall time budget applies
+
+    @property
+    def violations(self):
+        problems = []
+        if self.status >= 400:
+            problems.append(f"status {self.status}")
+        if len(self.queries) > self.budget.queries:
+            problems.append(f"{len(self.queries)} queries > {self.budget.queries}")
+        if self.timed and self.ms > self.budget.ms:
+            problems.append(f"{self.ms:.1f} ms > {self.budget.ms} ms")
+        if self.size > self.budget.kib * 1024:
+            problems.append(f"{self.size / 1024:.1f} KiB > {self.budget.kib} KiB")
+        return problems
+
+    def report(self):
+        """ The violations, then the SQL: "+" past the query budget, repeats grouped """
+        lines = [f"{self.endpoint.label}: {', '.join(self.violations)}"]
+        if len(self.queries) > self.budget.queries:
+            for number, sql in enumerate(self.queries, 1):
+                lines.append(f"{'+' if number > self.budget.queries else ' '} {number:>3}. {sql}")
+            repeated = Counter(normalize_sql(sql) for sql in self.queries)
+            for shape, times in repeated.most_common():
+                if times > 1:
+                    lines.append(f"  repeated {times}x: {shape}")
+        return "\n".join(lines)
+
+
+NUMBER_RE = re.compile(r"\b\d+\b")
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def normalize_sql(sql):
+    """ Statement shape with literals replaced, to spot N+1 patterns """
+    return NUMBER_RE.sub("?", STRING_RE.sub("?", sql))
+
+
+def client_for(endpoint, ctx):
+    client = APIClient()
+    if endpoint.user == "admin":
+        client.force_authenticate(ctx.admin)
+    elif endpoint.user == "user":
+        client.force_authenticate(ctx.fresh_reviewer() if endpoint.method == "post" else ctx.user)
+    return client
+
+
+def measure(endpoint, ctx, size="small", runs=3, timed=True):
+    """ Median of `runs` cold-cache requests """
+    timings = []
+    for _ in range(runs):
+        clear_response_cache()
+        # Built once per worker, not per request
+        get_genre_names()
+        get_genre_index()
+        client = client_for(endpoint, ctx)
+        path = endpoint.path(ctx)
+        data = endpoint.data(ctx) if callable(endpoint.data) else endpoint.data
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, endpoint.method)(path, data, format="json" if endpoint.method != "get" else None)
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+            elapsed = (time.perf_counter() - started) * 1000
+        timings.append((elapsed, response.status_code, [query["sql"] for query in captured.captured_queries], len(body)))
+
+    ms, status, queries, size_bytes = sorted(timings, key=lambda timing: timing[0])[len(timings) // 2]
+    return Measurement(endpoint, endpoint.budget_for(size), status, queries, ms, size_bytes, timed)
+
+
+def declared_routes():
+    return {(endpoint.urlconf, endpoint.name) for endpoint in ENDPOINTS}
+
+
+def routes(urlconf):
+    """ Names of every route in a urlconf (format-suffix variants included once) """
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+
+    walk(get_resolver(urlconf).url_patterns)
+    return names
+
+
+def undeclared_routes():
+    return sorted(
+        (urlconf, name) for urlconf in URLCONFS for name in routes(urlconf) if (urlconf, name) not in declared_routes()
+    )
+
+
+def check_budgets(size="small", runs=3, timed=True):
+    """
+    Measurements of every declared endpoint, in declaration order. With
+    `timed=False` the wall time is reported but not held to its budget.
+    """
+    ctx = BudgetContext()
+    return [measure(endpoint, ctx, size, runs, timed) for endpoint in ENDPOINTS]
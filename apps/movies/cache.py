@@ -0,0 +1,731 @@
+"""
+Tag-based response cache for the movies API.
+
+Every cached response records the version of each entity tag it was built
+from ("movie:12", "person:7", "genre:3", and collection tags such as
+"movie:all"). Writes bump the versions of the tags they affect (see the
+signal handlers in apps/movies/models.py); an entry whose recorded versions
+no longer match is treated as a miss. Invalidation therefore costs one
+cache write per tag and reaches exactly the dependent entries, including
+every filtered, searched and ordered list variant, without having to know
+their keys. The versions of the tags known from the URL are read before
+the response is computed, so a write committing meanwhile leaves the new
+entry stale rather than fresh with the old data.
+
+List variants are keyed by a canonical form of the query string (see
+TaggedCacheMixin.get_cache_query), so equivalent URLs share one entry, and
+each entity keeps at most CACHE_LIST_VARIANT_BUDGET list variants, evicting
+the least recently used. Hit/miss counters per view are kept in the cache
+(`python manage.py cache_stats`).
+
+Expired or invalidated entries are recomputed by a single worker
+(single-flight lock: `cache.add` in the shared cache, a local lock when the
+cache is unreachable) while the others keep serving the stale value for up
+to CACHE_STALE_TTL. With CACHE_XFETCH_BETA > 0, hot entries are refreshed
+probabilistically shortly before they expire (XFetch), so most refreshes
+happen without anyone ever seeing an expired entry.
+
+What is cached is the final JSON body (bytes) with its validators, so a hit is
+returned as-is: no unpickling of nested serializer output and no
+re-rendering. Requests negotiated to another renderer (the browsable API,
+indented JSON) bypass the cache.
+
+Conditional GET: validators (a weak ETag and Last-Modified) are derived
+from the versions of the tags a request depends on, which are known from
+the URL alone (`get_condition_tags`). Tag versions are timestamps, so the
+newest one is the Last-Modified date. A request matching the current
+versions is answered with 304 before the cache or the database is touched.
+A cached body is sent with the validators of the versions it was built
+from, so a stale one served during a refresh never carries the ETag of the
+data replacing it.
+
+Views can opt in to a per-worker L1 in front of all this (`local=True`, see
+apps/movies/local_cache.py), invalidated through the same tags over a
+pub/sub bus. L1 hits, conditional ones included, make no shared cache round
+trip: they are answered with the validators stored in the entry, which are
+current as long as it has not been dropped.
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.response import Response
+
+from apps.movies.local_cache import clear_local_cache, get_invalidation_bus, get_local_cache, local_cache_enabled
+from apps.movies.metrics import record_cache_lookup
+from apps.movies.profiling import record_cache, span
+from apps.movies.replicas import primary_reads, recently_written, replicas_enabled
+from apps.movies.search import parse_terms
+
+TAG_KEY_PREFIX = "tag:"
+STATS_KEY_PREFIX = "cache:stats:"
+EVENTS = ("l1_hit", "hit", "stale", "miss")
+# Hits refresh a variant's LRU position at most this often (seconds) per worker
+VARIANT_TOUCH_INTERVAL = 60
+
+
+def _tag_key(tag):
+    return f"{TAG_KEY_PREFIX}{tag}"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_tag_versions(tags):
+    """
+    Current version of each tag. Unknown (or evicted) tags get a fresh
+    version, so entries recorded against an older one can never match.
+    """
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update({keys[key]: version for key, version in missing.items()})
+    return versions
+
+
+def invalidate_tags(*tags):
+    """ Bump tag versions: every entry depending on them becomes stale """
+    version = _new_version()
+    cache.set_many({_tag_key(tag): version for tag in set(tags)}, timeout=None)
+    if local_cache_enabled():
+        get_invalidation_bus().publish(set(tags))
+
+
+def clear_response_cache(entities=("movie", "person", "genre")):
+    """
+    Drop every cached response and tag version, shared and local, for
+    cold-cache measurements. With Redis only those keys are deleted: the
+    same database holds the Celery broker, the deferred stats dirty set
+    and the charts, so a cache.clear() would flush them too.
+    """
+    if hasattr(cache, "delete_pattern"):
+        # "<entity>s:<action>:<md5>" (see get_response_cache_key) leaves
+        # "movies:stats:dirty" and the list variant registries alone
+        for entity in entities:
+            cache.delete_pattern(f"{entity}s:*:{'?' * 32}")
+        cache.delete_pattern(f"{TAG_KEY_PREFIX}*")
+    else:
+        # Process-local backend: nothing else shares it
+        cache.clear()
+    clear_local_cache()
+
+
+def lookup_tagged(key, xfetch_beta=0.0):
+    """
+    (value, needs_refresh) for `key`. `value` is None on a miss; otherwise
+    `needs_refresh` is True when the entry is past its soft expiry, any of
+    its tags changed, or XFetch elected this request to refresh early:
+    recompute when now - delta * beta * ln(random()) >= expiry, where delta
+    is how long the value took to compute.
+    """
+    entry, needs_refresh = _lookup_entry(key, xfetch_beta)
+    return (None if entry is None else entry["value"]), needs_refresh
+
+
+def _lookup_entry(key, xfetch_beta):
+    entry = cache.get(key)
+    if entry is None:
+        return None, True
+    recorded = entry["tags"]
+    if recorded and get_tag_versions(recorded) != recorded:
+        return entry, True
+    return entry, _expired(entry, xfetch_beta)
+
+
+def _expired(entry, xfetch_beta):
+    now = time.time()
+    if xfetch_beta > 0 and entry["delta"] > 0:
+        now -= entry["delta"] * xfetch_beta * math.log(1.0 - random.random())
+    return now >= entry["expires"]
+
+
+def fill_reads(tags, versions=None):
+    """
+    Where a cache fill reads from: the primary while `tags` changed less than
+    DATABASE_REPLICA_LAG ago, so a lagging replica cannot store old data under
+    the new versions (see apps/movies/replicas.py). Nothing is stored with
+    the dummy cache, whose tags always look new. `versions` of the tags, when
+    already read, save a round trip.
+    """
+    if isinstance(caches["default"], DummyCache) or not (replicas_enabled() and tags):
+        return nullcontext()
+    if versions is None:
+        versions = get_tag_versions(tags)
+    if recently_written(versions.values()):
+        return primary_reads()
+    return nullcontext()
+
+
+def get_tagged(key):
+    """ Cached value for `key`, or None when missing, expired or any tag changed """
+    value, needs_refresh = lookup_tagged(key)
+    return None if needs_refresh else value
+
+
+def set_tagged(key, value, tags, timeout=None, stale_ttl=0, delta=0.0, versions=None):
+    """
+    Store `value` for `timeout` seconds, then keep it `stale_ttl` more
+    seconds so it can be served while a refresh is running.
+    `delta` is the time it took to compute (used by XFetch).
+
+    `versions` are tag versions read before `value` was computed (those of
+    the tags known in advance, recorded too). A write committing during the
+    computation then leaves the entry stale, instead of its new version
+    being recorded next to the old data.
+    """
+    timeout = settings.CACHE_TTL if timeout is None else timeout
+    recorded = dict(versions or {})
+    recorded.update(get_tag_versions(set(tags) - recorded.keys()))
+    entry = {
+        "value": value,
+        "tags": recorded,
+        "expires": time.time() + timeout,
+        "delta": delta,
+    }
+    cache.set(key, entry, timeout=timeout + stale_ttl)
+    return entry
+
+
+def set_local(key, entry, since=None):
+    """
+    Copy a fresh shared entry into this worker's L1 (until its soft expiry at
+    most), unless one of its tags was invalidated after the L1 `generation`
+    `since` (read before the entry was looked up or computed)
+    """
+    ttl = min(settings.CACHE_L1_TTL, entry["expires"] - time.time())
+    get_local_cache().set(key, entry, ttl, tags=entry["tags"], since=since)
+
+
+# SINGLE-FLIGHT LOCK
+
+_local_locks = {}  # key -> [lock, number of callers using it]
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _local_lock(key):
+    """ This worker's lock for `key`, dropped when no caller uses it anymore """
+    with _local_locks_guard:
+        entry = _local_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        with _local_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _local_locks[key]
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Yields True in the one caller allowed to recompute `key` right now.
+    Threads of a worker are serialized by a local lock per key; workers by
+    an expiring `cache.add` lock (atomic SET NX on Redis). When the cache
+    cannot be reached the local lock alone decides.
+    """
+    with _local_lock(key) as local_lock:
+        if not local_lock.acquire(blocking=False):
+            yield False
+            return
+
+        lock_key, token = f"lock:{key}", uuid.uuid4().hex
+        try:
+            try:
+                acquired = cache.add(lock_key, token, timeout=settings.CACHE_LOCK_TIMEOUT)
+            except Exception:
+                acquired, lock_key = True, None
+            try:
+                yield acquired
+            finally:
+                if acquired and lock_key is not None:
+                    try:
+                        if cache.get(lock_key) == token:
+                            cache.delete(lock_key)
+                    except Exception:
+                        pass  # the lock expires on its own
+        finally:
+            local_lock.release()
+
+
+def wait_for_value(key, timeout):
+    """ Poll for a value being computed by another worker """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = get_tagged(key)
+        if value is not None:
+            return value
+    return None
+
+
+# HIT / MISS COUNTERS
+
+
+def _stats_key(entity, action, event):
+    return f"{STATS_KEY_PREFIX}{entity}:{action}:{event}"
+
+
+_pending_events = Counter()
+_pending_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def record_cache_event(entity, action, event):
+    """
+    Count an "l1_hit", "hit" (shared cache), "stale" (served while
+    refreshing) or "miss" of a cached view action. Counts are buffered per
+    worker and added to the shared counters every CACHE_STATS_FLUSH_INTERVAL
+    seconds, so that L1 hits stay free of network round trips.
+    """
+    if buffer_cache_event(entity, action, event):
+        flush_cache_events()
+
+
+def buffer_cache_event(entity, action, event):
+    """
+    `record_cache_event` without the flush: True when the caller should run
+    `flush_cache_events` (async views do, in a thread). Only one caller per
+    interval is told to.
+    """
+    global _last_flush
+    record_cache(event)
+    record_cache_lookup(entity, action, event)
+    with _pending_lock:
+        _pending_events[_stats_key(entity, action, event)] += 1
+        now = time.monotonic()
+        due = now - _last_flush >= settings.CACHE_STATS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    return due
+
+
+def flush_cache_events():
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending_events)
+        _pending_events.clear()
+        _last_flush = time.monotonic()
+    for key, count in pending.items():
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # First event (or evicted): create the counter, racing writers incr it
+            if not cache.add(key, count, timeout=None):
+                cache.incr(key, count)
+
+
+def get_cache_stats(entities=("movie", "person", "genre"), actions=("list", "retrieve")):
+    """
+    {"movie:list": {"l1_hits", "hits", "stale", "misses", "l1_hit_ratio",
+    "l2_hit_ratio", "hit_ratio", "variants"?}, ...}; the L2 ratio is over
+    the requests that missed L1. Includes this worker's unflushed counts.
+    """
+    flush_cache_events()
+    keys = [_stats_key(entity, action, event) for entity in entities for action in actions for event in EVENTS]
+    counters = cache.get_many(keys)
+    stats = {}
+    for entity in entities:
+        for action in actions:
+            l1_hits, hits, stale, misses = (counters.get(_stats_key(entity, action, event), 0) for event in EVENTS)
+            total = l1_hits + hits + stale + misses
+            reached_l2 = total - l1_hits
+            stats[f"{entity}:{action}"] = {
+                "l1_hits": l1_hits,
+                "hits": hits,
+                "stale": stale,
+                "misses": misses,
+                "l1_hit_ratio": round(l1_hits / total, 4) if total else None,
+                # Stale responses are served from the cache too
+                "l2_hit_ratio": round((hits + stale) / reached_l2, 4) if reached_l2 else None,
+                "hit_ratio": round((total - misses) / total, 4) if total else None,
+            }
+        stats[f"{entity}:list"]["variants"] = len(cache.get(_variants_key(entity)) or {})
+    return stats
+
+
+def reset_cache_stats(entities=("movie", "person", "genre"), actions=("list", "retrieve")):
+    with _pending_lock:
+        _pending_events.clear()
+    cache.delete_many(
+        [_stats_key(entity, action, event) for entity in entities for action in actions for event in EVENTS]
+    )
+
+
+# LIST VARIANT BUDGET
+
+
+def _variants_key(entity):
+    return f"{entity}s:list:variants"
+
+
+_local_touches = {}
+
+
+def register_variant(entity, key):
+    """
+    Record `key` as the most recently used list variant of `entity` and
+    evict the least recently used ones beyond CACHE_LIST_VARIANT_BUDGET.
+    The registry is a {key: last used} dict in the cache; concurrent writers
+    may lose an update, which only makes the LRU order approximate.
+    """
+    registry_key = _variants_key(entity)
+    registry = cache.get(registry_key) or {}
+    registry[key] = time.time()
+
+    overflow = len(registry) - settings.CACHE_LIST_VARIANT_BUDGET
+    if overflow > 0:
+        evicted = sorted(registry, key=registry.get)[:overflow]
+        cache.delete_many(evicted)
+        for evicted_key in evicted:
+            del registry[evicted_key]
+    cache.set(registry_key, registry, timeout=None)
+    _local_touches[key] = time.monotonic()
+
+
+def touch_variant(entity, key):
+    """ Refresh the LRU position of a hit, throttled per worker """
+    now = time.monotonic()
+    if now - _local_touches.get(key, 0) < VARIANT_TOUCH_INTERVAL:
+        return
+    if len(_local_touches) > settings.CACHE_LIST_VARIANT_BUDGET:
+        _local_touches.clear()
+    register_variant(entity, key)
+
+
+# PRE-RENDERED RESPONSES
+
+
+def encoded_value(body, versions, variant=""):
+    """
+    What is cached for a response: its JSON bytes and the validators of the
+    tag `versions` it was built from (no hashing of the body)
+    """
+    etag, last_modified = validators_for(versions, variant)
+    return {"body": body, "etag": etag, "last_modified": last_modified}
+
+
+def wants_cacheable_json(request):
+    """ Only plain (non-indented) JSON responses are cached as bytes """
+    renderer = getattr(request, "accepted_renderer", None)
+    return (
+        renderer is not None
+        and renderer.format == "json"
+        and "indent" not in (request.accepted_media_type or "")
+    )
+
+
+class CachedJSONResponse(Response):
+    """
+    A Response whose body is already-encoded JSON: rendering returns the
+    cached bytes untouched. `data` is only kept when it is at hand anyway
+    (freshly computed responses).
+    """
+
+    def __init__(self, body, etag, last_modified=None, data=None):
+        super().__init__(data)
+        self.encoded_body = body
+        set_validator_headers(self, etag, last_modified)
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.accepted_renderer.media_type
+        return self.encoded_body
+
+
+def cache_response(timeout=None, stale_ttl=None, xfetch_beta=None, local=False):
+    """
+    Decorator for ViewSet `list` / `retrieve` and detail actions (the view
+    must use TaggedCacheMixin, and key the action's parameters): serves
+    successful responses from the tagged cache with single-flight
+    recomputation, stale-while-revalidate and XFetch, and answers
+    conditional requests.
+
+    `timeout` defaults to CACHE_TTL, `stale_ttl` to CACHE_STALE_TTL and
+    `xfetch_beta` to CACHE_XFETCH_BETA (0 disables early refresh).
+    `local=True` adds the per-worker L1 tier for hot payloads.
+    """
+
+    def decorator(view_method):
+        action = view_method.__name__
+        uncached = conditional_response(view_method)
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not wants_cacheable_json(request):
+                return uncached(self, request, *args, **kwargs)
+
+            entity = self.cache_entity
+            key = self.get_response_cache_key(request, action)
+            beta = settings.CACHE_XFETCH_BETA if xfetch_beta is None else xfetch_beta
+            use_local = local and local_cache_enabled()
+
+            since = None
+            if use_local:
+                local_cache = get_local_cache()
+                since = local_cache.generation
+                entry = local_cache.get(key)
+                if entry is not None and not _expired(entry, beta):
+                    # Invalidations drop L1 entries: their own validators are the current ones
+                    record_cache_event(entity, action, "l1_hit")
+                    return cached_response(request, entry["value"])
+
+            # 304 from the current tag versions, before the cache or the database is touched
+            condition_tags = self.get_condition_tags(action)
+            versions = get_tag_versions(condition_tags)
+            not_modified = not_modified_response(request, *validators_for(versions, request.accepted_media_type))
+            if not_modified is not None:
+                return not_modified
+
+            entry, needs_refresh = _lookup_entry(key, beta)
+            if entry is not None and not needs_refresh:
+                record_cache_event(entity, action, "hit")
+                if action == "list":
+                    touch_variant(entity, key)
+                if use_local:
+                    set_local(key, entry, since)
+                return cached_response(request, entry["value"])
+
+            def compute():
+                record_cache_event(entity, action, "miss")
+                started = time.monotonic()
+                # `versions` were read before the view reads anything (see set_tagged)
+                with fill_reads(condition_tags, versions):
+                    response = view_method(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    # Render once: the same bytes are cached and sent
+                    with span("render"):
+                        body = request.accepted_renderer.render(
+                            response.data, request.accepted_media_type, self.get_renderer_context()
+                        )
+                    value = encoded_value(body, versions, request.accepted_media_type)
+                    stored = set_tagged(
+                        key,
+                        value,
+                        self.get_cache_tags(response.data),
+                        timeout,
+                        settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl,
+                        delta=time.monotonic() - started,
+                        versions=versions,
+                    )
+                    if action == "list":
+                        register_variant(entity, key)
+                    if use_local:
+                        set_local(key, stored, since)
+                    return CachedJSONResponse(**value, data=response.data)
+                return response
+
+            with single_flight(key) as leader:
+                if leader:
+                    return compute()
+
+            if entry is not None:
+                # Someone else is refreshing: serve the previous value meanwhile
+                record_cache_event(entity, action, "stale")
+                return cached_response(request, entry["value"])
+
+            value = wait_for_value(key, settings.CACHE_LOCK_WAIT)
+            if value is not None:
+                record_cache_event(entity, action, "hit")
+                return cached_response(request, value)
+            return compute()
+
+        return wrapper
+
+    return decorator
+
+
+def cached_response(request, value):
+    """
+    Response for a cached value, sent with the validators of the versions it
+    was built from (not the current ones: a stale body must not carry the
+    ETag of the data replacing it), or 304 when the client already has it.
+    """
+    not_modified = not_modified_response(request, value["etag"], value.get("last_modified"))
+    if not_modified is not None:
+        return not_modified
+    return CachedJSONResponse(**value)
+
+
+# CONDITIONAL GET
+
+
+def get_validators(tags, variant=""):
+    """ (weak ETag, Last-Modified timestamp) for the current versions of `tags` """
+    return validators_for(get_tag_versions(tags), variant)
+
+
+def validators_for(versions, variant=""):
+    """ (weak ETag, Last-Modified timestamp) for tag `versions` """
+    fingerprint = "|".join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+    digest = hashlib.md5(f"{fingerprint}|{variant}".encode("utf-8")).hexdigest()
+    return f'W/"{digest}"', max(versions.values()) // 10**9
+
+
+def not_modified_response(request, etag, last_modified):
+    """ A 304 when If-None-Match / If-Modified-Since match the validators, else None """
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        set_validator_headers(not_modified, etag, last_modified)
+    return not_modified
+
+
+def set_validator_headers(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:  # entries cached before it was stored
+        response["Last-Modified"] = http_date(last_modified)
+
+
+def conditional_response(view_method):
+    """
+    Decorator for ViewSet `list` / `retrieve`: answers If-None-Match /
+    If-Modified-Since with 304 from tag versions alone, and adds ETag /
+    Last-Modified to successful responses. The view provides
+    `get_condition_tags(action)` (TaggedCacheMixin has a default);
+    `cache_response` already includes this.
+    """
+    action = view_method.__name__
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        tags = self.get_condition_tags(action)
+        if not tags or request.method not in ("GET", "HEAD"):
+            return view_method(self, request, *args, **kwargs)
+
+        # The representation (JSON vs browsable HTML) is part of the validator
+        etag, last_modified = get_validators(tags, variant=request.accepted_media_type)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validator_headers(response, etag, last_modified)
+        return response
+
+    return wrapper
+
+
+class TaggedCacheMixin:
+    """
+    Cache key and tag helpers used by `cache_response`.
+
+    `cache_entity` names the tags of the view's model: a response depends on
+    "<entity>:all" and on "<entity>:<id>" for every object it contains.
+    Views extend `get_cache_tags` for nested entities.
+    """
+
+    cache_entity = None
+
+    def get_response_cache_key(self, request, action):
+        query = self.get_cache_query(request, action)
+        digest = hashlib.md5(f"{request.path}?{query}".encode("utf-8")).hexdigest()
+        return f"{self.cache_entity}s:{action}:{digest}"
+
+    def get_cache_query(self, request, action="list"):
+        """
+        Canonical query string of a request: only parameters that change
+        the response, sorted, with defaults and empty values dropped, and
+        search terms case folded and sorted (the search is case-insensitive
+        and term order does not change matches or rank). Filter values are
+        kept verbatim since exact lookups may be case-sensitive, unless their
+        backend canonicalizes them (`get_cache_params(request)`).
+
+        Equivalent URLs therefore share one entry; its `next` / `previous`
+        links carry the first requester's (equivalent) query string.
+        """
+        params = request.query_params
+        canonical = {}
+
+        # Sparse fieldsets (?fields= / ?expand=): key by the resulting selection
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, "selected_field_names") and (
+            params.get(serializer_class.fields_query_param) or params.get(serializer_class.expand_query_param)
+        ):
+            canonical["fields"] = ",".join(serializer_class.selected_field_names(request))
+        if action != "list":
+            return urlencode(sorted(canonical.items()))
+
+        for name in getattr(self, "filterset_fields", None) or ():
+            value = params.get(name, "").strip()
+            if value:
+                canonical[name] = value
+
+        backends = getattr(self, "filter_backends", ())
+        for backend in backends:
+            if hasattr(backend, "get_cache_params"):
+                canonical.update(backend().get_cache_params(request))
+
+        search_param = next(
+            (backend.search_param for backend in backends if issubclass(backend, SearchFilter)), None
+        )
+        terms = sorted(set(parse_terms(params.get(search_param, "")))) if search_param else []
+        if terms:
+            canonical[search_param] = " ".join(terms)
+
+        ordering_backend = next((backend for backend in backends if issubclass(backend, OrderingFilter)), None)
+        if ordering_backend is not None:
+            ordering = ordering_backend().get_ordering(request, self.get_queryset(), self)
+            default = [] if terms else list(self.get_queryset().model._meta.ordering)
+            if ordering and list(ordering) != default:
+                canonical[ordering_backend.ordering_param] = ",".join(ordering)
+
+        paginator = self.paginator
+        if paginator is not None:
+            cursor_param = getattr(paginator, "cursor_query_param", None)
+            if cursor_param and params.get(cursor_param):
+                canonical[cursor_param] = params[cursor_param]
+            size_param = getattr(paginator, "page_size_query_param", None)
+            if size_param and size_param in params:
+                page_size = paginator.get_page_size(request)
+                if page_size != paginator.page_size:
+                    canonical[size_param] = page_size
+
+        return urlencode(sorted(canonical.items()))
+
+    def get_cache_tags(self, data):
+        tags = {f"{self.cache_entity}:all"}
+        if self.action == "retrieve":
+            # The payload may not carry its id (?fields=)
+            tags.add(f"{self.cache_entity}:{self.kwargs[self.lookup_url_kwarg or self.lookup_field]}")
+        tags.update(f"{self.cache_entity}:{item['id']}" for item in self.get_cached_items(data) if "id" in item)
+        return tags
+
+    def get_condition_tags(self, action):
+        """
+        Tags whose versions change whenever this response may change; they
+        must be derivable from the URL (no queries). Views embedding other
+        entities add their collection tags or make sure writes to those bump
+        the "<entity>:<id>" tag.
+        """
+        if action == "retrieve":
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            return {f"{self.cache_entity}:{lookup}"}
+        return {f"{self.cache_entity}:all"}
+
+    def get_cached_items(self, data):
+        """ The serialized objects in a list (paginated or not) or detail payload """
+        if isinstance(data, dict) and "results" in data:
+            return data["results"]
+        if isinstance(data, list):
+            return data
+        return [data]
@@ -0,0 +1,261 @@
+"""
+Precomputed movie leaderboards.
+
+- "top-rated": Bayesian weighted rating, overall and per genre
+  ("top-rated:genre:<id>"). With m = CHARTS_MIN_VOTES and C the mean of all
+  ratings, a movie scores (rating_sum + m * C) / (review_count + m): few
+  reviews pull the score towards C, so one 10/10 does not beat a classic.
+- "trending": review velocity, reviews per day over the last
+  CHARTS_TRENDING_DAYS.
+
+`refresh_charts` runs every five minutes (Celery beat, see
+apps/movies/tasks.py). Top-rated charts are updated incrementally: only
+movies whose ratings or genres changed since the last run (the
+"charts:dirty" set) are rescored and merged into the stored ranking, which
+keeps CHARTS_BUFFER extra entries so that movies dropping out can be
+replaced. A full rebuild runs every CHARTS_FULL_REFRESH_INTERVAL (C moves
+slowly) or when a chart runs short. Trending is rebuilt on every run since
+its window slides.
+
+Charts are stored as Redis sorted sets when the cache is django-redis, or
+in the ChartEntry table otherwise; reading a page costs the same at any
+depth in both.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from apps.movies.aggregates import mark_movies_dirty, pop_dirty_movies
+from apps.movies.backends import redis_connection
+from apps.movies.models import ChartEntry, Movie, Review
+
+TOP_RATED = "top-rated"
+TRENDING = "trending"
+CHARTS = (TOP_RATED, TRENDING)
+CHARTS_DIRTY_KEY = "charts:dirty"
+META_KEY = "charts:meta"
+
+
+def genre_chart(genre_id):
+    return f"{TOP_RATED}:genre:{genre_id}"
+
+
+def chart_depth():
+    return settings.CHARTS_SIZE + settings.CHARTS_BUFFER
+
+
+# STORES
+
+
+class DatabaseChartStore:
+    """ ChartEntry rows, replaced per chart in one transaction """
+
+    def replace(self, chart, entries):
+        with transaction.atomic():
+            ChartEntry.objects.filter(chart=chart).delete()
+            ChartEntry.objects.bulk_create(
+                ChartEntry(chart=chart, position=position, movie_id=movie_id, score=score)
+                for position, (movie_id, score) in enumerate(entries)
+            )
+
+    def page(self, chart, offset, limit):
+        rows = ChartEntry.objects.filter(chart=chart, position__gte=offset, position__lt=offset + limit)
+        return list(rows.order_by("position").values_list("movie_id", "score"))
+
+    def entries(self, chart):
+        return list(ChartEntry.objects.filter(chart=chart).order_by("position").values_list("movie_id", "score"))
+
+    def count(self, chart):
+        return ChartEntry.objects.filter(chart=chart).count()
+
+
+class RedisChartStore:
+    """ One sorted set per chart, swapped in atomically with RENAME """
+
+    def __init__(self, connection):
+        self.redis = connection
+
+    def _key(self, chart):
+        return cache.make_key(f"chart:{chart}")
+
+    def replace(self, chart, entries):
+        key = self._key(chart)
+        staging = f"{key}:staging"
+        pipe = self.redis.pipeline()
+        pipe.delete(staging)
+        if entries:
+            pipe.zadd(staging, {movie_id: score for movie_id, score in entries})
+            pipe.rename(staging, key)
+        else:
+            pipe.delete(key)
+        pipe.execute()
+
+    def page(self, chart, offset, limit):
+        rows = self.redis.zrevrange(self._key(chart), offset, offset + limit - 1, withscores=True)
+        return [(int(movie_id), score) for movie_id, score in rows]
+
+    def entries(self, chart):
+        return self.page(chart, 0, chart_depth())
+
+    def count(self, chart):
+        return self.redis.zcard(self._key(chart))
+
+
+def get_chart_store():
+    connection = redis_connection()
+    return RedisChartStore(connection) if connection is not None else DatabaseChartStore()
+
+
+# SCORING
+
+
+def global_mean_rating():
+    totals = Movie.objects.aggregate(ratings=Sum("rating_sum"), reviews=Sum("total_review_count"))
+    return totals["ratings"] / totals["reviews"] if totals["reviews"] else 0.0
+
+
+def weighted_rating_expression(mean):
+    """ (rating_sum + m * C) / (total_review_count + m) """
+    m = settings.CHARTS_MIN_VOTES
+    return (Cast(F("rating_sum"), FloatField()) + Value(m * mean)) / Cast(
+        F("total_review_count") + Value(m), FloatField()
+    )
+
+
+def top_rated_entries(mean, movie_ids=None, genre_id=None, limit=None):
+    """ [(movie_id, score)] best first, over rated movies """
+    movies = Movie.objects.filter(total_review_count__gt=0)
+    if movie_ids is not None:
+        movies = movies.filter(pk__in=movie_ids)
+    if genre_id is not None:
+        movies = movies.filter(genres=genre_id)
+    movies = movies.annotate(score=weighted_rating_expression(mean)).order_by("-score", "-pk")
+    if limit is not None:
+        movies = movies[:limit]
+    return [(movie_id, round(score, 4)) for movie_id, score in movies.values_list("pk", "score")]
+
+
+def trending_entries(limit):
+    """ [(movie_id, reviews per day)] over the sliding window """
+    days = settings.CHARTS_TRENDING_DAYS
+    since = timezone.now() - timedelta(days=days)
+    counts = (
+        Review.objects.filter(created_at__gte=since)
+        .values("movie_id")
+        .annotate(reviews=Count("id"))
+        .order_by("-reviews", "-movie_id")[:limit]
+    )
+    return [(row["movie_id"], round(row["reviews"] / days, 4)) for row in counts]
+
+
+def _genre_ids():
+    return list(Movie.genres.through.objects.values_list("genre_id", flat=True).distinct())
+
+
+# REFRESH
+
+
+def mark_charts_dirty(*movie_ids):
+    """ Rescore these movies on the next incremental refresh """
+    if movie_ids:
+        mark_movies_dirty(*movie_ids, key=CHARTS_DIRTY_KEY)
+
+
+def rebuild_top_rated(store, mean):
+    """ Recompute every top-rated chart; returns the charts cut at chart_depth() """
+    depth = chart_depth()
+    truncated = set()
+    charts = [(TOP_RATED, None)] + [(genre_chart(genre_id), genre_id) for genre_id in _genre_ids()]
+    for chart, genre_id in charts:
+        entries = top_rated_entries(mean, genre_id=genre_id, limit=depth)
+        store.replace(chart, entries)
+        if len(entries) >= depth:
+            truncated.add(chart)
+    return truncated
+
+
+def merge_top_rated(store, mean, movie_ids, truncated):
+    """
+    Rescore `movie_ids` and merge them into the stored top-rated charts,
+    updating `truncated`. Returns False when a chart ran short and needs a
+    full rebuild.
+    """
+    depth = chart_depth()
+    fresh = dict(top_rated_entries(mean, movie_ids=movie_ids))
+    genres = defaultdict(set)
+    memberships = Movie.genres.through.objects.filter(movie_id__in=movie_ids)
+    for movie_id, genre_id in memberships.values_list("movie_id", "genre_id"):
+        genres[genre_id].add(movie_id)
+
+    changed = set(movie_ids)
+    charts = {TOP_RATED: set(fresh)}
+    charts.update({genre_chart(genre_id): set(fresh) & members for genre_id, members in genres.items()})
+    # Genre charts that may hold a changed movie that left the genre
+    charts.update({genre_chart(genre_id): set() for genre_id in _genre_ids() if genre_chart(genre_id) not in charts})
+
+    for chart, candidates in charts.items():
+        current = store.entries(chart)
+        kept = [entry for entry in current if entry[0] not in changed]
+        if len(kept) == len(current) and not candidates:
+            continue
+        rescored = [(movie_id, fresh[movie_id]) for movie_id in candidates]
+        if chart in truncated and kept:
+            # Below the stored floor, a movie we never stored may rank higher
+            floor = current[-1][1]
+            rescored = [entry for entry in rescored if entry[1] >= floor]
+        merged = sorted(kept + rescored, key=lambda e: (-e[1], -e[0]))
+        if chart in truncated and len(merged) < settings.CHARTS_SIZE:
+            return False
+        if len(merged) >= depth:
+            truncated.add(chart)
+        store.replace(chart, merged[:depth])
+    return True
+
+
+def refresh_charts(full=False):
+    """
+    Refresh every chart (incrementally unless `full` or a full rebuild is
+    due). Returns a short summary.
+    """
+    store = get_chart_store()
+    meta = cache.get(META_KEY)
+    now = time.time()
+    full = full or meta is None or now - meta["full_at"] >= settings.CHARTS_FULL_REFRESH_INTERVAL
+
+    if full:
+        # Changes up to now are included in the rebuild
+        cache.delete(CHARTS_DIRTY_KEY)
+        mean = global_mean_rating()
+        meta = {"full_at": now, "mean": mean, "truncated": rebuild_top_rated(store, mean)}
+        summary = "Rebuilt all charts"
+    else:
+        mean = meta["mean"]
+        movie_ids = pop_dirty_movies(key=CHARTS_DIRTY_KEY)
+        if movie_ids and not merge_top_rated(store, mean, movie_ids, meta["truncated"]):
+            return refresh_charts(full=True)
+        summary = f"Rescored {len(movie_ids)} movies"
+
+    store.replace(TRENDING, trending_entries(chart_depth()))
+    meta["refreshed_at"] = now
+    cache.set(META_KEY, meta, timeout=None)
+    return summary
+
+
+def chart_refreshed_at():
+    """ When the charts were last refreshed, None before the first run """
+    meta = cache.get(META_KEY)
+    return datetime.fromtimestamp(meta["refreshed_at"], tz=dt_timezone.utc) if meta else None
+
+
+def read_chart(chart, offset, limit):
+    """ ([(movie_id, score)], total entries) of one page """
+    store = get_chart_store()
+    limit = max(0, min(limit, settings.CHARTS_SIZE - offset))
+    return (store.page(chart, offset, limit) if limit else []), min(store.count(chart), settings.CHARTS_SIZE)
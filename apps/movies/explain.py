@@ -0,0 +1,247 @@
+"""
+Query plan advisor for the API's query shapes (`manage.py explain_queries`).
+
+Every GET endpoint declared in apps/movies/budgets.py is requested against
+the current database with a cold cache, then the next page of the keyset
+paginated lists. Each distinct SELECT they run is EXPLAINed on the
+connection it ran on and flagged when the plan
+
+- scans a whole table of at least `min_rows` rows ("Seq Scan" on
+  PostgreSQL, "SCAN <table>" without an index on SQLite), unless it reads
+  in ORDER BY order and stops at a LIMIT;
+- sorts at least `min_rows` rows instead of reading them in index order
+  ("Sort" on PostgreSQL, "USE TEMP B-TREE" on SQLite), what MySQL calls a
+  filesort. PostgreSQL estimates the rows; on SQLite they are counted.
+
+A flagged statement comes with the index that would serve it, the columns
+it compares for equality on the flagged table then its ORDER BY columns,
+unless an index already starts with them (the filter is then on another
+table, and no index of this one can avoid the sort).
+
+Plans depend on table sizes and statistics: run it on a realistic dataset
+(`generate_dataset`, then ANALYZE on PostgreSQL), not on a handful of rows.
+"""
+import json
+import re
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from apps.movies.budgets import ENDPOINTS, BudgetContext, client_for, normalize_sql
+from apps.movies.cache import clear_response_cache
+from apps.movies.genre_index import get_genre_index, get_genre_names
+
+SELECT_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+TABLE_ALIAS_RE = re.compile(r'"(\w+)"(?: AS)? (\w+)\b')
+EQUALITY_RE = re.compile(r'"(\w+)"\."(\w+)" (?:= %s|IN \(%s)')
+ORDER_BY_RE = re.compile(r"ORDER BY (.+?)(?: LIMIT| OFFSET|\)|$)", re.IGNORECASE)
+COLUMN_RE = re.compile(r'"(\w+)"\."(\w+)"')
+LIMIT_RE = re.compile(r"\s+LIMIT \d+(?: OFFSET \d+)?\s*$", re.IGNORECASE)
+SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+)| VIRTUAL TABLE (INDEX))?")
+
+# Routes that read whole tables by design (index builds, exports): their
+# full scans are expected and not flagged
+FULL_READS = {"autocomplete", "export"}
+
+
+class Finding:
+    def __init__(self, kind, table, rows, detail=""):
+        self.kind = kind  # "full scan" or "sort"
+        self.table = table
+        self.rows = rows
+        self.detail = detail
+
+    def __str__(self):
+        text = f"{self.kind} of {self.table} ({self.rows} rows)"
+        return f"{text}: {self.detail}" if self.detail else text
+
+
+class Statement:
+    def __init__(self, route, label, alias, sql, params):
+        self.route = route
+        self.label = label  # the first request that ran it
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.plan = []  # lines
+        self.findings = []
+        self.suggestion = None
+
+    @property
+    def aliases(self):
+        return {alias: name for name, alias in TABLE_ALIAS_RE.findall(self.sql)}
+
+    def order_by_table(self):
+        """ The table of the first ORDER BY column """
+        match = ORDER_BY_RE.search(self.sql)
+        columns = COLUMN_RE.findall(match.group(1)) if match else []
+        return self.aliases.get(columns[0][0], columns[0][0]) if columns else None
+
+    def index_columns(self, table):
+        """ Columns of `table` compared for equality, then its ORDER BY columns """
+        aliases = self.aliases
+        match = ORDER_BY_RE.search(self.sql)
+        columns = []
+        for name, column in EQUALITY_RE.findall(self.sql) + COLUMN_RE.findall(match.group(1) if match else ""):
+            if aliases.get(name, name) == table and column not in columns:
+                columns.append(column)
+        return columns
+
+
+# CAPTURE
+
+
+@contextmanager
+def capture_selects(captured):
+    """ Append (alias, sql, params) of every SELECT run on any connection """
+
+    def wrapper(execute, sql, params, many, context):
+        if not many and SELECT_RE.match(sql):
+            captured.append((context["connection"].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def collect_statements(names=None, pages=2):
+    """ Distinct SELECTs of the GET endpoints (optionally only the routes in `names`) """
+    ctx = BudgetContext()
+    statements = {}
+    for endpoint in ENDPOINTS:
+        if endpoint.method != "get" or (names and endpoint.name not in names):
+            continue
+        clear_response_cache()
+        # Built once per worker, not per request
+        get_genre_names()
+        get_genre_index()
+        client = client_for(endpoint, ctx)
+        path, data = endpoint.path(ctx), endpoint.data(ctx) if callable(endpoint.data) else endpoint.data
+        for page in range(1, pages + 1):
+            captured = []
+            with capture_selects(captured):
+                response = client.get(path, data)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            label = endpoint.label if page == 1 else f"{endpoint.label} page {page}"
+            for alias, sql, params in captured:
+                statements.setdefault((alias, normalize_sql(sql)), Statement(endpoint.name, label, alias, sql, params))
+
+            payload = response.json() if response.get("Content-Type", "").startswith("application/json") else None
+            if not isinstance(payload, dict) or not payload.get("next"):
+                break
+            path, data = payload["next"], None
+    return list(statements.values())
+
+
+# PLANS
+
+
+class Explainer:
+    def __init__(self, min_rows=1000):
+        self.min_rows = min_rows
+        self._rows = {}  # (alias, table) -> row count
+        self._tables = {}  # alias -> table names
+        self._indexes = {}  # (alias, table) -> [columns of each index]
+
+    def table_rows(self, alias, table):
+        if (alias, table) not in self._rows:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+                self._rows[alias, table] = cursor.fetchone()[0]
+        return self._rows[alias, table]
+
+    def result_rows(self, statement):
+        """ Rows the statement produces before its LIMIT """
+        with connections[statement.alias].cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM ({LIMIT_RE.sub('', statement.sql)}) counted", statement.params)
+            return cursor.fetchone()[0]
+
+    def is_table(self, alias, name):
+        if alias not in self._tables:
+            self._tables[alias] = set(connections[alias].introspection.table_names())
+        return name in self._tables[alias]
+
+    def indexed(self, alias, table, columns):
+        """ Whether an index of `table` starts with `columns` """
+        if (alias, table) not in self._indexes:
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, table)
+            self._indexes[alias, table] = [
+                constraint["columns"]
+                for constraint in constraints.values()
+                if constraint["index"] or constraint["unique"] or constraint["primary_key"]
+            ]
+        return any(index[: len(columns)] == columns for index in self._indexes[alias, table])
+
+    def explain(self, statement):
+        vendor = connections[statement.alias].vendor
+        method = getattr(self, f"explain_{vendor}", None)
+        if method is None:
+            raise NotImplementedError(f"Plans of {vendor} databases are not analyzed (PostgreSQL and SQLite are)")
+        with connections[statement.alias].cursor() as cursor:
+            method(statement, cursor)
+        if statement.route in FULL_READS:
+            statement.findings = [finding for finding in statement.findings if finding.kind != "full scan"]
+        if statement.findings:
+            table = statement.findings[0].table
+            columns = statement.index_columns(table)
+            if columns and not self.indexed(statement.alias, table, columns):
+                statement.suggestion = f"CREATE INDEX ON {table} ({', '.join(columns)})"
+        return statement
+
+    def explain_postgresql(self, statement, cursor):
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement.sql}", statement.params)
+        raw = cursor.fetchone()[0]
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+        def walk(node, depth):
+            relation = node.get("Relation Name")
+            statement.plan.append(
+                f"{'  ' * depth}{node['Node Type']}{f' on {relation}' if relation else ''} (rows={node['Plan Rows']})"
+            )
+            if node["Node Type"] == "Seq Scan":
+                rows = self.table_rows(statement.alias, relation)
+                if rows >= self.min_rows:
+                    statement.findings.append(Finding("full scan", relation, rows, node.get("Filter", "")))
+            elif node["Node Type"] == "Sort":
+                rows = sum(child["Plan Rows"] for child in node.get("Plans", ()))
+                if rows >= self.min_rows:
+                    table = statement.order_by_table() or "?"
+                    statement.findings.append(Finding("sort", table, rows, ", ".join(node.get("Sort Key", ()))))
+            for child in node.get("Plans", ()):
+                walk(child, depth + 1)
+
+        walk(plan, 0)
+
+    def explain_sqlite(self, statement, cursor):
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement.sql}", statement.params)
+        statement.plan = [detail for _, _, _, detail in cursor.fetchall()]
+        aliases = statement.aliases
+        sorts = [detail for detail in statement.plan if detail.startswith("USE TEMP B-TREE")]
+        # A scan already in ORDER BY order (the rowid) stops at the LIMIT
+        bounded = not sorts and LIMIT_RE.search(statement.sql)
+        scans = 0
+        for detail in statement.plan:
+            match = SQLITE_SCAN_RE.match(detail)
+            table = match and aliases.get(match.group(1), match.group(1))
+            if match and not (match.group(2) or match.group(3)) and self.is_table(statement.alias, table):
+                scans += 1
+                rows = self.table_rows(statement.alias, table)
+                if rows >= self.min_rows and not (bounded and scans == 1):
+                    statement.findings.append(Finding("full scan", table, rows))
+        if sorts:
+            rows = self.result_rows(statement)
+            if rows >= self.min_rows:
+                statement.findings.append(Finding("sort", statement.order_by_table() or "?", rows, sorts[0]))
+
+
+def explain_endpoints(names=None, pages=2, min_rows=1000):
+    """ EXPLAINed statements of the GET endpoints, flagged ones first """
+    explainer = Explainer(min_rows)
+    statements = [explainer.explain(statement) for statement in collect_statements(names, pages)]
+    return sorted(statements, key=lambda statement: not statement.findings)
@@ -0,0 +1,160 @@
+"""
+Streaming catalogue export (see ExportView in apps/movies/api/views.py).
+
+Rows are read with `iterator(chunk_size=EXPORT_CHUNK_SIZE)`, which uses a
+server-side cursor where the database supports it (PostgreSQL) and runs the
+prefetches once per chunk, then encoded and yielded chunk by chunk to a
+StreamingHttpResponse. Memory therefore depends on the chunk size, not on
+the size of the catalogue, and no serializer is involved.
+
+`since` keeps rows modified at or after a timestamp (`updated_at`, which
+crew, genre and person changes also bump on the movies they appear in).
+Deletions are not exported; partners should run a full export now and then.
+"""
+import csv
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from apps.movies.api.renderers import ORJSONRenderer
+from apps.movies.models import Movie, MovieCrew, Person, Review
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def file_url(field):
+    return field.url if field else None
+
+
+def movie_row(movie):
+    return {
+        "id": movie.pk,
+        "title": movie.title,
+        "description": movie.description,
+        "release_date": movie.release_date,
+        "poster": file_url(movie.poster),
+        "average_rating": movie.average_rating,
+        "total_review_count": movie.total_review_count,
+        "updated_at": movie.updated_at,
+        "genres": [genre.name for genre in movie.genres.all()],
+        "crew": [
+            {
+                "person_id": member.person_id,
+                "name": member.person.name,
+                "role": member.role,
+                "character_name": member.character_name,
+            }
+            for member in movie.crew.all()
+        ],
+    }
+
+
+def person_row(person):
+    return {
+        "id": person.pk,
+        "name": person.name,
+        "bio": person.bio,
+        "photo": file_url(person.photo),
+        "updated_at": person.updated_at,
+    }
+
+
+def review_row(review):
+    return {
+        "id": review.pk,
+        "movie_id": review.movie_id,
+        "user_id": review.user_id,
+        "rating": review.rating,
+        "comment": review.comment,
+        "created_at": review.created_at,
+        "updated_at": review.updated_at,
+    }
+
+
+def movie_queryset():
+    crew = MovieCrew.objects.select_related("person").only(
+        "movie_id", "person_id", "person__name", "role", "character_name"
+    )
+    return Movie.objects.only(
+        "title", "description", "release_date", "poster", "average_rating", "total_review_count", "updated_at"
+    ).prefetch_related("genres", Prefetch("crew", queryset=crew))
+
+
+# entity -> (queryset factory, row builder, CSV columns)
+EXPORTS = {
+    "movies": (
+        movie_queryset,
+        movie_row,
+        ["id", "title", "description", "release_date", "poster", "average_rating",
+         "total_review_count", "updated_at", "genres", "crew"],
+    ),
+    "persons": (lambda: Person.objects.all(), person_row, ["id", "name", "bio", "photo", "updated_at"]),
+    "reviews": (
+        lambda: Review.objects.all(),
+        review_row,
+        ["id", "movie_id", "user_id", "rating", "comment", "created_at", "updated_at"],
+    ),
+}
+
+
+def export_rows(entity, since=None):
+    """ Row dicts of one entity in primary key order, read in chunks """
+    make_queryset, make_row, _ = EXPORTS[entity]
+    queryset = make_queryset().order_by("pk")
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    for obj in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield make_row(obj)
+
+
+def _batched(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield b"".join(batch)
+            batch = []
+    if batch:
+        yield b"".join(batch)
+
+
+def ndjson_lines(rows):
+    renderer = ORJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b"\n"
+
+
+class _Echo:
+    """ File-like object for csv.writer that hands back what is written """
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value, renderer):
+    """ Nested values as JSON, dates in ISO 8601 """
+    if isinstance(value, (list, dict)):
+        return renderer.render(value).decode()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(rows, columns):
+    renderer = ORJSONRenderer()
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns).encode()
+    for row in rows:
+        yield writer.writerow([csv_value(row[column], renderer) for column in columns]).encode()
+
+
+def stream_export(entity, output, since=None):
+    """ Encoded chunks of an export, for StreamingHttpResponse """
+    rows = export_rows(entity, since)
+    lines = ndjson_lines(rows) if output == "ndjson" else csv_lines(rows, EXPORTS[entity][2])
+    # One write per batch of lines rather than per row
+    return _batched(lines, 500)
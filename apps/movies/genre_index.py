@@ -0,0 +1,183 @@
+"""
+In-process genre index for the movie list's genre filters.
+
+Each worker keeps:
+
+- genre names (case folded) -> ids (`GenreNames`), so filters resolve names
+  without joining the genre table;
+- one bitmap per genre (`GenreIndex`), a Python int with bit `movie id` set
+  for every movie of the genre, so "all of these genres" and "any of these
+  genres" are a few big-int ANDs / ORs instead of one join per genre.
+
+The two are built separately: a single-genre filter needs only the names,
+one small query, and never waits for the bitmaps to be read from the
+whole through table.
+
+A multi-genre filter hands the database the matching ids (`pk__in`) when
+there are at most GENRE_FILTER_MAX_IDS of them, and none when there are
+none. Beyond that a long IN list costs more than the database's own
+semi-joins (one per genre, or one for "any"), which it then gets instead.
+A single genre is a plain join on the through table, which its index
+already serves.
+
+Both are rebuilt when the shared version key in the cache changes
+(bumped by genre and membership signals). Unlike the autocomplete index it
+is checked on every use: filtered lists are cached for everyone, and a
+stale bitmap would be stored under the new tag versions. Without a shared
+cache (dummy or local memory) other processes' changes never reach the
+version key, so there they are also rebuilt once older than
+GENRE_INDEX_REFRESH_SECONDS; that bounds how long such a worker can filter
+with stale ones.
+"""
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Subquery
+
+from apps.movies.backends import cache_is_shared
+from apps.movies.models import Genre, Movie
+
+VERSION_KEY = "genres:index:version"
+MATCH_ALL, MATCH_ANY = "all", "any"
+
+# Set bit positions of every byte value
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def normalize(name):
+    return name.strip().casefold()
+
+
+def bitmap_ids(bitmap):
+    """ Ascending ids of the set bits """
+    ids = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for offset, byte in enumerate(data):
+        if byte:
+            base = offset * 8
+            ids.extend(base + bit for bit in BYTE_BITS[byte])
+    return ids
+
+
+class GenreNames:
+    def __init__(self, genres):
+        """ `genres` are (id, name) pairs """
+        self.ids = {normalize(name): genre_id for genre_id, name in genres}
+
+    @classmethod
+    def build(cls):
+        return cls(Genre.objects.values_list("id", "name"))
+
+    def resolve(self, names):
+        """ Genre ids of `names`, None for unknown ones """
+        return [self.ids.get(normalize(name)) for name in names]
+
+    def filter_one(self, queryset, name):
+        """ Movies of `queryset` in the named genre: a join its index serves """
+        genre_id = self.ids.get(normalize(name))
+        return queryset.none() if genre_id is None else queryset.filter(genres=genre_id)
+
+
+class GenreIndex(GenreNames):
+    def __init__(self, genres, links):
+        """ `genres` are (id, name) pairs, `links` (genre id, movie id) pairs """
+        super().__init__(genres)
+
+        links = list(links)
+        size = max((movie_id for _, movie_id in links), default=0) // 8 + 1
+        buffers = {genre_id: bytearray(size) for genre_id in self.ids.values()}
+        for genre_id, movie_id in links:
+            # setdefault: a genre created after the names were read
+            buffers.setdefault(genre_id, bytearray(size))[movie_id >> 3] |= 1 << (movie_id & 7)
+        self.bitmaps = {genre_id: int.from_bytes(buffer, "little") for genre_id, buffer in buffers.items()}
+
+    @classmethod
+    def build(cls):
+        return cls(
+            Genre.objects.values_list("id", "name"),
+            Movie.genres.through.objects.values_list("genre_id", "movie_id").iterator(chunk_size=10000),
+        )
+
+    def matching(self, genre_ids, match=MATCH_ALL):
+        """ Bitmap of the movies in all (or any) of the genres """
+        bitmaps = [self.bitmaps.get(genre_id, 0) for genre_id in genre_ids]
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if match == MATCH_ALL else result | bitmap
+        return result
+
+    def filter(self, queryset, names, match=MATCH_ALL):
+        """ Movies of `queryset` in all (or any) of the named genres """
+        genre_ids = self.resolve(names)
+        if match == MATCH_ANY:
+            genre_ids = [genre_id for genre_id in genre_ids if genre_id is not None]
+        if not genre_ids or None in genre_ids:
+            return queryset.none()
+
+        genre_ids = list(dict.fromkeys(genre_ids))
+        if len(genre_ids) == 1:
+            return queryset.filter(genres=genre_ids[0])
+
+        bitmap = self.matching(genre_ids, match)
+        if not bitmap:
+            return queryset.none()
+        if bitmap.bit_count() <= settings.GENRE_FILTER_MAX_IDS:
+            return queryset.filter(pk__in=bitmap_ids(bitmap))
+
+        # Too many ids for one query: let the database intersect
+        links = Movie.genres.through.objects.order_by()
+        if match == MATCH_ANY:
+            return queryset.filter(pk__in=Subquery(links.filter(genre_id__in=genre_ids).values("movie_id")))
+        for genre_id in genre_ids:
+            queryset = queryset.filter(pk__in=Subquery(links.filter(genre_id=genre_id).values("movie_id")))
+        return queryset
+
+
+class _IndexState:
+    def __init__(self, cls):
+        self.cls = cls
+        self.index = None
+        self.version = None
+        self.expires = 0.0
+        self.stale = False
+        self.lock = threading.Lock()
+
+    def current(self, version, now):
+        return self.index is not None and not self.stale and version == self.version and now < self.expires
+
+    def get(self):
+        """ The worker's instance, rebuilt (by one thread, the others wait) when stale or too old """
+        version, now = cache.get(VERSION_KEY), time.monotonic()
+        if self.current(version, now):
+            return self.index
+
+        with self.lock:
+            if not self.current(version, now):
+                self.stale = False
+                self.index = self.cls.build()
+                self.version = version
+                # Age only matters when changes cannot arrive through the version key
+                self.expires = math.inf if cache_is_shared() else now + settings.GENRE_INDEX_REFRESH_SECONDS
+        return self.index
+
+
+_names = _IndexState(GenreNames)
+_index = _IndexState(GenreIndex)
+
+
+def get_genre_names():
+    return _names.get()
+
+
+def get_genre_index():
+    return _index.get()
+
+
+def invalidate_genre_index():
+    """ Rebuild here on the next use and tell other workers via the cache """
+    _names.stale = _index.stale = True
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
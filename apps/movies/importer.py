@@ -0,0 +1,389 @@
+"""
+Bulk catalogue import.
+
+Records stream in from a source (NDJSON, CSV, IMDb-style TSV, or any
+iterable of dicts such as a generator) and are written in chunks of
+`batch_size`, each in its own transaction:
+
+- movies, new people and genres with `bulk_create`;
+- genre links and crew credits as bulk through-table rows, or with
+  PostgreSQL COPY when `use_copy` is set;
+- reviews in bulk, followed by one grouped aggregate rebuild per chunk
+  instead of an `update_movie_stats` call per review. Reviews of a
+  (movie, user) pair that already has one are skipped and counted as such.
+
+Bulk writes send no model signals, so the work the signal handlers would
+have done (search documents, rating aggregates, chart scores, genre stats,
+cache tags, autocomplete and genre indexes) is done once per chunk or once
+at the end.
+
+With a named checkpoint, the number of records committed so far is saved
+in an ImportCheckpoint row by every chunk's own transaction, so an
+interrupted import resumes exactly after them. The people credited by the
+chunks of an interrupted run are not known any more, so the import that
+resumes it rebuilds the career aggregates of everyone.
+"""
+import csv
+import io
+import json
+import os
+import time
+from datetime import date
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.movies.aggregates import credited_people, rebuild_person_stats, refresh_genre_stats, refresh_movie_aggregates
+from apps.movies.models import Genre, ImportCheckpoint, Movie, MovieCrew, Person, Review
+
+IMDB_NULL = "\\N"
+IMDB_MOVIE_TYPES = {"movie", "tvMovie"}
+# Keeps `name__in` queries below SQLite's bound parameter limit
+LOOKUP_BATCH_SIZE = 900
+
+
+class ImportStats:
+    """ Rows written per table, and throughput """
+
+    def __init__(self):
+        self.records = 0
+        self.skipped = 0
+        self.rows = {}
+        self.started = time.perf_counter()
+
+    def add(self, table, count):
+        self.rows[table] = self.rows.get(table, 0) + count
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.total_rows / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        tables = ", ".join(f"{count} {table}" for table, count in self.rows.items() if count)
+        return (
+            f"{self.records} records ({self.skipped} skipped): {tables or 'nothing written'}, "
+            f"{self.rows_per_second:,.0f} rows/s"
+        )
+
+
+class Checkpoint:
+    """ Records committed so far for one source, kept in an ImportCheckpoint row """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.interrupted = False  # an earlier run committed chunks but did not finish
+
+    def load(self):
+        row = ImportCheckpoint.objects.filter(name=self.name).first() if self.name else None
+        if row is None:
+            return 0
+        if row.source != self.source:
+            raise ValueError(f"Checkpoint {self.name} belongs to another import ({row.source})")
+        self.interrupted = not row.finished
+        return row.records
+
+    def save(self, records):
+        """ Called in the chunk's transaction: the chunk and its progress commit together """
+        if self.name:
+            ImportCheckpoint.objects.update_or_create(
+                name=self.name, defaults={"source": self.source, "records": records, "finished": False}
+            )
+
+    def finish(self):
+        if self.name:
+            ImportCheckpoint.objects.filter(name=self.name).update(finished=True)
+
+
+# SOURCES
+
+
+def read_ndjson(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path, delimiter=","):
+    """ CSV / TSV rows as dicts; IMDb's "\\N" becomes None """
+    with open(path, encoding="utf-8", newline="") as f:
+        quoting = csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL
+        for row in csv.DictReader(f, delimiter=delimiter, quoting=quoting):
+            yield {key: (None if value == IMDB_NULL else value) for key, value in row.items()}
+
+
+def open_source(path, fmt=None):
+    """ Records of a file, by explicit format or extension (ndjson, csv, tsv) """
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt in ("ndjson", "jsonl"):
+        return read_ndjson(path)
+    if fmt == "csv":
+        return read_csv(path)
+    if fmt == "tsv":
+        return read_csv(path, delimiter="\t")
+    raise ValueError(f"Unsupported import format: {fmt}")
+
+
+# NORMALIZATION
+
+
+def parse_list(value):
+    """ ["a", "b"], '["a", "b"]', "a|b" or "a,b" -> ["a", "b"] """
+    if not value:
+        return []
+    if isinstance(value, str):
+        if value.startswith("["):
+            return json.loads(value)
+        separator = "|" if "|" in value else ","
+        return [item.strip() for item in value.split(separator) if item.strip()]
+    return list(value)
+
+
+def parse_release_date(value):
+    """ "2010-07-16" or a bare year such as IMDb's startYear """
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    value = str(value)
+    try:
+        return date(int(value), 1, 1) if value.isdigit() else date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def movie_record(raw):
+    """
+    Normalize one movie record, or None to skip it. Accepts the movie
+    export format (title, description, release_date, genres, crew) and
+    IMDb title.basics rows (primaryTitle, startYear, genres).
+    """
+    if "primaryTitle" in raw:
+        if raw.get("titleType") and raw["titleType"] not in IMDB_MOVIE_TYPES:
+            return None
+        raw = {"title": raw["primaryTitle"], "release_date": raw.get("startYear"), "genres": raw.get("genres")}
+
+    title = (raw.get("title") or "").strip()
+    release_date = parse_release_date(raw.get("release_date"))
+    if not title or release_date is None:
+        return None
+
+    crew, seen = [], set()
+    for member in parse_list(raw.get("crew")):
+        name, role = (member.get("name") or "").strip(), member.get("role")
+        # Same role twice for one person is not allowed (MovieCrew.unique_together)
+        if name and role in dict(MovieCrew.ROLE_CHOICES) and (name, role) not in seen:
+            seen.add((name, role))
+            crew.append((name, role, member.get("character_name") or None))
+
+    return {
+        "title": title[:255],
+        "description": raw.get("description") or "",
+        "release_date": release_date,
+        "genres": list(dict.fromkeys(name[:100] for name in parse_list(raw.get("genres")))),
+        "crew": crew,
+    }
+
+
+def review_record(raw):
+    """ (movie_id, user_id, rating, comment), or None to skip """
+    try:
+        movie_id, user_id, rating = int(raw["movie_id"]), int(raw["user_id"]), int(raw["rating"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not 1 <= rating <= 10:
+        return None
+    return movie_id, user_id, rating, raw.get("comment") or ""
+
+
+# WRITERS
+
+
+def copy_supported():
+    return connection.vendor == "postgresql"
+
+
+def copy_rows(model, fields, rows):
+    """ Load rows with PostgreSQL COPY (no conflict handling: duplicates abort the chunk) """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([IMDB_NULL if value is None else value for value in row] for row in rows)
+    columns = ", ".join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    sql = (
+        f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{IMDB_NULL}')"
+    )
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, "copy_expert"):  # psycopg2
+            buffer.seek(0)
+            raw_cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class CatalogueImporter:
+    def __init__(self, batch_size=1000, checkpoint=None, use_copy=False, progress=None):
+        self.batch_size = batch_size
+        self.checkpoint_name = checkpoint
+        self.use_copy = use_copy and copy_supported()
+        self.progress = progress  # called with ImportStats after every chunk
+        self.genre_ids = {}
+        self.touched_people = set()  # career aggregates are rebuilt once, at the end
+
+    def import_movies(self, records, source="movies"):
+        return self._run(records, f"movies:{source}", movie_record, self._write_movies)
+
+    def import_reviews(self, records, source="reviews"):
+        return self._run(records, f"reviews:{source}", review_record, self._write_reviews)
+
+    def _run(self, records, source, normalize, write):
+        from apps.movies.autocomplete import invalidate_autocomplete
+        from apps.movies.cache import invalidate_tags
+        from apps.movies.genre_index import invalidate_genre_index
+
+        checkpoint = Checkpoint(self.checkpoint_name, source)
+        done = checkpoint.load()
+        stats = ImportStats()
+        for chunk in batched(islice(records, done, None), self.batch_size):
+            normalized = [record for record in map(normalize, chunk) if record is not None]
+            with transaction.atomic():
+                dropped = write(normalized, stats)
+                done += len(chunk)
+                checkpoint.save(done)
+            stats.records += len(chunk)
+            stats.skipped += len(chunk) - len(normalized) + dropped
+            if self.progress:
+                self.progress(stats)
+
+        if stats.total_rows or checkpoint.interrupted:
+            refresh_genre_stats()
+            # Everyone after an interrupted run: its touched people were lost with it
+            rebuild_person_stats(None if checkpoint.interrupted else self.touched_people, batch_size=self.batch_size)
+            self.touched_people = set()
+            invalidate_tags("movie:all", "person:all", "genre:all", "genre:stats")
+            invalidate_autocomplete()
+            invalidate_genre_index()
+        checkpoint.finish()
+        return stats
+
+    def _insert(self, label, model, fields, rows, stats):
+        if self.use_copy:
+            copy_rows(model, fields, rows)
+        else:
+            objects = (model(**dict(zip(fields, row))) for row in rows)
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+        stats.add(label, len(rows))
+
+    def _resolve_genres(self, names, stats):
+        unknown = [name for name in names if name not in self.genre_ids]
+        if unknown:
+            self.genre_ids.update(Genre.objects.filter(name__in=unknown).values_list("name", "id"))
+        missing = [Genre(name=name) for name in unknown if name not in self.genre_ids]
+        if missing:
+            Genre.objects.bulk_create(missing)
+            self.genre_ids.update((genre.name, genre.pk) for genre in missing)
+            stats.add("genres", len(missing))
+
+    def _resolve_people(self, names, stats):
+        """ name -> person id, creating the people not found by name """
+        person_ids = {}
+        for batch in batched(names, LOOKUP_BATCH_SIZE):
+            # On duplicate names the oldest person wins
+            for name, person_id in Person.objects.filter(name__in=batch).order_by("-pk").values_list("name", "pk"):
+                person_ids[name] = person_id
+        missing = [Person(name=name) for name in names if name not in person_ids]
+        if missing:
+            Person.objects.bulk_create(missing, batch_size=self.batch_size)
+            person_ids.update((person.name, person.pk) for person in missing)
+            stats.add("people", len(missing))
+        return person_ids, missing
+
+    def _write_movies(self, records, stats):
+        from apps.movies.search import refresh_movie_documents, refresh_person_documents
+
+        self._resolve_genres(list(dict.fromkeys(name for record in records for name in record["genres"])), stats)
+        person_ids, new_people = self._resolve_people(
+            list(dict.fromkeys(name for record in records for name, _, _ in record["crew"])), stats
+        )
+
+        movies = [
+            Movie(title=record["title"], description=record["description"], release_date=record["release_date"])
+            for record in records
+        ]
+        Movie.objects.bulk_create(movies, batch_size=self.batch_size)
+        stats.add("movies", len(movies))
+
+        genre_links = [
+            (movie.pk, self.genre_ids[name]) for movie, record in zip(movies, records) for name in record["genres"]
+        ]
+        credits = [
+            (movie.pk, person_ids[name], role, character_name)
+            for movie, record in zip(movies, records)
+            for name, role, character_name in record["crew"]
+        ]
+        self._insert("genre links", Movie.genres.through, ["movie_id", "genre_id"], genre_links, stats)
+        self._insert("credits", MovieCrew, ["movie_id", "person_id", "role", "character_name"], credits, stats)
+
+        refresh_movie_documents([movie.pk for movie in movies])
+        refresh_person_documents([(person.pk, person.name) for person in new_people])
+        self.touched_people.update(person_id for _, person_id, _, _ in credits)
+        return 0
+
+    def _write_reviews(self, records, stats):
+        from apps.movies.charts import mark_charts_dirty
+
+        # Reviews of unknown movies or users would fail the whole chunk
+        movie_ids = set(Movie.objects.filter(pk__in={record[0] for record in records}).values_list("pk", flat=True))
+        user_ids = set(
+            get_user_model().objects.filter(pk__in={record[1] for record in records}).values_list("pk", flat=True)
+        )
+        valid = [record for record in records if record[0] in movie_ids and record[1] in user_ids]
+
+        # One review per (movie, user): pairs already stored, or repeated in the
+        # chunk, are skipped here so that only inserted rows are counted
+        seen = set(
+            Review.objects.filter(
+                movie_id__in={record[0] for record in valid}, user_id__in={record[1] for record in valid}
+            ).values_list("movie_id", "user_id")
+        )
+        new = []
+        for record in valid:
+            if record[:2] not in seen:
+                seen.add(record[:2])
+                new.append(record)
+
+        if self.use_copy:
+            now = timezone.now()
+            rows = [(*record, now, now) for record in new]
+            self._insert(
+                "reviews", Review, ["movie_id", "user_id", "rating", "comment", "created_at", "updated_at"], rows, stats
+            )
+        else:
+            fields = ["movie_id", "user_id", "rating", "comment"]
+            reviews = [Review(**dict(zip(fields, record))) for record in new]
+            # ignore_conflicts only guards against a concurrent writer of the same pair
+            Review.objects.bulk_create(reviews, batch_size=self.batch_size, ignore_conflicts=True)
+            stats.add("reviews", len(reviews))
+
+        # One grouped aggregate rebuild instead of update_movie_stats per review
+        touched = sorted({record[0] for record in new})
+        refresh_movie_aggregates(touched)
+        mark_charts_dirty(*touched)
+        self.touched_people.update(credited_people(touched))
+        return len(records) - len(new)
@@ -0,0 +1,245 @@
+"""
+Per-worker first tier (L1) of the response cache.
+
+A byte-capped LRU with TTLs that sits in front of the Django cache (L2,
+Redis in production) for the hottest payloads, so that a hit costs neither
+a network round trip nor unpickling. L1 entries are not checked against the
+tag versions in L2; instead every `invalidate_tags` is broadcast on an
+invalidation bus and each worker drops its entries carrying those tags:
+
+- "redis":  Redis pub/sub, one listener thread per worker. After a lost
+            connection the listener clears L1, since messages may be missed.
+- "locmem": in-process only, for tests and single-process runs.
+
+CACHE_L1_TTL bounds how long an entry can outlive a lost message. An entry
+read or computed while one of its tags was invalidated would outlive the
+message too, so fills pass the invalidation `generation` read before their
+lookup and are refused in that case.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.movies.backends import redis_connection
+
+INVALIDATION_CHANNEL = "movies:cache:invalidate"
+
+
+class LocalLRUCache:
+    """
+    Thread-safe LRU bounded by the pickled size of its values, with
+    per-entry expiry and a tag -> keys index for invalidation.
+
+    `generation` counts invalidations. The last one of each recently
+    invalidated tag is remembered (up to `max_tracked_tags` tags), so that
+    `set(..., since=generation)` can refuse values that were invalidated
+    while they were being read or computed.
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes=None, max_tracked_tags=10000):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.max_tracked_tags = max_tracked_tags
+        self.entries = OrderedDict()  # key -> (value, size, expires, tags)
+        self.tag_keys = {}
+        self.invalidated = OrderedDict()  # tag -> generation of its last invalidation
+        self.generation = 0
+        self.forgotten = 0  # invalidations up to this generation are no longer tracked
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if ttl <= 0 or size > self.max_entry_bytes:
+            return False
+        with self.lock:
+            if since is not None and self._invalidated_since(tags, since):
+                return False
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, time.monotonic() + ttl, tuple(tags))
+            self.size += size
+            for tag in tags:
+                self.tag_keys.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate_tags(self, tags):
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                self.invalidated[tag] = self.generation
+                self.invalidated.move_to_end(tag)
+                for key in self.tag_keys.pop(tag, ()):
+                    if key in self.entries:
+                        self._remove(key)
+            while len(self.invalidated) > self.max_tracked_tags:
+                _, self.forgotten = self.invalidated.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tag_keys.clear()
+            self.size = 0
+            # Whatever was being read or computed may have missed invalidations
+            self.generation += 1
+            self.forgotten = self.generation
+            self.invalidated.clear()
+
+    def _invalidated_since(self, tags, generation):
+        if generation < self.forgotten:
+            return True
+        return any(self.invalidated.get(tag, 0) > generation for tag in tags)
+
+    def _remove(self, key):
+        _, size, _, tags = self.entries.pop(key)
+        self.size -= size
+        for tag in tags:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# INVALIDATION BUS
+
+
+class LocalInvalidationBus:
+    """ Delivers invalidations to subscribers of this process only """
+
+    def __init__(self):
+        self.handlers = []
+
+    def subscribe(self, handler):
+        self.handlers.append(handler)
+
+    def publish(self, tags):
+        for handler in self.handlers:
+            handler(tags)
+
+    def ensure_listening(self):
+        pass
+
+
+class RedisInvalidationBus(LocalInvalidationBus):
+    """ Redis pub/sub: every worker's listener thread receives every invalidation """
+
+    def __init__(self, connection, channel=INVALIDATION_CHANNEL):
+        super().__init__()
+        self.connection = connection
+        self.channel = channel
+        self.listener_pid = None
+
+    def subscribe(self, handler):
+        super().subscribe(handler)
+        self.ensure_listening()
+
+    def publish(self, tags):
+        # Local handlers first, so this worker never serves its own stale entries
+        super().publish(tags)
+        try:
+            self.connection.publish(self.channel, json.dumps(sorted(tags)))
+        except Exception:
+            pass  # other workers fall back to CACHE_L1_TTL
+
+    def ensure_listening(self):
+        """ (Re)start the listener, e.g. in a worker forked after import """
+        if self.listener_pid != os.getpid():
+            self.listener_pid = os.getpid()
+            threading.Thread(target=self._listen, name="cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        backoff = 0.5
+        while True:
+            try:
+                pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 0.5
+                for message in pubsub.listen():
+                    super().publish(json.loads(message["data"]))
+            except Exception:
+                pass
+            # Invalidations may have been missed while disconnected
+            super().publish(None)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+_local_cache = None
+_bus = None
+_setup_lock = threading.RLock()
+
+
+def local_cache_enabled():
+    """ L1 needs a shared L2 to be coherent with; never with DummyCache """
+    return settings.CACHE_L1_MAX_BYTES > 0 and not settings.CACHES["default"]["BACKEND"].endswith("DummyCache")
+
+
+def get_invalidation_bus():
+    global _bus
+    if _bus is None:
+        with _setup_lock:
+            if _bus is None:
+                connection = redis_connection() if settings.CACHE_INVALIDATION_BUS == "redis" else None
+                _bus = RedisInvalidationBus(connection) if connection is not None else LocalInvalidationBus()
+    return _bus
+
+
+def get_local_cache():
+    """ This worker's L1, subscribed to the invalidation bus """
+    global _local_cache
+    if _local_cache is None:
+        with _setup_lock:
+            if _local_cache is None:
+                get_invalidation_bus().subscribe(_handle_invalidation)
+                _local_cache = LocalLRUCache(settings.CACHE_L1_MAX_BYTES)
+    get_invalidation_bus().ensure_listening()
+    return _local_cache
+
+
+def _handle_invalidation(tags):
+    if _local_cache is None:
+        return
+    if tags is None:
+        _local_cache.clear()
+    else:
+        _local_cache.invalidate_tags(tags)
+
+
+def clear_local_cache():
+    """ Drop this worker's L1 (e.g. together with cache.clear() in tests) """
+    if _local_cache is not None:
+        _local_cache.clear()
@@ -0,0 +1,67 @@
+import pickle
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from apps.movies.api.renderers import ORJSONRenderer
+from apps.movies.api.serializers import MovieSerializer
+from apps.movies.api.views import MovieViewSet
+from apps.movies.cache import encoded_value
+from apps.movies.models import Movie
+
+
+def median_ms(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks JSON rendering and cache-hit cost of a large movie list (DRF json vs orjson vs cached bytes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of movies in the list.')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--populate',
+            action='store_true',
+            help='Run populate_movies first when there are fewer movies than --count.',
+        )
+
+    def handle(self, *args, **options):
+        count, iterations = options['count'], options['iterations']
+        if options['populate'] and Movie.objects.count() < count:
+            call_command('populate_movies', stdout=self.stdout)
+
+        movies = list(MovieViewSet.queryset.order_by('-release_date', '-pk')[:count])
+        if not movies:
+            self.stdout.write(self.style.ERROR('No movies found, run with --populate.'))
+            return
+        data = {'next': None, 'previous': None, 'results': MovieSerializer(movies, many=True).data}
+
+        drf_json, orjson_json = JSONRenderer(), ORJSONRenderer()
+        body = orjson_json.render(data)
+        # What each cache design stores and has to turn back into a response on a hit
+        pickled_data = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        pickled_bytes = pickle.dumps(encoded_value(body, {'movie:all': time.time_ns()}), pickle.HIGHEST_PROTOCOL)
+
+        results = [
+            ('render: DRF JSONRenderer', median_ms(lambda: drf_json.render(data), iterations)),
+            ('render: ORJSONRenderer', median_ms(lambda: orjson_json.render(data), iterations)),
+            (
+                'cache hit: unpickle data + DRF render',
+                median_ms(lambda: drf_json.render(pickle.loads(pickled_data)), iterations),
+            ),
+            ('cache hit: unpickle encoded bytes', median_ms(lambda: pickle.loads(pickled_bytes), iterations)),
+        ]
+
+        self.stdout.write(f"{len(movies)} movies, {len(body) / 1024:.0f} KiB of JSON, median of {iterations} runs")
+        baseline = results[0][1]
+        for label, ms in results:
+            self.stdout.write(f"  {label:<40}{ms:>9.2f} ms{baseline / ms if ms else float('inf'):>9.1f}x")
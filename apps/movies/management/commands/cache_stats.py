@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from apps.movies.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Shows per-tier hit/miss counters of the cached movie, person and genre endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'view':<18}{'L1 hits':>10}{'L2 hits':>10}{'stale':>8}{'misses':>10}"
+            f"{'L1 ratio':>10}{'L2 ratio':>10}{'hit ratio':>11}{'variants':>10}"
+        )
+        for view, stats in get_cache_stats().items():
+            l1_ratio, l2_ratio, ratio = (
+                '-' if stats[name] is None else f"{stats[name]:.1%}"
+                for name in ('l1_hit_ratio', 'l2_hit_ratio', 'hit_ratio')
+            )
+            variants = stats.get('variants', '')
+            self.stdout.write(
+                f"{view:<18}{stats['l1_hits']:>10}{stats['hits']:>10}{stats['stale']:>8}{stats['misses']:>10}"
+                f"{l1_ratio:>10}{l2_ratio:>10}{ratio:>11}{variants:>10}"
+            )
+
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.movies.budgets import DATASETS, check_budgets, undeclared_routes
+from apps.movies.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures every API endpoint against its performance budget (queries, wall time, response size) '
+        'and fails with the offending SQL when one is exceeded. Creates users and reviews.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(DATASETS), default='small', help='Which budgets to apply.')
+        parser.add_argument('--runs', type=int, default=3, help='Requests per endpoint; the median counts.')
+        parser.add_argument('--generate', action='store_true', help='Seed the dataset of that size first.')
+
+    def handle(self, *args, **options):
+        missing = undeclared_routes()
+        if missing:
+            raise CommandError(f"Routes without a budget: {', '.join(name for _, name in missing)}")
+
+        if options['generate']:
+            self.stdout.write(f"Generating the {options['size']} dataset...")
+            generate_dataset(**DATASETS[options['size']])
+
+        self.stdout.write(f"{'endpoint':<34}{'status':>7}{'queries':>10}{'ms':>14}{'KiB':>14}")
+        measurements = check_budgets(options['size'], options['runs'])
+        for m in measurements:
+            line = (
+                f"{m.endpoint.label:<34}{m.status:>7}{len(m.queries):>5} / {m.budget.queries:<2}"
+                f"{m.ms:>8.1f} / {m.budget.ms:<4}{m.size / 1024:>7.1f} / {m.budget.kib:<4}"
+            )
+            self.stdout.write(self.style.ERROR(line) if m.violations else line)
+
+        over_budget = [m for m in measurements if m.violations]
+        if over_budget:
+            for m in over_budget:
+                self.stderr.write(m.report() + '\n')
+            raise CommandError(f"{len(over_budget)} endpoint(s) over budget")
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
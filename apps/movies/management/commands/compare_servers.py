@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.movies.benchmarks import SERVER_SCENARIOS, SERVERS, run_server_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts gunicorn (WSGI) and uvicorn (ASGI, async read path) against the current database '
+        'and reports requests per second per worker, p50 and p99 latency under concurrent load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=sorted(SERVERS), help='Repeatable; default both.')
+        parser.add_argument('--scenario', action='append', choices=sorted(SERVER_SCENARIOS), help='Repeatable; default all.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per scenario.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent keep-alive connections.')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--debug', action='store_true', help='Keep DEBUG as configured (default: DEBUG=False).')
+        parser.add_argument('--output', help='Save the report as JSON.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'server':<8}{'scenario':<22}{'req/s/worker':>14}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        try:
+            report = run_server_benchmark(
+                servers=options['server'] or sorted(SERVERS, reverse=True),
+                scenarios=options['scenario'],
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                workers=options['workers'],
+                seed=options['seed'],
+                env=None if options['debug'] else {'DEBUG': 'False'},
+                progress=self.write_result,
+            )
+        except (OSError, RuntimeError) as e:
+            raise CommandError(e)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved to {options['output']}"))
+
+    def write_result(self, server, name, result):
+        self.stdout.write(
+            f"{server:<8}{name:<22}{result['rps_per_worker']:>14.1f}{result['p50_ms'] or 0:>10.2f}"
+            f"{result['p99_ms'] or 0:>10.2f}{result['errors']:>8}"
+        )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.movies.explain import explain_endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays the GET endpoints against the current database, EXPLAINs every distinct query '
+        'and flags full table scans and sorts, with the index that would avoid them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', help='Route name (e.g. movie-list); repeatable, default all.')
+        parser.add_argument('--pages', type=int, default=2, help='List pages to follow through `next`.')
+        parser.add_argument('--min-rows', type=int, default=1000, help='Ignore scans and sorts of fewer rows.')
+        parser.add_argument('--plans', action='store_true', help='Print the plan of every statement.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when a statement is flagged.')
+
+    def handle(self, *args, **options):
+        try:
+            statements = explain_endpoints(options['endpoint'], options['pages'], options['min_rows'])
+        except NotImplementedError as e:
+            raise CommandError(e)
+
+        flagged = [statement for statement in statements if statement.findings]
+        for statement in statements:
+            if not (statement.findings or options['plans']):
+                continue
+            style = self.style.ERROR if statement.findings else self.style.SUCCESS
+            self.stdout.write(style(f"{statement.label} [{statement.alias}]"))
+            self.stdout.write(f"  {statement.sql}")
+            if options['plans']:
+                for line in statement.plan:
+                    self.stdout.write(f"    | {line}")
+            for finding in statement.findings:
+                self.stdout.write(self.style.WARNING(f"  ! {finding}"))
+            if statement.suggestion:
+                self.stdout.write(f"  consider: {statement.suggestion}")
+            elif statement.findings:
+                self.stdout.write("  no index of this table avoids it (filtered on another table, or computed order)")
+            self.stdout.write('')
+
+        summary = f"{len(statements)} distinct queries, {len(flagged)} flagged"
+        if flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from apps.movies.synthetic import generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Generates a deterministic synthetic dataset (movies, people, users, Zipf-distributed reviews)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000)
+        parser.add_argument('--people', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=100000, help='Approximate number of reviews.')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Exponent of movie popularity and user activity.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Generating dataset (seed {options['seed']})...")
+        result = generate_dataset(
+            movies=options['movies'],
+            people=options['people'],
+            users=options['users'],
+            reviews=options['reviews'],
+            zipf=options['zipf'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=lambda stats: self.stdout.write(f"  {stats}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Movies: {result['movies']}"))
+        self.stdout.write(self.style.SUCCESS(f"Users: {result['users']}"))
+        self.stdout.write(self.style.SUCCESS(f"Reviews: {result['reviews']}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.movies.importer import CatalogueImporter, copy_supported, open_source
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports movies (with genres and crew) or reviews from NDJSON, CSV or IMDb-style TSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--entity', choices=['movies', 'reviews'], default='movies')
+        parser.add_argument(
+            '--format',
+            dest='input_format',
+            choices=['ndjson', 'csv', 'tsv'],
+            help='Defaults to the file extension.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records per transaction.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Name to record progress under (in the database); rerunning with it resumes an interrupted import.',
+        )
+        parser.add_argument('--copy', action='store_true', help='Load relation rows and reviews with PostgreSQL COPY.')
+
+    def handle(self, *args, **options):
+        if options['copy'] and not copy_supported():
+            self.stdout.write(self.style.WARNING('COPY needs PostgreSQL, using bulk inserts.'))
+
+        importer = CatalogueImporter(
+            batch_size=options['batch_size'],
+            checkpoint=options['checkpoint'],
+            use_copy=options['copy'],
+            progress=lambda stats: self.stdout.write(f"  {stats}"),
+        )
+        try:
+            records = open_source(options['path'], options['input_format'])
+            if options['entity'] == 'movies':
+                stats = importer.import_movies(records, source=options['path'])
+            else:
+                stats = importer.import_reviews(records, source=options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {stats}"))
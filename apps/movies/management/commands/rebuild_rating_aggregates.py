@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from apps.movies.aggregates import rebuild_genre_stats, rebuild_movie_aggregates, rebuild_person_stats
+from apps.movies.cache import invalidate_tags
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds movie rating aggregates (sum, count, average, histogram) from the reviews table, '
+        'then the genre stats (movie count, average rating) and career aggregates of people from the movies'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report movies whose stored aggregates have drifted, do not write.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        self.stdout.write("Checking rating aggregates..." if check_only else "Rebuilding rating aggregates...")
+
+        drifted = rebuild_movie_aggregates(batch_size=options['batch_size'], dry_run=check_only)
+        drifted_genres = rebuild_genre_stats(dry_run=check_only)
+        drifted_people = rebuild_person_stats(batch_size=options['batch_size'], dry_run=check_only)
+        tags = [f'person:{person_id}' for person_id in drifted_people]
+        if drifted_genres:
+            tags.append('genre:stats')
+        if tags and not check_only:
+            invalidate_tags(*tags)
+
+        if not drifted and not drifted_genres and not drifted_people:
+            self.stdout.write(self.style.SUCCESS('No drift found.'))
+            return
+
+        self.report(drifted, 'movies', check_only)
+        self.report(drifted_genres, 'genres', check_only)
+        self.report(drifted_people, 'people', check_only)
+
+    def report(self, drifted, label, check_only):
+        if not drifted:
+            return
+        preview = ', '.join(str(pk) for pk in drifted[:20])
+        suffix = '...' if len(drifted) > 20 else ''
+        if check_only:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} {label} have drifted: {preview}{suffix}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} {label}: {preview}{suffix}"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.movies.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search documents and index for movies and people'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = type(get_search_backend()).__name__
+        self.stdout.write(f"Rebuilding search index ({backend})...")
+        movies, people = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {movies} movies and {people} people."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from apps.movies.charts import refresh_charts
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the top-rated and trending leaderboards (normally done by Celery beat)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every chart instead of rescoring only the changed movies.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(refresh_charts(full=options['full'])))
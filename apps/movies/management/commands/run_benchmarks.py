@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.movies.benchmarks import SCENARIOS, compare_reports, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays the main API endpoints through the test client and reports p50/p99 latency, '
+        'queries per request and peak memory (review_create writes to the database)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Repeatable; default all.')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear-cache', action='store_true', help='Drop the cached responses before every request.')
+        parser.add_argument('--no-writes', action='store_true', help='Skip scenarios that write (review_create).')
+        parser.add_argument('--output', help='Save the report as JSON.')
+        parser.add_argument('--compare', help='A previous JSON report to compare against.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        self.stdout.write(f"{'scenario':<22}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KiB':>10}{'errors':>8}")
+        report = run_benchmarks(
+            scenarios=options['scenario'],
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            clear_cache=options['clear_cache'],
+            seed=options['seed'],
+            writes=not options['no_writes'],
+            progress=self.write_result,
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved to {options['output']}"))
+
+        if baseline:
+            self.stdout.write(f"Compared with {options['compare']} (current / baseline):")
+            for name, metrics in compare_reports(baseline, report).items():
+                changes = '  '.join(
+                    f"{metric} {ratio:.2f}x" if ratio is not None else f"{metric} n/a"
+                    for metric, (_, _, ratio) in metrics.items()
+                )
+                self.stdout.write(f"  {name:<22}{changes}")
+
+    def write_result(self, name, result):
+        self.stdout.write(
+            f"{name:<22}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['queries_mean']:>9.1f}"
+            f"{result['peak_memory_kib']:>10.0f}{result['errors']:>8}"
+        )
@@ -0,0 +1,394 @@
+"""
+In-process metrics in the Prometheus text exposition format (GET /metrics).
+
+Counters, gauges and histograms live in this module's registry and are
+updated in-process, without any external service:
+
+- http_request_duration_seconds: latency by resolved route (URL name),
+  method and status, recorded by MetricsMiddleware;
+- http_throttled_requests_total: 429 responses by route;
+- cache_requests_total: response-cache lookups by tier ("l1" is the
+  per-worker LRU, "shared" the Django cache) and result (hit, stale, miss);
+- signal_handler_duration_seconds: the model signal handlers of
+  apps/movies/models.py (`timed_receiver`);
+- celery_task_duration_seconds: task run time by task name and final state;
+- db_pool_connections, db_pool_connections_available and
+  db_pool_requests_waiting from the psycopg pool's own statistics where
+  DATABASE_POOL_MAX_SIZE enables it, else db_connections_open (0 or 1 per
+  alias and process);
+- celery_queue_length.
+
+Multiple processes (gunicorn workers, Celery workers): with METRICS_DIR
+set, each process writes a snapshot of its metrics to its own file in that
+directory, at most every METRICS_FLUSH_INTERVAL seconds and at exit, and
+the process answering /metrics adds up every snapshot with its own live
+values. Counters and histograms of processes that have exited are kept, so
+totals do not go backwards when a worker is recycled; their gauges are
+dropped. Empty METRICS_DIR when deploying (like prometheus_client's
+multiprocess directory). Without METRICS_DIR, /metrics reports the answering
+process only.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+REGISTRY = {}  # name -> metric
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.RLock()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values -> value
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def merge(self, total, value):
+        return total + value
+
+    def samples(self, key, value):
+        """ (suffix, labels, value) lines of one label set """
+        yield "", dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Summed over live processes, unless `shared` is False: then it is
+    computed by the process answering /metrics and never written to disk.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), shared=True):
+        super().__init__(name, documentation, labelnames)
+        self.shared = shared
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Per-bucket counts (the last one is +Inf), then the sum
+        with _lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, key, value):
+        labels = dict(zip(self.labelnames, key))
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), value):
+            cumulative += count
+            yield "_bucket", {**labels, "le": format_value(bound)}, cumulative
+        yield "_sum", labels, value[-1]
+        yield "_count", labels, cumulative
+
+
+# METRICS
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to produce a response, by resolved route.", ("method", "route", "status")
+)
+THROTTLED = Counter("http_throttled_requests_total", "Requests rejected by a throttle (429).", ("method", "route"))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Response cache lookups by tier and result.", ("entity", "action", "tier", "result")
+)
+SIGNAL_DURATION = Histogram(
+    "signal_handler_duration_seconds", "Run time of model signal handlers.", ("handler", "sender"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Run time of Celery tasks, by final state.", ("task", "state"),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+DB_CONNECTIONS = Gauge("db_connections_open", "Open database connections (databases without a pool).", ("alias",))
+DB_POOL_SIZE = Gauge("db_pool_connections", "Connections managed by the pool, idle or in use.", ("alias",))
+DB_POOL_AVAILABLE = Gauge("db_pool_connections_available", "Idle connections in the pool.", ("alias",))
+DB_POOL_WAITING = Gauge("db_pool_requests_waiting", "Requests waiting for a pooled connection.", ("alias",))
+QUEUE_LENGTH = Gauge("celery_queue_length", "Messages waiting in a Celery queue.", ("queue",), shared=False)
+
+# l1_hit / hit / stale / miss events of apps/movies/cache.py -> (tier, result)
+CACHE_EVENT_LABELS = {
+    "l1_hit": ("l1", "hit"),
+    "hit": ("shared", "hit"),
+    "stale": ("shared", "stale"),
+    "miss": ("shared", "miss"),
+}
+
+
+def record_cache_lookup(entity, action, event):
+    tier, result = CACHE_EVENT_LABELS[event]
+    CACHE_REQUESTS.inc(entity=entity, action=action, tier=tier, result=result)
+
+
+def timed_receiver(handler):
+    """ Record the run time of a signal handler (apply below @receiver) """
+
+    @wraps(handler)
+    def wrapper(sender, **kwargs):
+        started = time.perf_counter()
+        try:
+            return handler(sender, **kwargs)
+        finally:
+            SIGNAL_DURATION.observe(
+                time.perf_counter() - started, handler=handler.__name__, sender=getattr(sender, "__name__", sender)
+            )
+
+    return wrapper
+
+
+# CELERY
+
+_task_started = {}
+
+
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.observe(time.perf_counter() - started, task=task.name, state=state or "UNKNOWN")
+    flush_if_due()
+
+
+def connect_celery_signals():
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(task_started, weak=False, dispatch_uid="metrics.task_started")
+    task_postrun.connect(task_finished, weak=False, dispatch_uid="metrics.task_finished")
+
+
+def update_queue_lengths(queues=("celery",)):
+    """ Broker queue depth, when the broker is Redis (queues are lists) """
+    if not settings.REDIS_URL or not settings.CELERY_BROKER_URL.startswith("redis"):
+        return
+    import redis
+
+    try:
+        client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+        for queue in queues:
+            QUEUE_LENGTH.set(client.llen(queue), queue=queue)
+    except redis.RedisError:
+        pass
+
+
+# MIDDLEWARE
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    def record(self, request, response, started):
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else "unmatched"
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started, method=request.method, route=route, status=response.status_code
+        )
+        if response.status_code == 429:
+            THROTTLED.inc(method=request.method, route=route)
+        flush_if_due()
+
+
+# MULTIPROCESS SNAPSHOTS
+
+_process = {"pid": None, "token": None, "last_flush": 0.0}
+
+
+def _snapshot_path():
+    if _process["pid"] != os.getpid():
+        _process.update(pid=os.getpid(), token=uuid.uuid4().hex[:8])
+    return os.path.join(settings.METRICS_DIR, f"metrics-{_process['pid']}-{_process['token']}.json")
+
+
+def update_process_gauges():
+    for connection in connections.all():
+        if not connection.settings_dict.get("OPTIONS", {}).get("pool"):
+            DB_CONNECTIONS.set(int(connection.connection is not None), alias=connection.alias)
+            continue
+        # Only a pool this process opened: `connection.pool` would open one
+        pool = getattr(connection, "_connection_pools", {}).get(connection.alias)
+        stats = pool.get_stats() if pool is not None else {}
+        DB_POOL_SIZE.set(stats.get("pool_size", 0), alias=connection.alias)
+        DB_POOL_AVAILABLE.set(stats.get("pool_available", 0), alias=connection.alias)
+        DB_POOL_WAITING.set(stats.get("requests_waiting", 0), alias=connection.alias)
+
+
+def snapshot():
+    """ This process's values: {name: [[label values, value], ...]} """
+    with _lock:
+        return {
+            metric.name: [[list(key), value] for key, value in metric.values.items()]
+            for metric in REGISTRY.values()
+            if metric.values and getattr(metric, "shared", True)
+        }
+
+
+def flush():
+    """ Write this process's snapshot (atomically) to METRICS_DIR """
+    if not settings.METRICS_DIR:
+        return
+    update_process_gauges()
+    path = _snapshot_path()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump({"pid": os.getpid(), "metrics": snapshot()}, f)
+    os.replace(temporary, path)
+    _process["last_flush"] = time.monotonic()
+
+
+def flush_if_due():
+    if settings.METRICS_DIR and time.monotonic() - _process["last_flush"] >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _reset_after_fork():
+    """ A forked child starts from zero (its parent reports its own values) """
+    global _lock
+    _lock = threading.RLock()
+    for metric in REGISTRY.values():
+        metric.values.clear()
+    _process.update(pid=None, token=None, last_flush=0.0)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
+
+
+def collect():
+    """ {name: {label values: value}} of this process plus every snapshot in METRICS_DIR """
+    update_process_gauges()
+    update_queue_lengths()
+    with _lock:
+        merged = {name: dict(metric.values) for name, metric in REGISTRY.items()}
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return merged
+
+    own = os.path.basename(_snapshot_path())
+    for filename in os.listdir(settings.METRICS_DIR):
+        if filename == own or not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced, or not ours
+        alive = _alive(data["pid"])
+        for name, values in data["metrics"].items():
+            metric = REGISTRY.get(name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            totals = merged[name]
+            for key, value in values:
+                key = tuple(key)
+                totals[key] = metric.merge(totals[key], value) if key in totals else value
+    return merged
+
+
+# EXPOSITION
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics():
+    """ Text exposition format 0.0.4 """
+    merged = collect()
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(merged[name].items()):
+            for suffix, labels, sample in metric.samples(key, value):
+                rendered = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+                lines.append(f"{name}{suffix}{{{rendered}}} {format_value(sample)}")
+    return "\n".join(lines) + "\n"
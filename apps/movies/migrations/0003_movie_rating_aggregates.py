@@ -0,0 +1,108 @@
+# Generated by Django 6.0 on 2026-10-18 04:05
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def half_up(average):
+    """ Rounded like the aggregates' SQL (6.25 -> 6.3) """
+    return float(Decimal(repr(average)).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP))
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """ Seed the running aggregates from existing reviews """
+    Movie = apps.get_model('movies', 'Movie')
+    Review = apps.get_model('movies', 'Review')
+
+    stats = (
+        Review.objects.order_by()
+        .values('movie_id')
+        .annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{f'rating_{r}_count': Count('id', filter=Q(rating=r)) for r in range(1, 11)},
+        )
+    )
+    for row in stats.iterator():
+        movie_id = row.pop('movie_id')
+        total = row.pop('total')
+        count = row.pop('count')
+        Movie.objects.filter(pk=movie_id).update(
+            rating_sum=total,
+            total_review_count=count,
+            average_rating=half_up(total / count),
+            **row,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_alter_movie_average_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='rating_10_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_6_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_7_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_8_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_9_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='average_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 6.0 on 2026-10-18 04:12
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def sqlite_has_fts5(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    return bool(cursor.fetchone()[0])
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    Engine specific full-text indexes (see apps/movies/search.py):
+    GIN expression indexes on Postgres, FTS5 tables on SQLite.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS movie_search_document_gin ON movies_moviesearchdocument "
+            "USING GIN (to_tsvector('english'::regconfig, document))"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS person_name_search_gin ON movies_person "
+            "USING GIN (to_tsvector('simple'::regconfig, name))"
+        )
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            if not sqlite_has_fts5(cursor):
+                # The search engine falls back to the "basic" backend
+                return
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS movies_moviesearchdocument_fts "
+            "USING fts5(document, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS movies_person_fts USING fts5(name, tokenize = 'unicode61')"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS movie_search_document_gin")
+        schema_editor.execute("DROP INDEX IF EXISTS person_name_search_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS movies_moviesearchdocument_fts")
+        schema_editor.execute("DROP TABLE IF EXISTS movies_person_fts")
+
+
+def backfill_search_documents(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    MovieCrew = apps.get_model('movies', 'MovieCrew')
+    MovieSearchDocument = apps.get_model('movies', 'MovieSearchDocument')
+
+    crew_names = defaultdict(list)
+    for movie_id, name in MovieCrew.objects.order_by('id').values_list('movie_id', 'person__name').iterator():
+        crew_names[movie_id].append(name)
+
+    documents = (
+        MovieSearchDocument(
+            movie_id=movie_id,
+            document="\n".join([title, description, " ".join(crew_names[movie_id])]),
+        )
+        for movie_id, title, description in Movie.objects.values_list('id', 'title', 'description').iterator()
+    )
+    MovieSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            if not sqlite_has_fts5(cursor):
+                return
+            cursor.execute(
+                "INSERT INTO movies_moviesearchdocument_fts(rowid, document) "
+                "SELECT movie_id, document FROM movies_moviesearchdocument"
+            )
+            cursor.execute("INSERT INTO movies_person_fts(rowid, name) SELECT id, name FROM movies_person")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieSearchDocument',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='movies.movie')),
+                ('document', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_export_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moviecrew',
+            index=models.Index(condition=models.Q(('role', 'director')), fields=['person', 'movie'], name='crew_person_director_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviecrew',
+            index=models.Index(condition=models.Q(('role', 'actor')), fields=['person', 'movie'], name='crew_person_actor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviecrew',
+            index=models.Index(condition=models.Q(('role', 'writer')), fields=['person', 'movie'], name='crew_person_writer_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-18 15:05
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def half_up(average):
+    """ Rounded like the aggregates' SQL (6.25 -> 6.3) """
+    return float(Decimal(repr(average)).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP))
+
+
+def backfill_genre_stats(apps, schema_editor):
+    """ Seed the genre aggregates from the movies' running aggregates """
+    Genre = apps.get_model('movies', 'Genre')
+
+    stats = Genre.objects.annotate(
+        count=Count('movies'),
+        total=Sum('movies__rating_sum'),
+        reviews=Sum('movies__total_review_count'),
+    ).values('id', 'count', 'total', 'reviews')
+    for row in stats.iterator():
+        total, reviews = row['total'] or 0, row['reviews'] or 0
+        Genre.objects.filter(pk=row['id']).update(
+            movie_count=row['count'],
+            rating_sum=total,
+            review_count=reviews,
+            avg_rating=half_up(total / reviews) if reviews else 0.0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_crew_role_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='avg_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='movie_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_genre_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-18 16:10
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def half_up(average):
+    """ Rounded like the aggregates' SQL (6.25 -> 6.3) """
+    return float(Decimal(repr(average)).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP))
+
+
+def backfill_person_stats(apps, schema_editor):
+    """ Seed the career aggregates from the credits and the movies' aggregates """
+    Person = apps.get_model('movies', 'Person')
+    MovieCrew = apps.get_model('movies', 'MovieCrew')
+
+    stats = {}
+    credits = MovieCrew.objects.values_list(
+        'person_id', 'movie_id', 'movie__release_date', 'movie__rating_sum', 'movie__total_review_count'
+    )
+    for person_id, movie_id, release_date, rating_sum, review_count in credits.iterator():
+        row = stats.setdefault(person_id, {'movies': set(), 'credits': 0, 'total': 0, 'count': 0, 'years': set()})
+        row['credits'] += 1
+        row['years'].add(release_date.year)
+        if movie_id not in row['movies']:
+            # A movie counts once, whatever the number of roles
+            row['movies'].add(movie_id)
+            row['total'] += rating_sum
+            row['count'] += review_count
+    for person_id, row in stats.items():
+        Person.objects.filter(pk=person_id).update(
+            credit_count=row['credits'],
+            rating_sum=row['total'],
+            review_count=row['count'],
+            avg_rating=half_up(row['total'] / row['count']) if row['count'] else 0.0,
+            first_year=min(row['years']),
+            last_year=max(row['years']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_genre_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='avg_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='credit_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='first_year',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='last_year',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='rating_sum',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_person_stats, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,23 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db.models.functions import Now
 from django.dispatch import receiver
-from django.db.models import Avg, Count
+
+from apps.movies.metrics import timed_receiver
 
 # Genre Model
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
+    # Maintained by signals (see apps/movies/aggregates.py): the number of
+    # movies in the genre and the mean rating of all their reviews
+    movie_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0.0)
+    rating_sum = models.PositiveBigIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.name
 
@@ -19,6 +28,24 @@ class Person(models.Model):
     photo = models.ImageField(upload_to='persons/', blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
 
+    # Career aggregates, maintained by signals (see apps/movies/aggregates.py):
+    # credits, the mean rating of all reviews of their movies, and the years
+    # of their first and latest movie
+    credit_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0.0)
+    rating_sum = models.PositiveBigIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    first_year = models.PositiveSmallIntegerField(blank=True, null=True)
+    last_year = models.PositiveSmallIntegerField(blank=True, null=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Incremental exports: WHERE updated_at >= ?
+            models.Index(fields=['updated_at'], name='person_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -37,14 +64,42 @@ class Movie(models.Model):
     average_rating = models.FloatField(default=0.0, )
     total_review_count = models.PositiveIntegerField(default=0)
 
+    # Running rating aggregates, maintained incrementally (see apps/movies/aggregates.py)
+    rating_sum = models.PositiveBigIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    rating_6_count = models.PositiveIntegerField(default=0)
+    rating_7_count = models.PositiveIntegerField(default=0)
+    rating_8_count = models.PositiveIntegerField(default=0)
+    rating_9_count = models.PositiveIntegerField(default=0)
+    rating_10_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped by rating aggregate updates (see apps/movies/aggregates.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-release_date']
+        indexes = [
+            # Keyset pagination: every page is a range scan on (sort field, id)
+            models.Index(fields=['release_date', 'id'], name='movie_release_date_id_idx'),
+            models.Index(fields=['average_rating', 'id'], name='movie_avg_rating_id_idx'),
+            models.Index(fields=['total_review_count', 'id'], name='movie_review_count_id_idx'),
+            # Incremental exports: WHERE updated_at >= ?
+            models.Index(fields=['updated_at'], name='movie_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def rating_histogram(self):
+        """ Number of reviews per rating value, e.g. {1: 0, ..., 10: 42} """
+        return {rating: getattr(self, f'rating_{rating}_count') for rating in range(1, 11)}
+
 # Movies <-> People with Roles
 class MovieCrew(models.Model):
     """ 
@@ -68,43 +123,443 @@ class MovieCrew(models.Model):
         # Ensures a person can't have the EXACT same role twice in one movie 
         # (e.g., Listed as Director twice)
         unique_together = ('movie', 'person', 'role')
+        indexes = [
+            # A person's credits in one role (filmographies): WHERE person_id = ? AND role = ?
+            # Partial, one per role: each is a fraction of the table and needs no role column
+            models.Index(fields=['person', 'movie'], condition=models.Q(role='director'), name='crew_person_director_idx'),
+            models.Index(fields=['person', 'movie'], condition=models.Q(role='actor'), name='crew_person_actor_idx'),
+            models.Index(fields=['person', 'movie'], condition=models.Q(role='writer'), name='crew_person_writer_idx'),
+        ]
 
     def __str__(self):
         return f"{self.person.name} ({self.role}) - {self.movie.title}"
 
 
+class MovieSearchDocument(models.Model):
+    """
+    Denormalized search text of a movie (title, description and crew names).
+    Kept in sync by the signals below and indexed by the search backend
+    (see apps/movies/search.py).
+    """
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    document = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Search document for movie {self.movie_id}"
+
+
 class Review(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Prevent multiple reviews per user per movie
         unique_together = ('movie', 'user') 
         ordering = ['-created_at']
+        indexes = [
+            # Nested review list: WHERE movie_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['movie', 'created_at', 'id'], name='review_movie_created_id_idx'),
+            # Trending chart: reviews inside the sliding window
+            models.Index(fields=['created_at'], name='review_created_at_idx'),
+            # Incremental exports: WHERE updated_at >= ?
+            models.Index(fields=['updated_at'], name='review_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.name} - {self.movie.title} ({self.rating})"
 
+
+class ChartEntry(models.Model):
+    """
+    One ranked row of a precomputed leaderboard ("top-rated", "trending",
+    "top-rated:genre:<id>"). Used when Redis sorted sets are not available
+    (see apps/movies/charts.py); a page is a range scan on (chart, position).
+    """
+    chart = models.CharField(max_length=64)
+    position = models.PositiveIntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chart', 'position'], name='chart_entry_chart_position_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.chart} #{self.position + 1}: movie {self.movie_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a resumable bulk import (see apps/movies/importer.py).
+    Saved in the transaction of every chunk, so a committed chunk is never
+    imported twice; `finished` stays False until the end-of-import work
+    (stats rebuilds, invalidations) has run.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    source = models.CharField(max_length=255)
+    records = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.records} records of {self.source}"
+
 # Handlers to auto-update Movie stats on Review changes
+@receiver(pre_save, sender=Review)
+@timed_receiver
+def remember_previous_rating(sender, instance, **kwargs):
+    """
+    Stash the stored (movie, rating) of an existing review so that
+    post_save only has to apply the difference.
+    """
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('movie_id', 'rating').first()
+        )
+
+
 @receiver(post_save, sender=Review)
 @receiver(post_delete, sender=Review)
+@timed_receiver
 def update_movie_stats(sender, instance, **kwargs):
     """
-    Auto-updates both average rating AND total review count
-    whenever a review is added, updated, or deleted.
+    Auto-updates average rating, total review count and the rating histogram
+    whenever a review is added, updated, or deleted (and the same totals of
+    the movie's genres and people).
+    Only the delta is applied, so the cost does not grow with the number of reviews.
     """
-    movie = instance.movie
+    from apps.movies.aggregates import apply_rating_delta, mark_movies_dirty, stats_deferred
+    from apps.movies.cache import invalidate_tags
 
-    # Calculate stats
-    stats = movie.reviews.aggregate(
-        avg=Avg('rating'),
-        count=Count('id')
-    )
+    previous = getattr(instance, '_previous_rating', None)
+
+    if stats_deferred():
+        # Write-behind: the periodic flush task recomputes dirty movies in batches
+        movie_ids = {instance.movie_id}
+        if previous is not None:
+            movie_ids.add(previous[0])
+        mark_movies_dirty(*movie_ids)
+        return
+
+    if kwargs.get('signal') is post_delete:
+        person_ids = apply_rating_delta(instance.movie_id, removed=instance.rating)
+    elif previous is None:
+        person_ids = apply_rating_delta(instance.movie_id, added=instance.rating)
+    elif previous[0] != instance.movie_id:
+        # Review moved to another movie
+        person_ids = apply_rating_delta(previous[0], removed=previous[1])
+        person_ids += apply_rating_delta(instance.movie_id, added=instance.rating)
+    else:
+        person_ids = apply_rating_delta(instance.movie_id, added=instance.rating, removed=previous[1])
+
+    # Filmographies carry the career ratings
+    if person_ids:
+        invalidate_tags(*(f'person:{person_id}' for person_id in set(person_ids)))
+
+
+# Handlers to keep the full-text search index current
+@receiver(post_save, sender=Movie)
+@timed_receiver
+def refresh_movie_search_document(sender, instance, **kwargs):
+    from apps.movies.search import refresh_movie_documents
+
+    refresh_movie_documents([instance.pk])
+
+
+@receiver(post_delete, sender=Movie)
+@timed_receiver
+def remove_movie_search_document(sender, instance, **kwargs):
+    from apps.movies.search import MOVIE_INDEX, get_search_backend
+
+    get_search_backend().remove_documents(MOVIE_INDEX, [instance.pk])
+
+
+@receiver(post_save, sender=MovieCrew)
+@receiver(post_delete, sender=MovieCrew)
+@timed_receiver
+def refresh_crew_search_document(sender, instance, origin=None, **kwargs):
+    from apps.movies.search import refresh_movie_documents
+
+    # Skip when the crew row goes away because its movie is being deleted
+    if isinstance(origin, Movie) or getattr(origin, 'model', None) is Movie:
+        return
+    refresh_movie_documents([instance.movie_id])
+
+
+@receiver(post_save, sender=Person)
+@timed_receiver
+def refresh_person_search_documents(sender, instance, **kwargs):
+    from apps.movies.search import refresh_movie_documents, refresh_person_documents
+
+    refresh_person_documents([(instance.pk, instance.name)])
+    # Crew names are part of the movie documents
+    refresh_movie_documents(instance.movie_credits.values_list('movie_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=Person)
+@timed_receiver
+def remove_person_search_document(sender, instance, **kwargs):
+    from apps.movies.search import PERSON_INDEX, get_search_backend
+
+    get_search_backend().remove_documents(PERSON_INDEX, [instance.pk])
+
+
+# Handler to refresh the in-process autocomplete indexes
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+@timed_receiver
+def invalidate_autocomplete_index(sender, instance, **kwargs):
+    from apps.movies.autocomplete import invalidate_autocomplete
+
+    invalidate_autocomplete()
+
+
+# Handlers to invalidate tagged response caches (see apps/movies/cache.py)
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@timed_receiver
+def invalidate_movie_cache(sender, instance, **kwargs):
+    from apps.movies.cache import invalidate_tags
+
+    invalidate_tags(f'movie:{instance.pk}', 'movie:all')
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@timed_receiver
+def invalidate_movie_genres_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    from apps.movies.cache import invalidate_tags
+
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # genre.movie_set.add(...): pk_set holds movie ids (None on clear)
+        movie_ids = pk_set or ()
+    else:
+        movie_ids = [instance.pk]
+    invalidate_tags('movie:all', 'genre:stats', *(f'movie:{movie_id}' for movie_id in movie_ids))
+
+
+@receiver(post_save, sender=MovieCrew)
+@receiver(post_delete, sender=MovieCrew)
+@timed_receiver
+def invalidate_crew_cache(sender, instance, **kwargs):
+    from apps.movies.cache import invalidate_tags
+
+    # Filmographies list the credits of "person:<id>"
+    person_ids = {instance.person_id, getattr(instance, '_previous_person_id', None)} - {None}
+    invalidate_tags(f'movie:{instance.movie_id}', 'movie:all', *(f'person:{person_id}' for person_id in person_ids))
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+@timed_receiver
+def invalidate_person_cache(sender, instance, **kwargs):
+    from apps.movies.cache import invalidate_tags
+
+    # Movie payloads embed crew names (on delete, the crew rows are already gone
+    # and their own handler has bumped the movies)
+    movie_tags = []
+    if kwargs.get('signal') is post_save:
+        movie_ids = instance.movie_credits.values_list('movie_id', flat=True).distinct()
+        movie_tags = [f'movie:{movie_id}' for movie_id in movie_ids]
+    invalidate_tags(f'person:{instance.pk}', 'person:all', 'movie:all', *movie_tags)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@timed_receiver
+def invalidate_genre_cache(sender, instance, **kwargs):
+    from apps.movies.cache import invalidate_tags
+
+    # Movie payloads embed genre names
+    invalidate_tags(f'genre:{instance.pk}', 'genre:all', 'movie:all')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@timed_receiver
+def invalidate_review_cache(sender, instance, **kwargs):
+    from apps.movies.aggregates import stats_deferred
+    from apps.movies.cache import invalidate_tags
+
+    tags = [f'movie:{instance.movie_id}']
+    if not stats_deferred():
+        # Ratings in lists changed now; in deferred mode the flush task does this
+        tags += ['movie:all', 'genre:stats']
+    invalidate_tags(*tags)
+
+
+# Handlers to keep Genre stats and the genre filter index current
+# (see apps/movies/aggregates.py and apps/movies/genre_index.py)
+@receiver(m2m_changed, sender=Movie.genres.through)
+@timed_receiver
+def update_genre_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    from apps.movies.aggregates import refresh_genre_stats
+    from apps.movies.genre_index import invalidate_genre_index
+
+    if action == 'pre_clear' and not reverse:
+        # movie.genres.clear(): post_clear does not say which genres lost it
+        instance._cleared_genre_ids = list(instance.genres.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        genre_ids = [instance.pk]
+    elif action == 'post_clear':
+        genre_ids = getattr(instance, '_cleared_genre_ids', [])
+    else:
+        genre_ids = pk_set or ()
+    refresh_genre_stats(genre_ids)
+    invalidate_genre_index()
+
+
+@receiver(pre_delete, sender=Movie)
+@timed_receiver
+def remember_movie_genres(sender, instance, **kwargs):
+    # The genre links are deleted with the movie, without m2m_changed
+    instance._genre_ids = list(instance.genres.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+@timed_receiver
+def update_deleted_movie_genre_stats(sender, instance, **kwargs):
+    from apps.movies.aggregates import refresh_genre_stats
+    from apps.movies.cache import invalidate_tags
+    from apps.movies.genre_index import invalidate_genre_index
+
+    genre_ids = getattr(instance, '_genre_ids', [])
+    if genre_ids:
+        refresh_genre_stats(genre_ids)
+        invalidate_tags('genre:stats')
+        invalidate_genre_index()
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@timed_receiver
+def invalidate_genre_names(sender, instance, **kwargs):
+    from apps.movies.genre_index import invalidate_genre_index
+
+    invalidate_genre_index()
+
+
+# Handlers to keep Person career aggregates current (see apps/movies/aggregates.py)
+@receiver(pre_save, sender=MovieCrew)
+@timed_receiver
+def remember_previous_credit_person(sender, instance, **kwargs):
+    # A credit moved to someone else changes both careers
+    instance._previous_person_id = None
+    if instance.pk:
+        instance._previous_person_id = (
+            MovieCrew.objects.filter(pk=instance.pk).values_list('person_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=MovieCrew)
+@receiver(post_delete, sender=MovieCrew)
+@timed_receiver
+def update_credit_person_stats(sender, instance, origin=None, **kwargs):
+    from apps.movies.aggregates import rebuild_person_stats
+
+    # Deleting a movie refreshes its people once (below); a deleted person has no stats
+    if isinstance(origin, (Movie, Person)) or getattr(origin, 'model', None) in (Movie, Person):
+        return
+    rebuild_person_stats({instance.person_id, getattr(instance, '_previous_person_id', None)} - {None})
+
+
+@receiver(pre_delete, sender=Movie)
+@timed_receiver
+def remember_movie_people(sender, instance, **kwargs):
+    from apps.movies.aggregates import credited_people
+
+    # The credits are deleted with the movie
+    instance._person_ids = credited_people([instance.pk])
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@timed_receiver
+def update_movie_people_stats(sender, instance, created=False, **kwargs):
+    from apps.movies.aggregates import credited_people, rebuild_person_stats
+    from apps.movies.cache import invalidate_tags
+
+    if created:
+        return
+    if kwargs.get('signal') is post_delete:
+        person_ids = getattr(instance, '_person_ids', [])
+    else:
+        # The release date (career span) or the title (filmographies) may have changed
+        person_ids = credited_people([instance.pk])
+    if person_ids:
+        rebuild_person_stats(person_ids)
+        invalidate_tags(*(f'person:{person_id}' for person_id in person_ids))
+
+
+# Handlers to keep Movie.updated_at current for incremental exports
+# (see apps/movies/export.py): exported movies embed genres and crew names
+@receiver(post_save, sender=MovieCrew)
+@receiver(post_delete, sender=MovieCrew)
+@timed_receiver
+def touch_crew_movie(sender, instance, **kwargs):
+    Movie.objects.filter(pk=instance.movie_id).update(updated_at=Now())
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@timed_receiver
+def touch_genre_movies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('post_'):
+        movie_ids = (pk_set or ()) if reverse else [instance.pk]
+        Movie.objects.filter(pk__in=movie_ids).update(updated_at=Now())
+
+
+@receiver(post_save, sender=Person)
+@timed_receiver
+def touch_person_movies(sender, instance, created, **kwargs):
+    if not created:
+        Movie.objects.filter(crew__person=instance).update(updated_at=Now())
+
+
+@receiver(post_save, sender=Genre)
+@timed_receiver
+def touch_genre_name_movies(sender, instance, created, **kwargs):
+    if not created:
+        Movie.objects.filter(genres=instance).update(updated_at=Now())
+
+
+# Handlers to keep leaderboards current (see apps/movies/charts.py)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@timed_receiver
+def mark_review_charts_dirty(sender, instance, **kwargs):
+    from apps.movies.aggregates import stats_deferred
+    from apps.movies.charts import mark_charts_dirty
+
+    # In deferred mode the ratings are not updated yet; the flush task does this
+    if not stats_deferred():
+        previous = getattr(instance, '_previous_rating', None)
+        mark_charts_dirty(instance.movie_id, *(previous[:1] if previous else ()))
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@timed_receiver
+def mark_movie_genres_charts_dirty(sender, instance, action, reverse, pk_set, **kwargs):
+    from apps.movies.charts import mark_charts_dirty
+
+    if action.startswith('post_'):
+        mark_charts_dirty(*((pk_set or ()) if reverse else [instance.pk]))
+
+
+@receiver(post_delete, sender=Movie)
+@timed_receiver
+def mark_movie_charts_dirty(sender, instance, **kwargs):
+    from apps.movies.charts import mark_charts_dirty
 
-    # Use 0 if there are no reviews (handle NoneType)
-    movie.average_rating = round(stats['avg'] or 0, 1)
-    movie.total_review_count = stats['count'] or 0
-    movie.save()
\ No newline at end of file
+    mark_charts_dirty(instance.pk)
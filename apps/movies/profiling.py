@@ -0,0 +1,284 @@
+"""
+Per-request profiling (ProfilingMiddleware, first in settings.MIDDLEWARE).
+
+A request is profiled when PROFILING_ENABLED is set, or with probability
+PROFILING_SAMPLE_RATE. For a profiled request the middleware records:
+
+- SQL: query count and time on every connection, and how many queries
+  were exact repeats (same statement and parameters) or shared a statement
+  with others (same SQL, other parameters: the N+1 pattern);
+- cache: the response-cache events of the request ("l1_hit", "hit",
+  "stale", "miss"; see record_cache_event in apps/movies/cache.py);
+- serialize: time in the top-level serializers' `.data`, i.e. their
+  `to_representation` (nested serializers are included, not double counted);
+- render: time spent rendering the response (also when the response cache
+  renders it inside the view).
+
+The figures go out as a `Server-Timing` header (shown by browser dev tools)
+and as one JSON log line on the "apps.movies.profiling" logger. With
+PROFILING_CPROFILE_DIR set, profiled requests also run under cProfile and
+the stats are dumped there (`python -m pstats <file>` or snakeviz).
+
+Requests that are not profiled cost a settings lookup (and a random() call
+when sampling) in the middleware, and a context variable lookup per query,
+serializer `.data` and cache event. SQL run
+while a streaming response is consumed (the exports) happens after the
+middleware returns and is not counted.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_profile", default=None)
+
+
+def current_profile():
+    """ The RequestProfile of the request being profiled, if any """
+    return _current.get()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = Counter()  # sql -> executions
+        self.executions = Counter()  # (sql, params) -> executions
+        self.cache_events = Counter()
+        self.spans = Counter()  # name -> seconds
+        self._open = Counter()  # name -> nesting depth
+
+    # RECORDING
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """ For connection.execute_wrapper """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            self.statements[sql] += 1
+            try:
+                self.executions[(sql, repr(params))] += 1
+            except Exception:  # pragma: no cover - params with a broken repr
+                pass
+
+    @contextmanager
+    def span(self, name):
+        """ Add the time spent inside to `name`; nested spans of the same name count once """
+        if self._open[name]:
+            yield
+            return
+        self._open[name] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] += time.perf_counter() - started
+            self._open[name] -= 1
+
+    # RESULTS
+
+    @property
+    def duplicate_queries(self):
+        """ Executions repeating an earlier one exactly """
+        return sum(times - 1 for times in self.executions.values())
+
+    @property
+    def repeated_statements(self):
+        """ [(sql, executions)] of statements run more than once, most repeated first """
+        return [(sql, times) for sql, times in self.statements.most_common() if times > 1]
+
+    def as_dict(self):
+        return {
+            "sql_queries": self.sql_count,
+            "sql_ms": round(self.sql_time * 1000, 2),
+            "duplicate_queries": self.duplicate_queries,
+            "repeated_statements": [
+                {"sql": shorten(sql), "executions": times} for sql, times in self.repeated_statements[:3]
+            ],
+            "cache": dict(self.cache_events),
+            "serialize_ms": round(self.spans["serialize"] * 1000, 2),
+            "render_ms": round(self.spans["render"] * 1000, 2),
+        }
+
+    def server_timing(self, total):
+        sql_desc = f"{self.sql_count} queries"
+        if self.duplicate_queries:
+            sql_desc += f", {self.duplicate_queries} duplicates"
+        metrics = [
+            f'sql;dur={self.sql_time * 1000:.2f};desc="{sql_desc}"',
+            f"serialize;dur={self.spans['serialize'] * 1000:.2f}",
+            f"render;dur={self.spans['render'] * 1000:.2f}",
+        ]
+        if self.cache_events:
+            events = " ".join(f"{event}={times}" for event, times in sorted(self.cache_events.items()))
+            metrics.append(f'cache;desc="{events}"')
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def shorten(sql, length=200):
+    sql = WHITESPACE_RE.sub(" ", sql)
+    return sql if len(sql) <= length else sql[: length - 3] + "..."
+
+
+# HOOKS
+
+
+def span(name):
+    """ RequestProfile.span of the current profile, or a no-op """
+    profile = _current.get()
+    return profile.span(name) if profile is not None else nullcontext()
+
+
+def record_cache(event):
+    profile = _current.get()
+    if profile is not None:
+        profile.cache_events[event] += 1
+
+
+def profile_queries(execute, sql, params, many, context):
+    """ Execute wrapper of every connection: records queries of profiled requests """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+
+def install_query_hook(sender, connection, **kwargs):
+    """
+    connection_created receiver. Installing the wrapper on each connection,
+    rather than around each request, also catches the queries that async
+    views run in other threads.
+    """
+    if profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_queries)
+
+
+def instrument_serializers():
+    """ Time BaseSerializer.data (called from MoviesConfig.ready, idempotent) """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data.fget
+    if getattr(original, "profiled", False):
+        return
+
+    def data(self):
+        profile = _current.get()
+        if profile is None:
+            return original(self)
+        with profile.span("serialize"):
+            return original(self)
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
+
+
+# MIDDLEWARE
+
+
+def should_profile():
+    if settings.PROFILING_ENABLED:
+        return True
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def cprofile_path(request):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{request.method}-{slug[:80]}.prof"
+    return os.path.join(settings.PROFILING_CPROFILE_DIR, name)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile():
+            return self.get_response(request)
+
+        profile, token, profiler = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        if not should_profile():
+            return await self.get_response(request)
+
+        # cProfile only sees the event loop thread here, not sync_to_async threads
+        profile, token, profiler = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(token, profiler)
+        return self.finish(request, response, profile, profiler)
+
+    def start(self):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        profiler = cProfile.Profile() if settings.PROFILING_CPROFILE_DIR else None
+        if profiler:
+            profiler.enable()
+        return profile, token, profiler
+
+    def stop(self, token, profiler):
+        if profiler:
+            profiler.disable()
+        _current.reset(token)
+
+    def finish(self, request, response, profile, profiler):
+        total = time.perf_counter() - profile.started
+        response["Server-Timing"] = profile.server_timing(total)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 2),
+            **profile.as_dict(),
+        }
+        if profiler:
+            record["cprofile"] = path = cprofile_path(request)
+            os.makedirs(settings.PROFILING_CPROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(path)
+        logger.info(json.dumps(record), extra={"profile": record})
+        return response
+
+    def process_template_response(self, request, response):
+        """ Time the rendering that follows (DRF responses are rendered after the view) """
+        profile = _current.get()
+        if profile is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                profile.spans["render"] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
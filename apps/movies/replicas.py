@@ -0,0 +1,170 @@
+"""
+Read replicas (settings.DATABASE_REPLICAS, from DATABASE_REPLICA_URLS).
+
+ReplicaRouter sends reads of the movies app to a replica, picked at random,
+only while ReplicaRoutingMiddleware has marked the current request as
+replica-safe: a GET/HEAD/OPTIONS under DATABASE_REPLICA_PATHS (the movies
+API) from a client that has not written recently. Everything else reads
+from the primary ("default"): writes and the reads they make, transactions,
+other apps (a user who just registered must be found on their next
+request), the admin, management commands and Celery tasks.
+
+Read-your-writes: a successful unsafe request pins its client (the
+Authorization header, else the session cookie, else the address) to the
+primary for DATABASE_REPLICA_LAG seconds, the replication lag we are
+willing to assume. Pins are kept in the shared cache, and in the worker
+too so they hold without one.
+
+Cached responses: a response cache miss whose tags changed less than
+DATABASE_REPLICA_LAG seconds ago is recomputed from the primary
+(`primary_reads`), otherwise a replica that has not caught up yet would
+store the old data under the new tag versions for everyone.
+
+Replicas are never migrated or written through Django: they replicate the
+primary. Locally, a copy of the SQLite file (DATABASE_REPLICA_URLS=
+sqlite:///replica.sqlite3) stands in for a replica that lags until copied
+again.
+"""
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_APPS = {"movies"}
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_KEY_PREFIX = "db:pin:"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replicas_enabled():
+    return bool(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """ Route the reads made inside to a replica (ReplicaRoutingMiddleware uses this) """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def primary_reads():
+    return replica_reads(False)
+
+
+def recently_written(versions):
+    """ Whether any tag version (a time.time_ns() timestamp) is within DATABASE_REPLICA_LAG """
+    return time.time_ns() - max(versions, default=0) < settings.DATABASE_REPLICA_LAG * 10**9
+
+
+# ROUTER
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and settings.DATABASE_REPLICAS
+            and model._meta.app_label in READ_APPS
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+# PINNING
+
+_local_pins = {}  # client key -> pinned until (time.monotonic())
+_local_pins_lock = threading.Lock()
+
+
+def client_key(request):
+    credentials = (
+        request.META.get("HTTP_AUTHORIZATION")
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip()
+        or request.META.get("REMOTE_ADDR", "")
+    )
+    return hashlib.sha1(credentials.encode("utf-8")).hexdigest()
+
+
+def pin_client(key):
+    lag = settings.DATABASE_REPLICA_LAG
+    now = time.monotonic()
+    with _local_pins_lock:
+        _local_pins[key] = now + lag
+        if len(_local_pins) > 10000:
+            for other, until in list(_local_pins.items()):
+                if until <= now:
+                    del _local_pins[other]
+    cache.set(f"{PIN_KEY_PREFIX}{key}", 1, timeout=max(1, round(lag)))
+
+
+def is_pinned(key):
+    if _local_pins.get(key, 0) > time.monotonic():
+        return True
+    return cache.get(f"{PIN_KEY_PREFIX}{key}") is not None
+
+
+# MIDDLEWARE
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas_enabled():
+            return self.get_response(request)
+        key = client_key(request)
+        with replica_reads(self.use_replica(request, key)):
+            response = self.get_response(request)
+        self.after(request, response, key)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas_enabled():
+            return await self.get_response(request)
+        key = client_key(request)
+        with replica_reads(self.use_replica(request, key)):
+            response = await self.get_response(request)
+        self.after(request, response, key)
+        return response
+
+    def use_replica(self, request, key):
+        return (
+            request.method in SAFE_METHODS
+            and request.path.startswith(settings.DATABASE_REPLICA_PATHS)
+            and not is_pinned(key)
+        )
+
+    def after(self, request, response, key):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_client(key)
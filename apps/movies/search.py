@@ -0,0 +1,246 @@
+"""
+Full-text search for movies and people.
+
+Movies are searched through a denormalized MovieSearchDocument (title,
+description and crew names) that is refreshed by signals whenever a Movie,
+Person or MovieCrew row changes. People are searched by name.
+
+The engine is pluggable (settings.SEARCH_BACKEND):
+
+- "postgres": to_tsvector / to_tsquery with ts_rank, served by GIN
+  expression indexes created in migration 0005.
+- "sqlite":   FTS5 tables (bm25 ranking) for local runs.
+- "basic":    icontains fallback for anything else.
+- "auto":     pick from the database vendor (default).
+
+Every backend returns the queryset annotated with `search_rank` and ordered
+best match first; all terms must match and each term is prefix-matched.
+"""
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+
+from apps.movies.models import Movie, MovieCrew, MovieSearchDocument, Person
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERMS = 8
+
+
+class SearchIndex:
+    """ Describes what to search for one model """
+
+    def __init__(self, lookup, fts_table, fts_column, config):
+        self.lookup = lookup  # ORM path to the searched text
+        self.fts_table = fts_table  # SQLite FTS5 table (rowid = model pk)
+        self.fts_column = fts_column
+        self.config = config  # Postgres text search configuration
+
+
+MOVIE_INDEX = SearchIndex(
+    lookup="search_document__document",
+    fts_table="movies_moviesearchdocument_fts",
+    fts_column="document",
+    config="english",
+)
+PERSON_INDEX = SearchIndex(lookup="name", fts_table="movies_person_fts", fts_column="name", config="simple")
+
+
+def parse_terms(text):
+    """ Split user input into safe lowercase word terms """
+    return TERM_RE.findall(text.lower())[:MAX_TERMS]
+
+
+# BACKENDS
+
+
+class BasicSearchBackend:
+    """ Portable fallback: every term must appear somewhere (icontains) """
+
+    def search(self, queryset, index, terms):
+        for term in terms:
+            queryset = queryset.filter(**{f"{index.lookup}__icontains": term})
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).order_by(
+            "-search_rank", "-pk"
+        )
+
+    def index_documents(self, index, rows):
+        """ Hook for engines that keep a separate index; rows are (pk, text) """
+
+    def remove_documents(self, index, pks):
+        pass
+
+
+class ToTSVector(Func):
+    """ to_tsvector('<config>'::regconfig, <text>) written exactly like the GIN index expression """
+
+    function = "to_tsvector"
+    template = "%(function)s('%(config)s'::regconfig, %(expressions)s)"
+
+    def __init__(self, config, expression):
+        from django.contrib.postgres.search import SearchVectorField
+
+        if config not in ("english", "simple"):
+            raise ValueError(f"Unsupported text search config: {config}")
+        super().__init__(expression, config=config, output_field=SearchVectorField())
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    """ tsvector @@ tsquery over GIN expression indexes, ranked with ts_rank """
+
+    def search(self, queryset, index, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(
+            " & ".join(f"{term}:*" for term in terms), config=index.config, search_type="raw"
+        )
+        return (
+            queryset.alias(search_vector=ToTSVector(index.config, F(index.lookup)))
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "-pk")
+        )
+
+
+class SQLiteFTSSearchBackend(BasicSearchBackend):
+    """ FTS5 MATCH with bm25() ranking; the FTS rows are written from Python """
+
+    def search(self, queryset, index, terms):
+        fts = index.fts_table
+        match = " AND ".join(f'"{term}"*' for term in terms)
+        meta = queryset.model._meta
+        outer_pk = f'"{meta.db_table}"."{meta.pk.column}"'
+
+        matches = RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match])
+        # bm25() is "lower is better", negate it so that higher rank = better match
+        rank = RawSQL(
+            f"SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {outer_pk}",
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by("-search_rank", "-pk")
+
+    def index_documents(self, index, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, index, [pk for pk, _ in rows])
+            cursor.executemany(
+                f"INSERT INTO {index.fts_table}(rowid, {index.fts_column}) VALUES (%s, %s)", rows
+            )
+
+    def remove_documents(self, index, pks):
+        with connection.cursor() as cursor:
+            self._delete(cursor, index, list(pks))
+
+    def _delete(self, cursor, index, pks):
+        if pks:
+            placeholders = ", ".join(["%s"] * len(pks))
+            cursor.execute(f"DELETE FROM {index.fts_table} WHERE rowid IN ({placeholders})", pks)
+
+
+def fts5_tables_exist():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)",
+            [MOVIE_INDEX.fts_table, PERSON_INDEX.fts_table],
+        )
+        return cursor.fetchone()[0] == 2
+
+
+BACKENDS = {
+    "basic": BasicSearchBackend,
+    "postgres": PostgresSearchBackend,
+    "sqlite": SQLiteFTSSearchBackend,
+}
+_backend = None
+
+
+def get_search_backend():
+    """ The configured backend ("auto" picks one from the database vendor) """
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "SEARCH_BACKEND", "auto")
+        if name == "auto":
+            if connection.vendor == "postgresql":
+                name = "postgres"
+            elif connection.vendor == "sqlite" and fts5_tables_exist():
+                name = "sqlite"
+            else:
+                name = "basic"
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def search(queryset, index, text):
+    """ Ranked full-text search of `queryset`; unchanged when `text` has no terms """
+    terms = parse_terms(text)
+    if not terms:
+        return queryset
+    return get_search_backend().search(queryset, index, terms)
+
+
+# DOCUMENT MAINTENANCE
+
+
+def build_movie_document(title, description, crew_names):
+    return "\n".join([title, description, " ".join(crew_names)])
+
+
+def refresh_movie_documents(movie_ids):
+    """
+    Rebuild the search documents of the given movies (two reads, one upsert).
+    """
+    movie_ids = list(movie_ids)
+    if not movie_ids:
+        return
+
+    crew_names = defaultdict(list)
+    crew = MovieCrew.objects.filter(movie_id__in=movie_ids).order_by("id")
+    for movie_id, name in crew.values_list("movie_id", "person__name"):
+        crew_names[movie_id].append(name)
+
+    documents = [
+        MovieSearchDocument(
+            movie_id=movie_id, document=build_movie_document(title, description, crew_names[movie_id])
+        )
+        for movie_id, title, description in Movie.objects.filter(pk__in=movie_ids).values_list(
+            "id", "title", "description"
+        )
+    ]
+    MovieSearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=["movie"], update_fields=["document"]
+    )
+    get_search_backend().index_documents(MOVIE_INDEX, [(doc.movie_id, doc.document) for doc in documents])
+
+
+def refresh_person_documents(people):
+    """ `people` is an iterable of (id, name) """
+    get_search_backend().index_documents(PERSON_INDEX, people)
+
+
+def rebuild_search_index(batch_size=1000):
+    """ Rebuild every movie document and the person index; returns (movies, people) """
+    movies = people = 0
+    last_pk = 0
+    while True:
+        ids = list(Movie.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        refresh_movie_documents(ids)
+        movies += len(ids)
+        last_pk = ids[-1]
+
+    last_pk = 0
+    while True:
+        rows = list(Person.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "name")[:batch_size])
+        if not rows:
+            break
+        refresh_person_documents(rows)
+        people += len(rows)
+        last_pk = rows[-1][0]
+    return movies, people
@@ -0,0 +1,143 @@
+"""
+Deterministic synthetic datasets for load testing.
+
+`generate_dataset` creates N movies, M people, K users and about R reviews
+through the bulk importer (apps/movies/importer.py), with distributions
+that look like a real catalogue rather than uniform noise:
+
+- crew: one director (sometimes two), one to three writers and a
+  long-tailed cast (median around seven actors); prolific people are
+  credited far more often (Zipf over people);
+- reviews: movie popularity and user activity both follow Zipf laws
+  (exponent `zipf`), so a few titles and power users carry most of the
+  traffic; each movie has a hidden quality its ratings scatter around.
+
+The same seed gives the same dataset (for a given Faker version). Memory
+does not grow with the number of reviews: they are generated user by user.
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from faker import Faker
+
+from apps.movies.importer import CatalogueImporter, batched
+from apps.movies.models import Movie
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Biography", "Comedy", "Crime", "Documentary", "Drama",
+    "Family", "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Sci-Fi",
+    "Sport", "Thriller", "War", "Western",
+]
+PEOPLE_ZIPF = 0.8
+
+
+def zipf_cum_weights(n, exponent):
+    """ Cumulative weights of ranks 1..n for rng.choices(cum_weights=...) """
+    total, cumulative = 0.0, []
+    for rank in range(1, n + 1):
+        total += rank ** -exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def unique_names(fake, count):
+    """ `count` distinct person names; repeats get an IMDb-style suffix """
+    seen = {}
+    names = []
+    for _ in range(count):
+        name = fake.name()
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return names
+
+
+def crew_for(rng, people, people_weights):
+    def pick(k):
+        return set(rng.choices(people, cum_weights=people_weights, k=k))
+
+    cast_size = min(max(int(rng.lognormvariate(2.0, 0.5)), 3), 40)
+    crew = [{"name": name, "role": "director"} for name in pick(2 if rng.random() < 0.05 else 1)]
+    crew += [{"name": name, "role": "writer"} for name in pick(rng.randint(1, 3))]
+    crew += [{"name": name, "role": "actor", "character_name": None} for name in pick(cast_size)]
+    return crew
+
+
+def movie_records(fake, rng, count, people):
+    """ Movie records in the import format """
+    people_weights = zipf_cum_weights(len(people), PEOPLE_ZIPF)
+    genre_weights = zipf_cum_weights(len(GENRES), 1.0)
+    for _ in range(count):
+        yield {
+            "title": fake.sentence(nb_words=rng.randint(1, 5)).rstrip("."),
+            "description": fake.sentence(nb_words=20),
+            "release_date": fake.date_between(start_date="-60y", end_date="today"),
+            "genres": list(set(rng.choices(GENRES, cum_weights=genre_weights, k=rng.randint(1, 3)))),
+            "crew": crew_for(rng, people, people_weights) if people else [],
+        }
+
+
+def create_users(fake, count, seed, batch_size):
+    """ Synthetic users (no usable password, no welcome email); returns their ids """
+    User = get_user_model()
+    prefix = f"synthetic-{seed}-"
+    password = make_password(None)
+    for batch in batched(range(count), batch_size):
+        User.objects.bulk_create(
+            [User(email=f"{prefix}{i}@example.com", name=fake.name(), password=password) for i in batch],
+            ignore_conflicts=True,
+        )
+    return list(User.objects.filter(email__startswith=prefix).order_by("pk").values_list("pk", flat=True))[:count]
+
+
+def review_records(rng, movie_ids, user_ids, count, exponent):
+    """
+    About `count` reviews, user by user: user i writes a share of `count`
+    proportional to rank^-exponent, on distinct Zipf-popular movies.
+    """
+    if not movie_ids or not user_ids:
+        return
+    movie_weights = zipf_cum_weights(len(movie_ids), exponent)
+    quality = [min(max(rng.gauss(6.5, 1.3), 1.0), 10.0) for _ in movie_ids]
+    activity = [rank ** -exponent for rank in range(1, len(user_ids) + 1)]
+    scale = count / sum(activity)
+    positions = range(len(movie_ids))
+
+    for user_id, weight in zip(user_ids, activity):
+        wanted = min(max(round(weight * scale), 1), len(movie_ids))
+        reviewed = set()
+        for attempt in range(wanted * 6):
+            if len(reviewed) >= wanted:
+                break
+            # Popular movies repeat, so heavy users fall back to the long tail
+            if attempt < wanted * 3:
+                position = rng.choices(positions, cum_weights=movie_weights)[0]
+            else:
+                position = rng.randrange(len(movie_ids))
+            if position in reviewed:
+                continue
+            reviewed.add(position)
+            rating = min(max(round(rng.gauss(quality[position], 1.6)), 1), 10)
+            yield {"movie_id": movie_ids[position], "user_id": user_id, "rating": rating}
+
+
+def generate_dataset(
+    movies=1000, people=500, users=200, reviews=5000, zipf=1.1, seed=0, batch_size=1000, progress=None
+):
+    """ Create a synthetic dataset; returns {"movies": ImportStats, "reviews": ImportStats, "users": count} """
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    importer = CatalogueImporter(batch_size=batch_size, progress=progress)
+
+    last_pk = Movie.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    records = movie_records(fake, rng, movies, unique_names(fake, people))
+    movie_stats = importer.import_movies(records, source=f"synthetic:{seed}")
+    # Popularity rank (position in this list) is independent of insertion order
+    movie_ids = list(Movie.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True))
+    rng.shuffle(movie_ids)
+
+    user_ids = create_users(fake, users, seed, batch_size)
+    records = review_records(rng, movie_ids, user_ids, reviews, zipf)
+    review_stats = importer.import_reviews(records, source=f"synthetic:{seed}")
+    return {"movies": movie_stats, "reviews": review_stats, "users": len(user_ids)}
@@ -0,0 +1,54 @@
+from celery import shared_task
+from apps.movies.aggregates import (
+    credited_people,
+    genre_links,
+    mark_movies_dirty,
+    pop_dirty_movies,
+    rebuild_movie_aggregates,
+    rebuild_person_stats,
+    refresh_genre_stats,
+)
+from apps.movies.cache import invalidate_tags
+from apps.movies.charts import mark_charts_dirty, refresh_charts
+
+
+@shared_task
+def flush_dirty_movie_stats(batch_size=500):
+    """
+    Write-behind flush for MOVIE_STATS_MODE = "deferred".
+    Recomputes every movie marked dirty since the last run with grouped
+    aggregate queries and writes them back with bulk_update, then the
+    stats of their genres and people.
+    """
+    movie_ids = pop_dirty_movies()
+    if not movie_ids:
+        return "No dirty movies"
+
+    try:
+        rebuild_movie_aggregates(movie_ids=movie_ids, batch_size=batch_size)
+    except Exception:
+        # Put them back so the next run retries
+        mark_movies_dirty(*movie_ids)
+        raise
+
+    refresh_genre_stats(genre_links(movie_ids).values("genre_id").distinct())
+    person_ids = credited_people(movie_ids)
+    rebuild_person_stats(person_ids, batch_size=batch_size)
+    invalidate_tags(
+        "movie:all",
+        "genre:stats",
+        *(f"movie:{movie_id}" for movie_id in movie_ids),
+        *(f"person:{person_id}" for person_id in person_ids),
+    )
+    mark_charts_dirty(*movie_ids)
+
+    return f"Flushed stats for {len(movie_ids)} movies"
+
+
+@shared_task
+def refresh_movie_charts(full=False):
+    """
+    Refresh the top-rated and trending leaderboards, rescoring only the
+    movies changed since the last run unless a full rebuild is due.
+    """
+    return refresh_charts(full=full)
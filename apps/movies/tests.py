@@ -1,12 +1,26 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from apps.movies.models import Movie, Genre, Person, MovieCrew, Review
 from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from apps.movies.aggregates import rebuild_movie_aggregates, stats_deferred
+from apps.movies.importer import CatalogueImporter, open_source
+from apps.movies.tasks import flush_dirty_movie_stats
 
 User = get_user_model()
 
+# Without REDIS_URL the settings fall back to a dummy cache
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
 class MovieAppTests(APITestCase):
     def setUp(self):
         # Create Users
@@ -163,3 +177,294 @@ class MovieAppTests(APITestCase):
         self.assertEqual(self.movie.total_review_count, 2)
         # Average (10+5)/2 = 7.5
         self.assertEqual(self.movie.average_rating, 7.5)
+
+    # --- RATING AGGREGATE TESTS ---
+    def test_rating_change_and_delete_update_aggregates(self):
+        review = Review.objects.create(movie=self.movie, user=self.user, rating=8)
+        Review.objects.create(movie=self.movie, user=self.user2, rating=4)
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.rating_sum, 12)
+        self.assertEqual(self.movie.average_rating, 6.0)
+        self.assertEqual(self.movie.rating_histogram[8], 1)
+
+        # Changing the rating moves it to another histogram bucket
+        review.rating = 10
+        review.save()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.total_review_count, 2)
+        self.assertEqual(self.movie.average_rating, 7.0)
+        self.assertEqual(self.movie.rating_histogram[8], 0)
+        self.assertEqual(self.movie.rating_histogram[10], 1)
+
+        review.delete()
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.total_review_count, 1)
+        self.assertEqual(self.movie.rating_sum, 4)
+        self.assertEqual(self.movie.average_rating, 4.0)
+        self.assertEqual(self.movie.rating_histogram[10], 0)
+
+    def test_rating_updates_bump_movie_updated_at(self):
+        before = self.movie.updated_at
+        Review.objects.create(movie=self.movie, user=self.user, rating=8)
+        self.movie.refresh_from_db()
+        self.assertGreater(self.movie.updated_at, before)
+
+    def test_rebuild_aggregates_repairs_drift(self):
+        Review.objects.create(movie=self.movie, user=self.user, rating=9)
+        # Simulate drift (e.g. rows written with signals disabled)
+        Movie.objects.filter(pk=self.movie.pk).update(total_review_count=5, average_rating=2.0)
+
+        self.assertEqual(rebuild_movie_aggregates(dry_run=True), [self.movie.pk])
+        self.assertEqual(rebuild_movie_aggregates(), [self.movie.pk])
+        self.assertEqual(rebuild_movie_aggregates(), [])
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.total_review_count, 1)
+        self.assertEqual(self.movie.average_rating, 9.0)
+
+    def test_deferred_stats_mode_flushes_in_batch(self):
+        with override_settings(MOVIE_STATS_MODE='deferred', CACHES=LOCMEM_CACHES):
+            cache.clear()
+            self.assertTrue(stats_deferred())
+
+            Review.objects.create(movie=self.movie, user=self.user, rating=6)
+            Review.objects.create(movie=self.movie, user=self.user2, rating=8)
+
+            # Nothing is aggregated on the request path
+            self.movie.refresh_from_db()
+            self.assertEqual(self.movie.total_review_count, 0)
+
+            flush_dirty_movie_stats()
+
+            self.movie.refresh_from_db()
+            self.assertEqual(self.movie.total_review_count, 2)
+            self.assertEqual(self.movie.average_rating, 7.0)
+            self.assertEqual(flush_dirty_movie_stats(), "No dirty movies")
+
+    def test_deferred_stats_mode_stays_synchronous_without_cache(self):
+        # A dummy cache would drop the dirty set, and with it every rating
+        with override_settings(MOVIE_STATS_MODE='deferred', CACHES=DUMMY_CACHES):
+            self.assertFalse(stats_deferred())
+            Review.objects.create(movie=self.movie, user=self.user, rating=6)
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.total_review_count, 1)
+        self.assertEqual(self.movie.average_rating, 6.0)
+
+    # --- PAGINATION TESTS ---
+    def test_keyset_pagination_walks_all_movies(self):
+        # Same rating everywhere: the id tiebreaker must keep pages stable
+        for i in range(4):
+            Movie.objects.create(title=f"Movie {i}", description="-", release_date="2011-01-01", average_rating=7.0)
+        Movie.objects.update(average_rating=7.0)
+
+        url = reverse('movie-list')
+        seen = []
+        response = self.client.get(url, {'ordering': '-average_rating', 'page_size': 2})
+        pages = [response]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response)
+        for page in pages:
+            self.assertEqual(page.status_code, status.HTTP_200_OK)
+            seen.extend(movie['id'] for movie in page.data['results'])
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(seen, sorted(Movie.objects.values_list('id', flat=True), reverse=True))
+
+        # Walking back returns the previous page
+        previous = self.client.get(pages[2].data['previous'])
+        self.assertEqual(previous.data['results'], pages[1].data['results'])
+
+    def test_keyset_pagination_rejects_foreign_cursor(self):
+        url = reverse('movie-list')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_keyset_pagination_keeps_microseconds(self):
+        # Reviews apart by less than a millisecond must not be skipped between pages
+        base = timezone.now().replace(microsecond=123000)
+        for i in range(6):
+            user = User.objects.create_user(email=f'reviewer{i}@example.com', name=f'Reviewer {i}', password='password123')
+            review = Review.objects.create(movie=self.movie, user=user, rating=5)
+            Review.objects.filter(pk=review.pk).update(created_at=base + timedelta(microseconds=i))
+
+        url = reverse('movie-reviews-list', kwargs={'movie_pk': self.movie.pk})
+        response = self.client.get(url, {'page_size': 2})
+        seen = [review['id'] for review in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(review['id'] for review in response.data['results'])
+
+        self.assertEqual(seen, list(Review.objects.filter(movie=self.movie).values_list('id', flat=True)))
+        self.assertEqual(len(seen), 6)
+
+    # --- SEARCH TESTS ---
+    def test_search_movies_by_crew_prefix(self):
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='director')
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='writer')
+        other = Movie.objects.create(title="Memento", description="Short-term memory loss", release_date="2000-09-05")
+
+        url = reverse('movie-list')
+        response = self.client.get(url, {'search': 'nol'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Two matching crew rows must not duplicate the movie
+        self.assertEqual([movie['id'] for movie in response.data['results']], [self.movie.id])
+
+        response = self.client.get(url, {'search': 'memory los'})
+        self.assertEqual([movie['id'] for movie in response.data['results']], [other.id])
+
+    def test_search_follows_renames(self):
+        MovieCrew.objects.create(movie=self.movie, person=self.person2, role='actor')
+        self.person2.name = "Jane Doe"
+        self.person2.save()
+        self.movie.title = "Oppenheimer"
+        self.movie.save()
+
+        url = reverse('movie-list')
+        self.assertEqual(len(self.client.get(url, {'search': 'cillian'}).data['results']), 0)
+        self.assertEqual(len(self.client.get(url, {'search': 'jane oppen'}).data['results']), 1)
+
+    def test_search_persons_ranked(self):
+        Person.objects.create(name="Christopher Walken")
+        url = reverse('person-list')
+        response = self.client.get(url, {'search': 'chris'})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(url, {'search': 'chris nolan'})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.person.id])
+
+    # --- AUTOCOMPLETE TESTS ---
+    def test_autocomplete_titles_and_people(self):
+        other = Movie.objects.create(title="Interstellar", description="Space", release_date="2014-11-07")
+        url = reverse('autocomplete')
+
+        response = self.client.get(url, {'q': 'ince'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            ({'id': self.movie.id, 'title': 'Inception', 'year': 2010, 'kind': 'movie'},),
+        )
+
+        response = self.client.get(url, {'q': 'chris nol', 'kind': 'person'})
+        self.assertEqual([r['id'] for r in response.data['results']], [self.person.id])
+
+        # Typo: no prefix match, found through trigram similarity
+        response = self.client.get(url, {'q': 'intersteller'})
+        self.assertEqual([r['id'] for r in response.data['results']], [other.id])
+
+    # --- EXPORT TESTS ---
+    def test_export_movies_ndjson_staff_only(self):
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='director')
+        url = reverse('export', args=['movies', 'ndjson'])
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Inception')
+        self.assertEqual(rows[0]['genres'], ['Action'])
+        self.assertEqual(rows[0]['crew'][0]['name'], 'Christopher Nolan')
+
+        self.assertEqual(self.client.get(reverse('export', args=['users', 'csv'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_incremental_csv(self):
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('export', args=['movies', 'csv'])
+        response = self.client.get(url)
+        since = response['X-Export-Started-At']
+        self.assertEqual(len(list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))), 2)
+
+        Movie.objects.create(title="Interstellar", description="Space", release_date="2014-11-07")
+        response = self.client.get(url, {'since': since})
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0][:2], ['id', 'title'])
+        self.assertEqual([line[1] for line in lines[1:]], ['Interstellar'])
+
+        # A crew change re-exports the movie
+        MovieCrew.objects.create(movie=self.movie, person=self.person2, role='actor')
+        response = self.client.get(url, {'since': since})
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([line[1] for line in lines[1:]], ['Inception', 'Interstellar'])
+
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    # --- IMPORT TESTS ---
+    def test_import_movies_ndjson_resumes_from_checkpoint(self):
+        records = [
+            {'title': 'Tenet', 'release_date': '2020-08-26', 'genres': ['Action', 'Sci-Fi'],
+             'crew': [{'name': 'Christopher Nolan', 'role': 'director'}, {'name': 'John David Washington', 'role': 'actor'}]},
+            {'title': '', 'release_date': '2020-01-01'},
+            {'title': 'Dunkirk', 'release_date': '2017', 'genres': 'Drama|Action'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'movies.ndjson')
+            with open(path, 'w') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+            checkpoint = 'tenet-import'
+
+            stats = CatalogueImporter(batch_size=2, checkpoint=checkpoint).import_movies(open_source(path), source=path)
+            self.assertEqual((stats.records, stats.skipped), (3, 1))
+            # Rerunning with the checkpoint skips what was committed
+            stats = CatalogueImporter(batch_size=2, checkpoint=checkpoint).import_movies(open_source(path), source=path)
+            self.assertEqual(stats.records, 0)
+
+        tenet = Movie.objects.get(title='Tenet')
+        self.assertEqual(sorted(tenet.genres.values_list('name', flat=True)), ['Action', 'Sci-Fi'])
+        self.assertEqual(tenet.crew.get(role='director').person, self.person)
+        self.assertEqual(Movie.objects.get(title='Dunkirk').release_date.isoformat(), '2017-01-01')
+        self.assertEqual(Person.objects.filter(name='John David Washington').count(), 1)
+
+        response = self.client.get(reverse('movie-list'), {'search': 'washington'})
+        self.assertEqual([m['title'] for m in response.data['results']], ['Tenet'])
+
+    def test_import_resumes_after_crash_without_duplicates(self):
+        records = [
+            {'title': 'Tenet', 'release_date': '2020-08-26', 'crew': [{'name': 'Christopher Nolan', 'role': 'director'}]},
+            {'title': 'Dunkirk', 'release_date': '2017', 'crew': [{'name': 'Christopher Nolan', 'role': 'director'}]},
+            {'title': 'Oppenheimer', 'release_date': '2023'},
+        ]
+
+        def crashing():
+            yield from records[:2]
+            raise RuntimeError('worker killed')
+
+        with self.assertRaises(RuntimeError):
+            CatalogueImporter(batch_size=2, checkpoint='nolan').import_movies(crashing(), source='nolan.ndjson')
+        # The first chunk committed, but the end-of-import work never ran
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.credit_count, 0)
+
+        stats = CatalogueImporter(batch_size=2, checkpoint='nolan').import_movies(iter(records), source='nolan.ndjson')
+        self.assertEqual(stats.records, 1)
+        self.assertEqual(Movie.objects.filter(title__in=['Tenet', 'Dunkirk', 'Oppenheimer']).count(), 3)
+        # Credits of the interrupted run are counted too
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.credit_count, 2)
+
+    def test_import_reviews_rebuilds_aggregates(self):
+        records = [
+            {'movie_id': self.movie.id, 'user_id': self.user.id, 'rating': 8},
+            {'movie_id': self.movie.id, 'user_id': self.user2.id, 'rating': '6', 'comment': 'Fine'},
+            {'movie_id': self.movie.id, 'user_id': 999999, 'rating': 9},
+            {'movie_id': self.movie.id, 'user_id': self.admin.id, 'rating': 11},
+        ]
+        stats = CatalogueImporter().import_reviews(iter(records))
+        self.assertEqual((stats.rows['reviews'], stats.skipped), (2, 2))
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.total_review_count, 2)
+        self.assertEqual(self.movie.average_rating, 7.0)
+        self.assertEqual(rebuild_movie_aggregates(dry_run=True), [])
+
+        # Existing and repeated (movie, user) pairs are not counted as imported
+        other = Movie.objects.create(title="Memento", description="-", release_date="2000-09-05")
+        again = records[:2] + [{'movie_id': other.id, 'user_id': self.user.id, 'rating': 7}] * 2
+        stats = CatalogueImporter().import_reviews(iter(again))
+        self.assertEqual((stats.rows['reviews'], stats.skipped), (1, 3))
+        self.assertEqual(Review.objects.count(), 3)
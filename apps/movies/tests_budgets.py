@@ -0,0 +1,20 @@
+from rest_framework.test import APITestCase
+from apps.movies.budgets import DATASETS, check_budgets, undeclared_routes
+from apps.movies.charts import refresh_charts
+from apps.movies.synthetic import generate_dataset
+
+
+class budgetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(**DATASETS["small"])
+        refresh_charts(full=True)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(undeclared_routes(), [], "Declare these routes in apps/movies/budgets.py")
+
+    def test_endpoints_within_budget(self):
+        # Query and size budgets only: wall time varies with the CI machine
+        over_budget = [measurement for measurement in check_budgets("small", timed=False) if measurement.violations]
+        if over_budget:
+            self.fail("Performance budgets exceeded:\n\n" + "\n\n".join(m.report() for m in over_budget))
@@ -1,12 +1,72 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from fnmatch import fnmatchcase
+from functools import wraps
+from unittest import mock
+
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
-from apps.movies.models import Movie, Genre, Person
+from django.core.cache import cache, caches
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from apps.movies.api.renderers import ORJSONRenderer
+from apps.movies import autocomplete, metrics
+from apps.movies.api.throttling import AutocompleteRateThrottle, LocalAnonRateThrottle
+from apps.movies.api.views import MovieViewSet, PersonViewSet
+from apps.movies.autocomplete import AutocompleteIndex, get_autocomplete_index, invalidate_autocomplete
+from apps.movies.aggregates import DIRTY_MOVIES_KEY, rebuild_genre_stats, rebuild_movie_aggregates, rebuild_person_stats
+from apps.movies.benchmarks import SCENARIOS, run_benchmarks
+from apps.movies.charts import CHARTS_DIRTY_KEY, refresh_charts
+from apps.movies.explain import Explainer, Statement, collect_statements
+from apps.movies.genre_index import GenreIndex, bitmap_ids, get_genre_index
+from apps.movies.cache import (
+    clear_response_cache, flush_cache_events, get_cache_stats, invalidate_tags, reset_cache_stats, single_flight,
+)
+from apps.movies.local_cache import LocalLRUCache, clear_local_cache
+from apps.movies.models import Movie, Genre, Person, MovieCrew, Review
+from apps.movies.profiling import RequestProfile
+from apps.movies.cache import fill_reads
+from apps.movies.replicas import ReplicaRouter, ReplicaRoutingMiddleware, replica_reads
+from apps.movies.synthetic import generate_dataset
 
 User = get_user_model()
 
+# Without REDIS_URL the settings fall back to a dummy cache
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'movies-tests'}}
+
+
+def with_cache(test):
+    """ Run `test` against an empty local-memory cache """
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    @wraps(test)
+    def wrapper(self, *args, **kwargs):
+        cache.clear()
+        clear_local_cache()
+        reset_cache_stats()
+        return test(self, *args, **kwargs)
+
+    return wrapper
+
+
+def no_shared_cache():
+    """ Fails on any round trip to the shared cache """
+    stack = ExitStack()
+    for method in ('get', 'get_many', 'set', 'set_many', 'add', 'incr', 'delete', 'delete_many'):
+        stack.enter_context(mock.patch.object(caches['default'], method, side_effect=AssertionError(method)))
+    return stack
+
 class optimizationTests(APITestCase):
     def setUp(self):
         # Create User
@@ -25,7 +85,10 @@ class optimizationTests(APITestCase):
 
         # Clear cache before tests
         cache.clear()
+        clear_local_cache()
+        reset_cache_stats()
 
+    @with_cache
     def test_genre_caching(self):
         """
         Test that Genre list endpoint is cached.
@@ -44,6 +107,7 @@ class optimizationTests(APITestCase):
             response = self.client.get(url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @with_cache
     def test_person_caching(self):
         """
         Test that Person list endpoint is cached.
@@ -62,6 +126,941 @@ class optimizationTests(APITestCase):
             response = self.client.get(url)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_movie_list_latest_reviews_constant_queries(self):
+        """
+        Test that the movie list fetches only the 3 latest reviews per movie,
+        with their users, in a constant number of queries.
+        """
+        reviewers = [
+            User.objects.create_user(email=f'reviewer{i}@example.com', name=f'Reviewer {i}', password='password123')
+            for i in range(5)
+        ]
+        for i in range(4):
+            movie = Movie.objects.create(title=f"Movie {i}", description="-", release_date="2020-01-01")
+            movie.genres.add(self.genre)
+            MovieCrew.objects.create(movie=movie, person=self.person, role='actor')
+            for reviewer in reviewers:
+                Review.objects.create(movie=movie, user=reviewer, rating=7)
+
+        url = reverse('movie-list')
+
+        # movies + genres + crew + persons + latest reviews (joined with users)
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                url, {'ordering': '-release_date', 'expand': 'genres,crew,latest_reviews'}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for movie in response.data['results']:
+            if movie['total_review_count']:
+                self.assertEqual(len(movie['latest_reviews']), 3)
+                self.assertTrue(all(review['user'] for review in movie['latest_reviews']))
+
+    def test_sparse_fieldsets_prune_payload_and_queries(self):
+        """
+        Test that the movie list is compact by default, that ?fields= /
+        ?expand= select fields, and that unselected relations are not fetched.
+        """
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='actor')
+        url = reverse('movie-list')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'title', 'release_date', 'poster', 'average_rating', 'total_review_count'},
+        )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'title,genres'})
+        self.assertEqual(response.data['results'][0], {'title': "Test Movie", 'genres': [{'id': self.genre.id, 'name': "Action"}]})
+
+        response = self.client.get(url, {'fields': 'title,budget'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('movie-detail', args=[self.movie.id]), {'fields': 'id,crew'})
+        self.assertEqual(set(response.data), {'id', 'crew'})
+
+        Review.objects.create(movie=self.movie, user=self.user, rating=9)
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(reverse('movie-reviews-list', args=[self.movie.id]), {'fields': 'rating'})
+        self.assertEqual(response.data['results'], [{'rating': 9}])
+        self.assertNotIn('accounts_customuser', queries.captured_queries[0]['sql'])
+
+    def test_autocomplete_hot_path_has_no_queries(self):
+        """
+        Test that repeated autocomplete requests are served from the
+        in-process index without touching the database.
+        """
+        url = reverse('autocomplete')
+        response = self.client.get(url, {'q': 'test'})
+        self.assertEqual(response.data['results'][0]['id'], self.movie.id)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': 'tes'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), 1)
+
+        # Nor the shared cache: keystrokes are throttled in the worker's memory
+        LocalAnonRateThrottle.cache.clear()
+        with mock.patch.object(caches['default'], 'get', side_effect=AssertionError('cache read')), \
+                mock.patch.object(AutocompleteRateThrottle, 'rate', '3/minute', create=True):
+            for _ in range(3):
+                self.assertEqual(self.client.get(url, {'q': 'te'}).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(url, {'q': 't'}).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        LocalAnonRateThrottle.cache.clear()
+
+    def test_autocomplete_rebuilds_in_background(self):
+        """
+        Test that a stale autocomplete index keeps being served while its
+        replacement is built in another thread, then gets swapped out.
+        """
+        get_autocomplete_index()
+        invalidate_autocomplete()
+        old = autocomplete._state.index
+        new = AutocompleteIndex([])
+        started, release = threading.Event(), threading.Event()
+
+        def build():
+            started.set()
+            release.wait(5)
+            return new
+
+        with override_settings(AUTOCOMPLETE_BACKGROUND_REBUILD=True), \
+                mock.patch.object(AutocompleteIndex, 'build', side_effect=build):
+            self.assertIs(get_autocomplete_index(), old)
+            self.assertTrue(started.wait(5))
+            # Still the old one, without waiting for the build
+            self.assertIs(get_autocomplete_index(), old)
+            release.set()
+            for _ in range(50):
+                if get_autocomplete_index() is new:
+                    break
+                time.sleep(0.05)
+        self.assertIs(get_autocomplete_index(), new)
+        invalidate_autocomplete()
+
+    @with_cache
+    def test_movie_list_variant_cached_until_write(self):
+        """
+        Test that a filtered list variant is cached and that any movie write
+        invalidates it through the "movie:all" tag.
+        """
+        url = reverse('movie-list')
+        params = {'genres__name': 'Action', 'ordering': '-release_date'}
+        self.client.get(url, params)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params)
+            self.assertEqual(len(response.json()['results']), 1)
+
+        movie = Movie.objects.create(title="Another", description="-", release_date="2024-01-01")
+        movie.genres.add(self.genre)
+
+        response = self.client.get(url, params)
+        self.assertEqual(len(response.data['results']), 2)
+
+    @with_cache
+    def test_equivalent_list_queries_share_cache_entry(self):
+        """
+        Test that parameter order, default values, unknown parameters and
+        search case do not create new cache variants.
+        """
+        url = reverse('movie-list')
+        self.client.get(url, {'search': 'Test movie', 'genres__name': 'Action'})
+
+        with self.assertNumQueries(0):
+            self.client.get(f"{url}?genres__name=Action&utm_source=x&search=MOVIE%20test&page_size=20")
+
+        stats = get_cache_stats()['movie:list']
+        self.assertEqual((stats['hits'], stats['misses'], stats['variants']), (1, 1, 1))
+
+    @override_settings(CACHE_LIST_VARIANT_BUDGET=2)
+    @with_cache
+    def test_list_variants_are_bounded(self):
+        """
+        Test that the least recently used list variant is evicted once the
+        per-entity budget is exceeded.
+        """
+        url = reverse('movie-list')
+        for size in (1, 2, 3):
+            self.client.get(url, {'page_size': size})
+        self.assertEqual(get_cache_stats()['movie:list']['variants'], 2)
+
+        with self.assertNumQueries(0):
+            self.client.get(url, {'page_size': 3})
+        # page_size=1 was evicted
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(get_cache_stats()['movie:list']['misses'], 4)
+
+    @with_cache
+    def test_stale_detail_served_while_another_worker_refreshes(self):
+        """
+        Test that an invalidated entry keeps being served (without queries)
+        while the refresh lock is held elsewhere, and is recomputed after.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        self.client.get(url)
+
+        Movie.objects.filter(pk=self.movie.pk).update(title="Renamed")
+        invalidate_tags(f'movie:{self.movie.id}')
+
+        request = Request(APIRequestFactory().get(url))
+        key = MovieViewSet(action='retrieve').get_response_cache_key(request, 'retrieve')
+        with single_flight(key) as leader:
+            self.assertTrue(leader)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.json()['title'], "Test Movie")
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['title'], "Renamed")
+        self.assertEqual(get_cache_stats()['movie:retrieve']['stale'], 1)
+
+    def test_single_flight_locks_per_key(self):
+        """
+        Test that a refresh only holds back callers of the same key.
+        """
+        # A key that would share the lock of "a" among 64 striped ones
+        other = next(key for key in (f'movies:retrieve:{i}' for i in range(1000)) if hash(key) % 64 == hash('a') % 64)
+        with single_flight('a') as leader:
+            self.assertTrue(leader)
+            with single_flight('a') as second:
+                self.assertFalse(second)
+            with single_flight(other) as unrelated:
+                self.assertTrue(unrelated)
+        with single_flight('a') as leader:
+            self.assertTrue(leader)
+
+    def test_clear_response_cache_keeps_shared_keys(self):
+        """
+        Test that on Redis only response entries and tag versions are
+        deleted, not the other keys of the shared database.
+        """
+        request = Request(RequestFactory().get(reverse('movie-detail', args=[self.movie.id])))
+        response_key = MovieViewSet(action='retrieve').get_response_cache_key(request, 'retrieve')
+        with mock.patch.object(cache, 'delete_pattern', create=True) as delete_pattern:
+            clear_response_cache()
+        patterns = [call.args[0] for call in delete_pattern.call_args_list]
+
+        def deleted(key):
+            return any(fnmatchcase(key, pattern) for pattern in patterns)
+
+        self.assertTrue(deleted(response_key))
+        self.assertTrue(deleted('tag:movie:all'))
+        for kept in (DIRTY_MOVIES_KEY, CHARTS_DIRTY_KEY, 'movies:list:variants', 'cache:stats:movie:list:hit'):
+            self.assertFalse(deleted(kept), kept)
+
+    @with_cache
+    def test_xfetch_refreshes_hot_entry_early(self):
+        """
+        Test that a large XFetch beta makes a fresh entry recompute early,
+        and that beta = 0 never does.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        self.client.get(url)
+
+        with override_settings(CACHE_XFETCH_BETA=0):
+            with self.assertNumQueries(0):
+                self.client.get(url)
+
+        with override_settings(CACHE_XFETCH_BETA=1e12):
+            Movie.objects.filter(pk=self.movie.pk).update(title="Early")
+            response = self.client.get(url)
+            self.assertEqual(response.data['title'], "Early")
+
+    @with_cache
+    @override_settings(CACHE_STATS_FLUSH_INTERVAL=3600)
+    def test_movie_detail_served_from_worker_cache(self):
+        """
+        Test that a hot movie detail is served from the in-process tier
+        without touching the shared cache, and is dropped on invalidation.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        self.client.get(url)
+        self.client.get(url)
+
+        stats = get_cache_stats()['movie:retrieve']
+        self.assertEqual((stats['l1_hits'], stats['hits'], stats['misses']), (1, 0, 1))
+
+        # Conditional requests included (the global rate throttles aside)
+        unthrottled = mock.patch.object(MovieViewSet, 'throttle_classes', [])
+        with self.assertNumQueries(0), no_shared_cache(), unthrottled:
+            response = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Wipe the shared tier: the worker copy still answers
+        cache.clear()
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['title'], "Test Movie")
+
+        invalidate_tags(f'movie:{self.movie.id}')
+        Movie.objects.filter(pk=self.movie.pk).update(title="Renamed")
+        response = self.client.get(url)
+        self.assertEqual(response.data['title'], "Renamed")
+
+    @with_cache
+    def test_write_during_fill_is_not_kept_in_worker_cache(self):
+        """
+        Test that an invalidation delivered while a movie detail is computed
+        keeps the payload out of the in-process tier.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        get_object = MovieViewSet.get_object
+
+        def read_then_concurrent_write(view):
+            movie = get_object(view)
+            Movie.objects.filter(pk=movie.pk).update(title="Renamed")
+            invalidate_tags(f'movie:{movie.pk}')
+            return movie
+
+        with mock.patch.object(MovieViewSet, 'get_object', read_then_concurrent_write):
+            self.assertEqual(self.client.get(url).json()['title'], "Test Movie")
+
+        self.assertEqual(self.client.get(url).json()['title'], "Renamed")
+
+    def test_local_cache_is_capped_by_bytes(self):
+        """
+        Test that the in-process LRU evicts least recently used entries by
+        pickled size and rejects oversized ones.
+        """
+        local = LocalLRUCache(max_bytes=3000, max_entry_bytes=2000)
+        for key in ('a', 'b', 'c'):
+            self.assertTrue(local.set(key, 'x' * 1400, ttl=60, tags=['movie:1']))
+            local.get('a')
+
+        # "b" was the least recently used one
+        self.assertIsNone(local.get('b'))
+        self.assertIsNotNone(local.get('a'))
+        self.assertLessEqual(local.size, 3000)
+        self.assertFalse(local.set('big', 'x' * 2500, ttl=60))
+
+        since = local.generation
+        local.invalidate_tags(['movie:1'])
+        self.assertEqual(local.stats()['entries'], 0)
+        # Invalidated after it was read: refused
+        self.assertFalse(local.set('a', 'x', ttl=60, tags=['movie:1'], since=since))
+        self.assertTrue(local.set('a', 'x', ttl=60, tags=['movie:2'], since=since))
+
+    @with_cache
+    def test_cached_movie_response_is_encoded_json(self):
+        """
+        Test that a cache hit returns the exact bytes of the first response,
+        with the same tag-version validators, and that the orjson renderer
+        matches DRF's.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertTrue(second['Content-Type'].startswith('application/json'))
+        self.assertEqual(first.content, JSONRenderer().render(first.data))
+        self.assertEqual(ORJSONRenderer().render({1: 'a'}), b'{"1":"a"}')
+
+    @with_cache
+    def test_conditional_get_movie_detail(self):
+        """
+        Test that If-None-Match / If-Modified-Since short-circuit to 304
+        without queries, until a review changes the movie.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Review.objects.create(movie=self.movie, user=self.user, rating=8)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @with_cache
+    def test_stale_body_keeps_its_validators(self):
+        """
+        Test that a stale body served during a refresh carries the ETag it
+        was built with, so revalidating after the refresh gets the new data.
+        """
+        url = reverse('movie-detail', args=[self.movie.id])
+        etag = self.client.get(url)['ETag']
+
+        Movie.objects.filter(pk=self.movie.pk).update(title="Renamed")
+        invalidate_tags(f'movie:{self.movie.id}')
+
+        request = Request(APIRequestFactory().get(url))
+        key = MovieViewSet(action='retrieve').get_response_cache_key(request, 'retrieve')
+        with single_flight(key):
+            stale = self.client.get(url)
+            self.assertEqual(stale.json()['title'], "Test Movie")
+            self.assertEqual(stale['ETag'], etag)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], "Renamed")
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @with_cache
+    def test_conditional_get_lists(self):
+        """
+        Test conditional GET on the person list and the nested review list.
+        """
+        people_url = reverse('person-list')
+        reviews_url = reverse('movie-reviews-list', args=[self.movie.id])
+        people_etag = self.client.get(people_url)['ETag']
+        reviews_etag = self.client.get(reviews_url)['ETag']
+
+        self.assertEqual(self.client.get(people_url, HTTP_IF_NONE_MATCH=people_etag).status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get(reviews_url, HTTP_IF_NONE_MATCH=reviews_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Person.objects.create(name="New Person")
+        Review.objects.create(movie=self.movie, user=self.user, rating=6)
+        self.assertEqual(self.client.get(people_url, HTTP_IF_NONE_MATCH=people_etag).status_code, 200)
+        self.assertEqual(self.client.get(reviews_url, HTTP_IF_NONE_MATCH=reviews_etag).status_code, 200)
+
+    @with_cache
+    def test_person_rename_invalidates_movie_detail(self):
+        """
+        Test that a cached movie detail embedding a crew member is
+        invalidated when that person changes.
+        """
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='director')
+        url = reverse('movie-detail', args=[self.movie.id])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.person.name = "Jane Doe"
+        self.person.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['crew'][0]['name'], "Jane Doe")
+
+    @with_cache
+    def test_write_during_fill_leaves_entry_stale(self):
+        """
+        Test that a write committing while a response is computed does not
+        get the pre-write payload cached as fresh.
+        """
+        url = reverse('person-detail', args=[self.person.id])
+        get_object = PersonViewSet.get_object
+
+        def read_then_concurrent_write(view):
+            person = get_object(view)
+            Person.objects.filter(pk=person.pk).update(name="Jane Doe")
+            invalidate_tags(f'person:{person.pk}')
+            return person
+
+        with mock.patch.object(PersonViewSet, 'get_object', read_then_concurrent_write):
+            self.assertEqual(self.client.get(url).json()['name'], "John Doe")
+
+        self.assertEqual(self.client.get(url).json()['name'], "Jane Doe")
+
+    def test_top_rated_chart_weights_by_review_count(self):
+        """
+        Test that one perfect review does not outrank many good ones, and
+        that chart pages are served in rank order.
+        """
+        voters = [
+            User.objects.create_user(email=f'voter{i}@example.com', name=f'Voter {i}', password='password123')
+            for i in range(12)
+        ]
+        classic = Movie.objects.create(title="Classic", description="", release_date="1990-01-01")
+        newcomer = Movie.objects.create(title="Newcomer", description="", release_date="2024-01-01")
+        for voter in voters:
+            Review.objects.create(movie=classic, user=voter, rating=9)
+        Review.objects.create(movie=newcomer, user=voters[0], rating=10)
+        Review.objects.create(movie=self.movie, user=voters[1], rating=2)
+        refresh_charts(full=True)
+
+        url = reverse('chart-detail', args=['top-rated'])
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([(item['rank'], item['movie']['title']) for item in data['results']], [(1, "Classic"), (2, "Newcomer")])
+        self.assertIsNotNone(data['next'])
+
+        response = self.client.get(data['next'])
+        self.assertEqual([item['movie']['title'] for item in response.json()['results']], ["Test Movie"])
+
+        # Per genre
+        response = self.client.get(url, {'genre': 'action'})
+        self.assertEqual([item['movie']['title'] for item in response.json()['results']], ["Test Movie"])
+
+    @with_cache
+    def test_chart_refresh_rescores_changed_movies(self):
+        """
+        Test that an incremental refresh merges only the movies reviewed
+        since the last run into the stored charts.
+        """
+        other = Movie.objects.create(title="Other Movie", description="", release_date="2023-02-01")
+        Review.objects.create(movie=self.movie, user=self.user, rating=6)
+        refresh_charts(full=True)
+
+        Review.objects.create(movie=other, user=self.user, rating=8)
+        Review.objects.create(movie=other, user=self.admin, rating=9)
+        self.assertEqual(refresh_charts(), "Rescored 1 movies")
+
+        url = reverse('chart-detail', args=['top-rated'])
+        titles = [item['movie']['title'] for item in self.client.get(url).json()['results']]
+        self.assertEqual(titles, ["Other Movie", "Test Movie"])
+        trending = self.client.get(reverse('chart-detail', args=['trending'])).json()
+        self.assertEqual(trending['results'][0]['movie']['title'], "Other Movie")
+
+        self.assertEqual(self.client.get(reverse('chart-detail', args=['unknown'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_in_chunks(self):
+        """
+        Test that the movie export runs one query plus one batch of
+        prefetches per chunk, never one per movie.
+        """
+        for i in range(3):
+            movie = Movie.objects.create(title=f"Movie {i}", description="", release_date="2023-01-02")
+            movie.genres.add(self.genre)
+            MovieCrew.objects.create(movie=movie, person=self.person, role='actor')
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('export', args=['movies', 'ndjson']))
+
+        # 4 movies in 2 chunks: 1 query + 2 x (genres + crew)
+        with self.assertNumQueries(5):
+            body = b"".join(response.streaming_content)
+        self.assertEqual(len(body.splitlines()), 4)
+
+    def test_synthetic_dataset_and_benchmark_report(self):
+        """
+        Test that the generator is deterministic and keeps aggregates exact,
+        and that the benchmark suite reports every scenario.
+        """
+        result = generate_dataset(movies=30, people=40, users=15, reviews=120, seed=7)
+        self.assertEqual(result['movies'].rows['movies'], 30)
+        self.assertEqual(result['users'], 15)
+        reviews = result['reviews'].rows['reviews']
+        self.assertGreater(reviews, 60)
+        self.assertEqual(Review.objects.count(), reviews)
+        self.assertEqual(rebuild_movie_aggregates(dry_run=True), [])
+        # Zipf: the most reviewed movie gets far more than an even share
+        top = Movie.objects.order_by('-total_review_count').first()
+        self.assertGreater(top.total_review_count, 3 * reviews / 31)
+
+        report = run_benchmarks(iterations=3, warmup=1)
+        self.assertEqual(set(report['scenarios']), set(SCENARIOS))
+        detail = report['scenarios']['movie_detail']
+        self.assertEqual(detail['errors'], 0)
+        self.assertLessEqual(detail['p50_ms'], detail['p99_ms'])
+        json.dumps(report)
+
+    @with_cache
+    def test_profiling_middleware(self):
+        """
+        Test that profiled requests report SQL, cache and serializer timings
+        (header, log line, cProfile dump) and that others are left alone.
+        """
+        url = reverse('movie-list')
+        response = self.client.get(url)
+        self.assertNotIn('Server-Timing', response)
+
+        cache.clear()
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING_ENABLED=True, PROFILING_CPROFILE_DIR=directory):
+            with self.assertLogs('apps.movies.profiling', level='INFO') as logs:
+                response = self.client.get(url)
+                self.client.get(url)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries')
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        miss, hit = (json.loads(line.split(':', 2)[2]) for line in logs.output)
+        self.assertEqual(miss['path'], url)
+        self.assertGreaterEqual(miss['sql_queries'], 1)
+        self.assertEqual(miss['cache'], {'miss': 1})
+        self.assertGreater(miss['serialize_ms'], 0)
+        self.assertEqual(hit['cache'], {'hit': 1})
+        self.assertEqual(hit['serialize_ms'], 0)
+
+        # Exact repeats are duplicates; same statement, other parameters is a repeat
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile.execute_wrapper):
+            for pk in (self.movie.pk, self.movie.pk, 0):
+                list(Movie.objects.filter(pk=pk))
+        self.assertEqual(profile.duplicate_queries, 1)
+        self.assertEqual(profile.repeated_statements[0][1], 3)
+
+    def test_metrics_endpoint(self):
+        """
+        Test that /metrics exposes route latencies and signal handler timings,
+        and honours METRICS_TOKEN.
+        """
+        def value(text, sample):
+            for line in text.splitlines():
+                if line.startswith(sample + ' '):
+                    return float(line.rsplit(' ', 1)[1])
+            return 0.0
+
+        requests = 'http_request_duration_seconds_count{method="GET",route="movie-list",status="200"}'
+        handler = 'signal_handler_duration_seconds_count{handler="update_movie_stats",sender="Review"}'
+        before = self.client.get('/metrics').content.decode()
+        self.client.get(reverse('movie-list'))
+        self.client.get(reverse('movie-list'))
+        Review.objects.create(movie=self.movie, user=self.user, rating=8)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        after = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', after)
+        self.assertEqual(value(after, requests) - value(before, requests), 2)
+        self.assertEqual(value(after, handler) - value(before, handler), 1)
+        self.assertIn('route="movie-list",status="200",le="+Inf"}', after)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_metrics_merge_worker_snapshots(self):
+        """
+        Test that with METRICS_DIR the counts of other (even exited) worker
+        processes are added up, while their gauges are dropped.
+        """
+        def worker():
+            metrics.TASK_DURATION.observe(0.2, task='merge-test', state='SUCCESS')
+            metrics.flush()
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            process = multiprocessing.get_context('fork').Process(target=worker)
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            metrics.TASK_DURATION.observe(0.1, task='merge-test', state='SUCCESS')
+            merged = metrics.collect()
+
+        counts = merged['celery_task_duration_seconds'][('merge-test', 'SUCCESS')]
+        self.assertEqual(sum(counts[:-1]), 2)
+        self.assertAlmostEqual(counts[-1], 0.3)
+        self.assertLessEqual(merged['db_connections_open'][('default',)], 1)
+
+    @with_cache
+    @override_settings(CACHE_STATS_FLUSH_INTERVAL=0)
+    def test_async_views_flush_cache_stats_off_the_loop(self):
+        """
+        Test that the async views push their hit/miss counters to the shared
+        cache from a thread, not with blocking calls on the event loop.
+        """
+        on_loop = []
+
+        def flush():
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            flush_cache_events()
+
+        with mock.patch('apps.movies.api.async_views.flush_cache_events', side_effect=flush):
+            for _ in range(2):
+                self.client.get(reverse('async-movie-detail', args=[self.movie.pk]))
+        self.assertEqual(on_loop, [False, False])
+        stats = get_cache_stats()['movie:retrieve']
+        self.assertEqual((stats['misses'], stats['l1_hits'] + stats['hits']), (1, 1))
+
+    def test_metrics_report_pool_stats(self):
+        """
+        Test that a pooled database reports the pool's own statistics
+        instead of the open-connection gauge.
+        """
+        class Pool:
+            def get_stats(self):
+                return {'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1, 'requests_waiting': 3}
+
+        default = connections['default']
+        options = {**default.settings_dict.get('OPTIONS', {}), 'pool': {'max_size': 10}}
+        metrics.DB_CONNECTIONS.values.pop(('default',), None)
+        with mock.patch.dict(default.settings_dict, {'OPTIONS': options}), \
+                mock.patch.object(default, '_connection_pools', {'default': Pool()}, create=True):
+            merged = metrics.collect()
+
+        self.assertEqual(merged['db_pool_connections'][('default',)], 4)
+        self.assertEqual(merged['db_pool_connections_available'][('default',)], 1)
+        self.assertEqual(merged['db_pool_requests_waiting'][('default',)], 3)
+        self.assertNotIn(('default',), merged['db_connections_open'])
+
+    @with_cache
+    def test_async_read_path_matches_sync(self):
+        """
+        Test that the async movie and person endpoints return what their
+        sync counterparts do, loading each relation in one query.
+        """
+        reviewers = [
+            User.objects.create_user(email=f'async{i}@example.com', name=f'Async {i}', password='password123')
+            for i in range(4)
+        ]
+        for i in range(3):
+            movie = Movie.objects.create(title=f"Async Movie {i}", description="-", release_date="2021-01-01")
+            movie.genres.add(self.genre)
+            MovieCrew.objects.create(movie=movie, person=self.person, role='actor')
+            for reviewer in reviewers:
+                Review.objects.create(movie=movie, user=reviewer, rating=6)
+        expanded = {'ordering': '-release_date', 'expand': 'description,genres,crew,latest_reviews'}
+
+        for params in ({}, expanded, {'genres__name': 'Action', 'fields': 'id,crew'}):
+            cache.clear()
+            sync = self.client.get(reverse('movie-list'), params)
+            cache.clear()
+            # movies, then genres + crew + latest reviews together
+            with self.assertNumQueries(4 if params is expanded else 1 + ('crew' in params.get('fields', ''))):
+                response = self.client.get(reverse('async-movie-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['results'], sync.json()['results'])
+            if params is expanded:
+                reviewed = [movie for movie in response.json()['results'] if movie['total_review_count']]
+                self.assertEqual([len(movie['latest_reviews']) for movie in reviewed], [3, 3, 3])
+
+        movie = Movie.objects.get(title="Async Movie 0")
+        for sync_name, async_name, pk in (
+            ('movie-detail', 'async-movie-detail', movie.pk),
+            ('person-detail', 'async-person-detail', self.person.pk),
+        ):
+            cache.clear()
+            clear_local_cache()
+            sync = self.client.get(reverse(sync_name, args=[pk]))
+            cache.clear()
+            clear_local_cache()
+            response = self.client.get(reverse(async_name, args=[pk]))
+            self.assertEqual(response.content, sync.content)
+
+        etag = self.client.get(reverse('async-movie-detail', args=[movie.pk]))['ETag']
+        response = self.client.get(reverse('async-movie-detail', args=[movie.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(reverse('async-movie-detail', args=[10**6]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_explain_flags_unindexed_sort(self):
+        """
+        Test that the plan advisor replays endpoint queries and flags a sort
+        no index serves, suggesting one.
+        """
+        for i in range(3):
+            reviewer = User.objects.create_user(email=f'plan{i}@example.com', name=f'Plan {i}', password='password123')
+            Review.objects.create(movie=self.movie, user=reviewer, rating=5, comment=f"Comment {i}")
+
+        statements = collect_statements(['movie-reviews-list'])
+        self.assertTrue(any('"movies_review"."movie_id" = %s' in statement.sql for statement in statements))
+
+        explainer = Explainer(min_rows=1)
+        indexed = next(statement for statement in statements if 'FROM "movies_review"' in statement.sql)
+        self.assertFalse([finding for finding in explainer.explain(indexed).findings if finding.kind == 'sort'])
+
+        unindexed = explainer.explain(Statement(
+            'movie-reviews-list', 'unindexed', 'default',
+            'SELECT "movies_review"."id" FROM "movies_review" WHERE "movies_review"."movie_id" = %s '
+            'ORDER BY "movies_review"."comment" ASC',
+            [self.movie.id],
+        ))
+        sorts = [finding.table for finding in unindexed.findings if finding.kind == 'sort']
+        self.assertEqual(sorts, ['movies_review'])
+        self.assertEqual(unindexed.suggestion, 'CREATE INDEX ON movies_review (movie_id, comment)')
+
+    def test_genre_stats_follow_reviews_and_membership(self):
+        """
+        Test that Genre.movie_count and avg_rating follow review writes and
+        movies joining or leaving the genre, without drift.
+        """
+        reviewers = [
+            User.objects.create_user(email=f'genre{i}@example.com', name=f'Genre {i}', password='password123')
+            for i in range(3)
+        ]
+        Review.objects.create(movie=self.movie, user=reviewers[0], rating=8)
+        Review.objects.create(movie=self.movie, user=reviewers[1], rating=6)
+        other = Movie.objects.create(title="Other Movie", release_date="2022-01-01")
+        Review.objects.create(movie=other, user=reviewers[2], rating=10)
+
+        def stats():
+            genre = Genre.objects.get(pk=self.genre.pk)
+            return genre.movie_count, genre.review_count, genre.avg_rating
+
+        self.assertEqual(stats(), (1, 2, 7.0))
+        url = reverse('genre-detail', args=[self.genre.pk])
+        self.assertEqual(self.client.get(url).json()['avg_rating'], 7.0)
+
+        self.genre.movies.add(other)
+        self.assertEqual(stats(), (2, 3, 8.0))
+        self.assertEqual(self.client.get(url).json()['movie_count'], 2)
+
+        Review.objects.filter(movie=other).get().delete()
+        self.assertEqual(stats(), (2, 2, 7.0))
+
+        other.genres.clear()
+        self.assertEqual(stats(), (1, 2, 7.0))
+        self.movie.delete()
+        self.assertEqual(stats(), (0, 0, 0.0))
+        self.assertEqual(rebuild_genre_stats(dry_run=True), [])
+
+    @with_cache
+    def test_multi_genre_filters(self):
+        """
+        Test that ?genres= matches all (or with genres_match=any, any) of the
+        named genres case-insensitively, with or without the id shortcut, and
+        sees membership changes.
+        """
+        drama, comedy = Genre.objects.create(name="Drama"), Genre.objects.create(name="Comedy")
+        self.movie.genres.add(drama)
+        both = Movie.objects.create(title="Both", release_date="2022-01-01")
+        both.genres.add(drama, comedy)
+        funny = Movie.objects.create(title="Funny", release_date="2021-01-01")
+        funny.genres.add(comedy)
+
+        url = reverse('movie-list')
+
+        def titles(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return {movie['title'] for movie in response.json()['results']}
+
+        for max_ids in (5000, 1):
+            with self.subTest(max_ids=max_ids), override_settings(GENRE_FILTER_MAX_IDS=max_ids):
+                cache.clear()
+                self.assertEqual(titles({'genres': 'drama,COMEDY'}), {"Both"})
+                self.assertEqual(titles({'genres': 'Drama,Comedy', 'genres_match': 'any'}), {"Test Movie", "Both", "Funny"})
+                self.assertEqual(titles({'genres__name': 'Action', 'genres': 'Comedy,Drama', 'genres_match': 'any'}), {"Test Movie"})
+                self.assertEqual(titles({'genres': 'Drama,Unknown'}), set())
+                self.assertEqual(titles({'genres': 'Comedy,Unknown', 'genres_match': 'any'}), {"Both", "Funny"})
+
+        # Equivalent spellings share one cached response
+        with self.assertNumQueries(0):
+            self.client.get(url, {'genres': ' comedy, drama'})
+
+        funny.genres.add(drama)
+        self.assertEqual(titles({'genres': 'Drama,Comedy'}), {"Both", "Funny"})
+
+        response = self.client.get(url, {'genres': 'Drama,Comedy', 'genres_match': 'some'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_genre_index_rebuilt_when_too_old(self):
+        """
+        Test that the genre index picks up changes it was not told about
+        (another process, without a shared cache) once it is too old.
+        """
+        drama = Genre.objects.create(name="Drama")
+        now = time.monotonic()
+        with override_settings(GENRE_INDEX_REFRESH_SECONDS=60):
+            with mock.patch('apps.movies.genre_index.time.monotonic', return_value=now):
+                get_genre_index()
+            # No signal: as if written by another process
+            Movie.genres.through.objects.bulk_create([Movie.genres.through(movie_id=self.movie.id, genre_id=drama.id)])
+
+            with mock.patch('apps.movies.genre_index.time.monotonic', return_value=now + 30):
+                self.assertEqual(get_genre_index().matching([drama.id]), 0)
+            with mock.patch('apps.movies.genre_index.time.monotonic', return_value=now + 61):
+                self.assertEqual(bitmap_ids(get_genre_index().matching([drama.id])), [self.movie.id])
+
+    def test_genre_index_kept_with_shared_cache(self):
+        """
+        Test that with a shared cache, where changes arrive through the
+        version key, the genre index is not rebuilt just for being old.
+        """
+        now = time.monotonic()
+        with override_settings(GENRE_INDEX_REFRESH_SECONDS=60), \
+                mock.patch('apps.movies.genre_index.cache_is_shared', return_value=True):
+            with mock.patch('apps.movies.genre_index.time.monotonic', return_value=now):
+                index = get_genre_index()
+            with mock.patch('apps.movies.genre_index.time.monotonic', return_value=now + 3600), \
+                    mock.patch.object(GenreIndex, 'build', side_effect=AssertionError):
+                self.assertIs(get_genre_index(), index)
+
+    @with_cache
+    def test_single_genre_filter_skips_genre_bitmaps(self):
+        """
+        Test that filtering on one genre builds only the genre names, not
+        the bitmaps of every genre.
+        """
+        url = reverse('movie-list')
+        Genre.objects.create(name="Drama")
+        with mock.patch.object(GenreIndex, 'build', side_effect=AssertionError):
+            for params in ({'genres__name': 'action'}, {'genres': 'Action'}, {'genres__name': 'Unknown'}):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                expected = [] if params.get('genres__name') == 'Unknown' else [self.movie.id]
+                self.assertEqual([movie['id'] for movie in response.json()['results']], expected)
+
+    @with_cache
+    def test_person_filmography_and_career_stats(self):
+        """
+        Test that the filmography groups credits by role, newest first, with
+        paginated roles, and that the career aggregates it carries follow
+        credit, review and movie changes through the cache.
+        """
+        older = Movie.objects.create(title="Older Movie", release_date="2001-05-01")
+        middle = Movie.objects.create(title="Middle Movie", release_date="2010-05-01")
+        MovieCrew.objects.create(movie=self.movie, person=self.person, role='actor', character_name="Hero")
+        MovieCrew.objects.create(movie=older, person=self.person, role='actor')
+        MovieCrew.objects.create(movie=middle, person=self.person, role='director')
+        writer = MovieCrew.objects.create(movie=middle, person=self.person, role='writer')
+        reviewers = [
+            User.objects.create_user(email=f'career{i}@example.com', name=f'Career {i}', password='password123')
+            for i in range(3)
+        ]
+        Review.objects.create(movie=self.movie, user=reviewers[0], rating=8)
+        Review.objects.create(movie=middle, user=reviewers[1], rating=6)
+
+        url = reverse('person-filmography', args=[self.person.pk])
+        with self.assertNumQueries(2):
+            data = self.client.get(url).json()
+        # Two roles in one movie count it once towards the ratings
+        self.assertEqual(
+            {key: data['person'][key] for key in ('credit_count', 'avg_rating', 'first_year', 'last_year')},
+            {'credit_count': 4, 'avg_rating': 7.0, 'first_year': 2001, 'last_year': 2023},
+        )
+        self.assertEqual([section['role'] for section in data['roles']], ['director', 'actor', 'writer'])
+        actor = data['roles'][1]
+        self.assertEqual(actor['count'], 2)
+        self.assertEqual([credit['title'] for credit in actor['results']], ["Test Movie", "Older Movie"])
+        self.assertEqual(actor['results'][0]['character_name'], "Hero")
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        first = self.client.get(url, {'page_size': 1}).json()['roles'][1]
+        self.assertEqual([credit['title'] for credit in first['results']], ["Test Movie"])
+        page = self.client.get(first['next']).json()
+        self.assertEqual((page['role'], page['next']), ('actor', None))
+        self.assertEqual([credit['title'] for credit in page['results']], ["Older Movie"])
+
+        Review.objects.create(movie=older, user=reviewers[2], rating=10)
+        self.assertEqual(self.client.get(url).json()['person']['avg_rating'], 8.0)
+
+        writer.delete()
+        Movie.objects.filter(pk=older.pk).update(release_date="1999-05-01")
+        older.refresh_from_db()
+        older.save()
+        middle.delete()
+        person = self.client.get(url).json()['person']
+        self.assertEqual((person['credit_count'], person['avg_rating'], person['first_year']), (2, 9.0, 1999))
+        self.assertEqual(rebuild_person_stats(dry_run=True), [])
+
+        response = self.client.get(url, {'role': 'producer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @with_cache
     def test_review_throttling(self):
         """
         Test that Review creation is throttled (10/min).
@@ -96,3 +1095,43 @@ class optimizationTests(APITestCase):
         # The 11th request should be throttled
         response = self.client.post(url, {'rating': 5, 'text': 'Good'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_LAG=5)
+class replicaRoutingTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def route(self, method, path, token):
+        """ Where a movie and a user are read from while serving the request """
+        routed = {}
+
+        def view(request):
+            routed['movie'] = self.router.db_for_read(Movie)
+            routed['user'] = self.router.db_for_read(User)
+            return HttpResponse(status=201 if method == 'post' else 200)
+
+        request = getattr(RequestFactory(), method)(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+        ReplicaRoutingMiddleware(view)(request)
+        return routed
+
+    def test_movies_api_reads_go_to_replicas(self):
+        self.assertEqual(self.route('get', '/api/v1/movies/', 'reader'), {'movie': 'replica1', 'user': 'default'})
+        self.assertEqual(self.route('get', '/admin/movies/movie/', 'reader')['movie'], 'default')
+        self.assertEqual(self.router.db_for_read(Movie), 'default')  # outside a request
+        self.assertEqual(self.router.db_for_write(Movie), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'movies'))
+
+    def test_writer_reads_own_writes(self):
+        self.assertEqual(self.route('post', '/api/v1/movies/1/reviews/', 'writer')['movie'], 'default')
+        self.assertEqual(self.route('get', '/api/v1/movies/1/', 'writer')['movie'], 'default')
+        self.assertEqual(self.route('get', '/api/v1/movies/1/', 'reader')['movie'], 'replica1')
+
+    @with_cache
+    def test_fresh_cache_fills_read_from_primary(self):
+        cache.set('tag:movie:2', time.time_ns() - 60 * 10**9, timeout=None)
+        invalidate_tags('movie:1')
+        with replica_reads():
+            with fill_reads({'movie:1'}):
+                self.assertEqual(self.router.db_for_read(Movie), 'default')
+            with fill_reads({'movie:2'}):
+                self.assertEqual(self.router.db_for_read(Movie), 'replica1')
@@ -1,3 +1,16 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from apps.movies.metrics import render_metrics
+
+
+@require_GET
+def metrics_view(request):
+    """ Prometheus scrape endpoint (see apps/movies/metrics.py) """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not constant_time_compare(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -58,6 +58,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'apps.movies.profiling.ProfilingMiddleware', # First, so its total covers the whole stack
+    'apps.movies.metrics.MetricsMiddleware', # Route latency histograms for /metrics
+    'apps.movies.replicas.ReplicaRoutingMiddleware', # Movies API reads go to the read replicas
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Added for Render Static Files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -98,13 +101,43 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 print(f"DEBUG: DATABASE_URL present: {'DATABASE_URL' in os.environ}")
 print(f"DEBUG: DATABASE_URL value: {os.environ.get('DATABASE_URL', 'NOT_SET')[:10]}...") # Print first 10 chars only
 
+# Connection pool per database on PostgreSQL (psycopg 3) when
+# DATABASE_POOL_MAX_SIZE > 0: DATABASE_POOL_MIN_SIZE connections kept open per
+# worker process, requests wait up to DATABASE_POOL_TIMEOUT seconds for one.
+# Otherwise each thread keeps its connection for CONN_MAX_AGE seconds.
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', 2))
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', 0))
+DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    if DATABASE_POOL_MAX_SIZE and config['ENGINE'] == 'django.db.backends.postgresql':
+        config['CONN_MAX_AGE'] = 0  # the pool keeps the connections
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': DATABASE_POOL_TIMEOUT,
+        }
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600
-    )
+    'default': database_config(os.getenv('DATABASE_URL') or f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
 }
 
+# Read replicas (apps/movies/replicas.py): comma-separated URLs, added as
+# "replica1", "replica2", ... Safe-method requests under DATABASE_REPLICA_PATHS
+# read the movies app from them; a client that writes reads from the primary
+# for DATABASE_REPLICA_LAG seconds (the replication lag assumed at most)
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {**database_config(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_REPLICA_PATHS = ('/api/v1/',)
+DATABASE_REPLICA_LAG = float(os.getenv('DATABASE_REPLICA_LAG', 5))
+DATABASE_ROUTERS = ['apps.movies.replicas.ReplicaRouter']
+
 print(f"DEBUG: Configured Database Engine: {DATABASES['default']['ENGINE']}")
 
 
@@ -134,6 +167,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', 
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.movies.api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.AnonRateThrottle',
         'rest_framework.throttling.UserRateThrottle'
@@ -142,6 +179,8 @@ REST_FRAMEWORK = {
         'anon': '100/day',
         'user': '1000/day',
         'review': '10/minute',
+        # Counted per worker (apps/movies/api/throttling.py): one request per keystroke
+        'autocomplete': '1200/minute',
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -187,11 +226,122 @@ CELERY_BROKER_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0") # Use Red
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Movie rating stats
+# "sync": every review write updates its movie inside the request (default)
+# "deferred": review writes only mark the movie dirty in the cache and the
+#             periodic task below recomputes dirty movies in batches
+MOVIE_STATS_MODE = os.getenv('MOVIE_STATS_MODE', 'sync')
+MOVIE_STATS_FLUSH_INTERVAL = int(os.getenv('MOVIE_STATS_FLUSH_INTERVAL', 30))  # seconds
+
+# Periodic tasks (run with: celery -A core beat)
+CELERY_BEAT_SCHEDULE = {
+    'flush-dirty-movie-stats': {
+        'task': 'apps.movies.tasks.flush_dirty_movie_stats',
+        'schedule': MOVIE_STATS_FLUSH_INTERVAL,
+    },
+    'refresh-movie-charts': {
+        'task': 'apps.movies.tasks.refresh_movie_charts',
+        'schedule': 60 * 5,
+    },
+}
+
 # Email Backend (Prints to console for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Cache time to live (TTL) in seconds
 CACHE_TTL = 60 * 15  # 15 minutes
+
+# Most distinct list variants (filter/search/ordering/page combinations)
+# cached per entity; the least recently used ones are evicted beyond this
+CACHE_LIST_VARIANT_BUDGET = int(os.getenv('CACHE_LIST_VARIANT_BUDGET', 1000))
+
+# Stampede protection of cached responses (apps/movies/cache.py):
+# expired entries are served for CACHE_STALE_TTL more seconds while a single
+# worker, holding a lock for at most CACHE_LOCK_TIMEOUT, recomputes them;
+# cold misses wait up to CACHE_LOCK_WAIT for that worker.
+# CACHE_XFETCH_BETA > 1 refreshes earlier, 0 disables early refresh.
+CACHE_STALE_TTL = 60 * 5
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2.0
+CACHE_XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', 1.0))
+
+# Per-worker L1 in front of the shared cache for hot payloads (movie detail):
+# capped at CACHE_L1_MAX_BYTES of pickled data (0 disables), entries kept at
+# most CACHE_L1_TTL seconds, invalidated over Redis pub/sub ("redis") or
+# in-process only ("locmem")
+CACHE_L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', 32 * 1024 * 1024))
+CACHE_L1_TTL = 60
+CACHE_INVALIDATION_BUS = os.getenv('CACHE_INVALIDATION_BUS', 'redis' if REDIS_URL else 'locmem')
+
+# Cache hit/miss counters are buffered per worker for this many seconds
+CACHE_STATS_FLUSH_INTERVAL = 5
+
+# Default page size of the keyset-paginated list endpoints
+API_PAGE_SIZE = 20
+
+# Rows fetched (and prefetched) per round trip by the streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Full-text search engine: "auto" (from the DB vendor), "postgres", "sqlite" (FTS5) or "basic"
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+# Typeahead index: how often a worker checks for catalogue changes (seconds)
+# and how many hot queries it keeps in its LRU
+AUTOCOMPLETE_REFRESH_SECONDS = 30
+AUTOCOMPLETE_LRU_SIZE = 10000
+# Stale indexes are rebuilt in a background thread. Tests rebuild inline: the
+# thread's own connection would not see the data of their open transaction
+AUTOCOMPLETE_BACKGROUND_REBUILD = sys.argv[1:2] != ['test']
+
+# Multi-genre filters (apps/movies/genre_index.py) pass the matching movie
+# ids to the database up to this many, and let it join beyond that
+GENRE_FILTER_MAX_IDS = int(os.getenv('GENRE_FILTER_MAX_IDS', 500))
+# Oldest genre index a worker filters with (seconds); only matters when the
+# cache is not shared between processes, since writes otherwise reach every
+# worker through the index version key
+GENRE_INDEX_REFRESH_SECONDS = 60
+
+# Leaderboards (apps/movies/charts.py): CHARTS_SIZE ranks are served, with
+# CHARTS_BUFFER more kept so incremental refreshes can fill in for movies
+# that drop out. A movie's score is pulled towards the mean rating as if it
+# had CHARTS_MIN_VOTES more reviews; trending counts reviews over the last
+# CHARTS_TRENDING_DAYS. Charts are fully recomputed at least every
+# CHARTS_FULL_REFRESH_INTERVAL seconds.
+CHARTS_SIZE = 250
+CHARTS_BUFFER = 50
+CHARTS_MIN_VOTES = int(os.getenv('CHARTS_MIN_VOTES', 10))
+CHARTS_TRENDING_DAYS = 7
+CHARTS_FULL_REFRESH_INTERVAL = 60 * 60
+
+# Per-request profiling (apps/movies/profiling.py): every request when
+# PROFILING_ENABLED, otherwise a PROFILING_SAMPLE_RATE fraction of them (0-1).
+# Profiled requests get a Server-Timing header and a JSON log line; with
+# PROFILING_CPROFILE_DIR set they are also run under cProfile, dumped there.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.0))
+PROFILING_CPROFILE_DIR = os.getenv('PROFILING_CPROFILE_DIR') or None
+
+# Metrics (apps/movies/metrics.py, GET /metrics): with several processes
+# (gunicorn or Celery workers) set METRICS_DIR to a directory they share,
+# emptied on deploy; each process writes its snapshot there at most every
+# METRICS_FLUSH_INTERVAL seconds. With METRICS_TOKEN set, /metrics requires
+# "Authorization: Bearer <token>".
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+# Log records of the apps (profiles, login emails) go to stderr
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': os.getenv('APPS_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 